@@ -1,11 +1,26 @@
+import contextlib
+
 import streamlit as st
-import plotly.graph_objs as go
-import plotly.express as px
-import pandas as pd
-import numpy as np
-import requests
-import time
-from datetime import datetime, timedelta
+from sbtc.api import get_metrics_server
+from sbtc.cache import all_caches, get_cache
+from sbtc.indexer import get_indexer, is_stacks_address
+from sbtc.instrument import get_profiler
+from sbtc.optimizer import DEFAULT_MAX_WEIGHT, DEFAULT_MIN_MOVE, DEFAULT_RISK_BUDGET
+from sbtc.projection import DEFAULT_PATHS
+from sbtc.resample import get_pyramid
+from sbtc.rolling import DEFAULT_WINDOW
+from sbtc.snapshot import build_snapshot, get_snapshot_store
+from sbtc.aggregates import risk_level
+from sbtc.alerts import get_alert_engine
+from sbtc.portfolio import fetch_sbtc_portfolio_live
+from sbtc.schema import arrow_table, compact_frame
+from sbtc.streaming import DEFAULT_CAPACITY, get_stream
+from dashboard.alerts import alerts_html
+from dashboard.cards import SORT_OPTIONS, format_cards, page_bounds, query_positions
+from dashboard.figures import (
+    DEFAULT_POINT_BUDGET, allocation_figure, fan_figure, live_figure, performance_figures, rolling_figures
+)
+from dashboard.insights import health_html, recommendations_html
 
 # =============================================
 # CONFIGURATION & THEMING
@@ -17,6 +32,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def get_secret(name, default=None):
+    """Read a Streamlit secret, falling back to `default` when secrets aren't set"""
+    try:
+        return st.secrets.get(name, default)
+    except Exception: # Catch StreamlitSecretNotFoundError if secrets aren't set
+        return default
+
+# Per-section wall time (and tracemalloc allocations when PROFILE_MEMORY is on)
+# for this rerun; the last N reruns are shown in the debug panel.
+rerun_profile = get_profiler(
+    history=int(get_secret("PROFILE_HISTORY", 20)),
+    trace_memory=bool(get_secret("PROFILE_MEMORY", False))
+).start_rerun()
+rerun_profile.section("theming")
+
 # Custom CSS for professional styling
 st.markdown("""
 <style>
@@ -89,97 +119,76 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Date range presets for the Performance Analysis charts (days; None is all history)
+HISTORY_RANGES = {"1W": 7, "1M": 30, "3M": 90, "1Y": 365, "5Y": 1825, "All": None}
+
 # =============================================
 # DATA LOADING (MOVED UP)
 # =============================================
+rerun_profile.section("data_loading")
+# Process-wide stale-while-revalidate cache: reruns get the last good snapshot
+# immediately and at most one background refresh hits the API per TTL window.
+portfolio_cache = get_cache(
+    "portfolio",
+    ttl=float(get_secret("PORTFOLIO_CACHE_TTL", 300)),
+    max_entries=int(get_secret("PORTFOLIO_CACHE_MAX_ENTRIES", 8))
+)
 
-def generate_mock_historical_data(protocol):
-    """Generate realistic historical data for visualization"""
-    dates = pd.date_range(end=datetime.today(), periods=30).date
-    base_value = np.random.uniform(0.5, 2.0)
-    
-    if protocol == "ALEX":
-        values = base_value + np.cumsum(np.random.normal(0.02, 0.05, 30))
-        apy = np.clip(4.2 + np.random.normal(0, 0.5, 30), 3.0, 6.0)
-    elif protocol == "Bitflow":
-        values = base_value + np.cumsum(np.random.normal(0.015, 0.03, 30))
-        apy = np.clip(3.8 + np.random.normal(0, 0.3, 30), 3.0, 5.0)
-    else:  # Arkadiko
-        values = base_value + np.cumsum(np.random.normal(0.025, 0.04, 30))
-        apy = np.clip(5.1 + np.random.normal(0, 0.4, 30), 4.0, 6.5)
-    
-    return pd.DataFrame({
-        "date": dates,
-        "sbtc_balance": np.abs(values),
-        "apy": apy,
-        "yield_earned": np.abs(values) * apy / 365,
-        "protocol": protocol
-    })
-
-def fetch_sbtc_portfolio_live():
-    """
-    Fetches live sBTC portfolio data from the Rebar Data API or another source.
-    Returns a pandas DataFrame with columns:
-    ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score', 'historical']
-    If API is unavailable, returns an empty DataFrame.
-    """
-    # Example placeholder: Replace with actual API call logic
-    try:
-        # Example: response = requests.get("https://api.rebardata.com/sbtc_portfolio")
-        # data = response.json()
-        # df = pd.DataFrame(data)
-        # For now, return empty DataFrame to trigger dummy data
-        return pd.DataFrame()
-    except Exception as e:
-        return pd.DataFrame()
-
-# Initialize portfolio_df as an empty DataFrame to handle potential errors early
-portfolio_df = pd.DataFrame()
-try:
-    # Attempt to fetch live data
-    portfolio_df = fetch_sbtc_portfolio_live() # fetch_sbtc_portfolio_live should already be defined
-    
-    # Validate fetched live data    required_cols = ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score', 'historical']
-    if (portfolio_df.empty or 
-        not all(col in portfolio_df.columns for col in required_cols) or
-        any(portfolio_df[col].isnull().all() for col in required_cols if col != 'historical')): # historical can be complex
-        # If live data is empty, missing critical columns, or all values in a column are null, raise an error to trigger dummy data.
-        # We also check if 'historical' data, if present, contains valid DataFrames.
-        if 'historical' in portfolio_df.columns:
-            if not all(isinstance(h, pd.DataFrame) and not h.empty for h in portfolio_df['historical'] if h is not None):
-                 raise ValueError("Live data fetched but 'historical' column contains invalid or empty DataFrames.")
-        else: # If historical column itself is missing
-            raise ValueError("Live data fetched but is incomplete or empty (missing 'historical' or other critical columns).")
-
-except Exception as e:
-    st.warning(f"Failed to fetch or validate live portfolio data: {str(e)[:200]}. Displaying dummy data.")
-    portfolio_df = pd.DataFrame([
-        {
-            'protocol': 'ALEX', 'sbtc_balance': 1.2, 'apy': 4.5, 'yield_earned': 0.05,
-            'tvl': 10000, 'risk_score': 2, 'historical': generate_mock_historical_data('ALEX')
-        },
-        {
-            'protocol': 'Bitflow', 'sbtc_balance': 0.8, 'apy': 3.9, 'yield_earned': 0.03,
-            'tvl': 8000, 'risk_score': 3, 'historical': generate_mock_historical_data('Bitflow')
-        },
-        {
-            'protocol': 'Arkadiko', 'sbtc_balance': 1.0, 'apy': 5.2, 'yield_earned': 0.06,
-            'tvl': 12000, 'risk_score': 2, 'historical': generate_mock_historical_data('Arkadiko')
-        }
-    ])
+# Attempt to fetch live data (served from the portfolio cache). Secrets are read
+# here, on the script thread, because refreshes run in the background.
+api_url = get_secret("REBAR_API_URL")
+fetch_deadline = float(get_secret("FETCH_DEADLINE", 8.0))
+live_protocols = [p.strip() for p in str(get_secret("PROTOCOLS", "")).split(",") if p.strip()] or None
+history_path = get_secret("HISTORY_STORE_PATH", "data/history")
+history_days = int(get_secret("HISTORY_DAYS", 30))
+# Categorical protocol, float32 metrics and datetime64 dates for everything sent
+# to the browser (see sbtc.schema)
+compact_schema = bool(get_secret("COMPACT_SCHEMA", False))
+
+# Validation, dummy-data fallback and (persisted) history all live in the sbtc core.
+# They run once per refresh, not per rerun: every session shares the same read-only
+# snapshot and keeps only its selection and view settings in st.session_state.
+snapshot = get_snapshot_store("portfolio").get(
+    portfolio_cache, "portfolio",
+    lambda: build_snapshot(fetch_sbtc_portfolio_live(api_url, fetch_deadline, live_protocols), history_path, history_days,
+                           compact_schema)
+)
+portfolio = snapshot.portfolio
+
+# Optional JSON metrics endpoint for other services, served on a background
+# thread from the same published snapshot (no script rerun per request).
+metrics_api_port = get_secret("METRICS_API_PORT")
+if metrics_api_port:
+    metrics_server = get_metrics_server(
+        get_secret("METRICS_API_HOST", "127.0.0.1"), int(metrics_api_port),
+        int(get_secret("PROJECTION_PATHS", DEFAULT_PATHS))
+    )
+
+if portfolio.fallback_reason:
+    st.warning(f"Failed to fetch or validate live portfolio data: {portfolio.fallback_reason[:200]}. Displaying dummy data.")
     # --- Log the dummy data creation for debugging ---
-    try:
-        debug_mode = st.secrets.get("DEBUG_MODE", False)
-    except Exception: # Catch StreamlitSecretNotFoundError if secrets aren't set
-        debug_mode = False # Default to False if secrets aren't available
-    if debug_mode:
+    if get_secret("DEBUG_MODE", False):
         st.sidebar.write("Debug: Using dummy portfolio data.") # Moved to sidebar for less intrusion
         # st.write("Dummy portfolio data created:") # Optional: show in main area
-        # st.dataframe(portfolio_df.drop(columns=['historical']), height=200) # Drop historical for brevity
+        # st.dataframe(portfolio_df, height=200)
+if portfolio.fetch_errors:
+    st.warning(f"Live data unavailable for: {', '.join(sorted(portfolio.fetch_errors))}. Showing the remaining protocols.")
+if portfolio.history_error and get_secret("DEBUG_MODE", False):
+    st.sidebar.write(f"Debug: history store unavailable ({portfolio.history_error[:100]}), using in-memory history.")
+
+# Target allocation for the Rebalance button and the AI recommendations, memoized
+# by portfolio fingerprint and history version in the sbtc core
+rebalance_options = dict(
+    max_weight=float(get_secret("REBALANCE_MAX_WEIGHT", DEFAULT_MAX_WEIGHT)),
+    risk_budget=float(get_secret("REBALANCE_RISK_BUDGET", DEFAULT_RISK_BUDGET)),
+    min_move=float(get_secret("REBALANCE_MIN_MOVE", DEFAULT_MIN_MOVE))
+)
+rebalance_plan = portfolio.rebalance(**rebalance_options)
 
 # =============================================
 # SIDEBAR CONTENT
 # =============================================
+rerun_profile.section("sidebar")
 with st.sidebar:
     st.markdown("""
     <div style="text-align: center; margin-bottom: 30px;">
@@ -197,73 +206,36 @@ with st.sidebar:
     if st.button("➕ Add Funds", key="add_funds"):
         st.success("Add Funds action triggered! (Demo placeholder)")
     if st.button("🔄 Rebalance Portfolio", key="rebalance_portfolio"):
-        st.info("Rebalance Portfolio action triggered! (Demo placeholder)")
+        if not rebalance_plan.feasible:
+            st.warning(f"No allocation meets the risk budget of {rebalance_plan.risk_budget:.1f}; showing the lowest-risk one.")
+        if rebalance_plan.moves.empty:
+            st.info("Your allocation is already on target: no move above the minimum size improves expected yield within the risk budget.")
+        else:
+            st.info(f"Expected APY {rebalance_plan.apy_before:.2f}% → {rebalance_plan.apy_after:.2f}%, "
+                    f"risk {rebalance_plan.risk_before:.2f} → {rebalance_plan.risk_after:.2f}")
+            st.dataframe(
+                rebalance_plan.moves[['protocol', 'move_sbtc', 'target_weight']].rename(
+                    columns={'protocol': 'Protocol', 'move_sbtc': 'Move (sBTC)', 'target_weight': 'Target'}
+                ).style.format({'Move (sBTC)': '{:+.4f}', 'Target': '{:.0%}'}),
+                hide_index=True, use_container_width=True
+            )
     if st.button("🏆 Claim Rewards", key="claim_rewards"):
         st.warning("Claim Rewards action triggered! (Demo placeholder)")
     
-    # Portfolio Alerts
-    st.markdown("""
-    <div style="background: rgba(30, 41, 59, 0.7); padding: 15px; border-radius: 10px; margin-bottom: 20px;">
-        <h3 style="color: #f8f9fa; margin-top: 0;">Portfolio Alerts</h3>
-        <div style="display: flex; align-items: center; margin-bottom: 15px;">
-            <div style="background: rgba(239, 68, 68, 0.2); padding: 5px; border-radius: 6px; margin-right: 10px;">
-                <svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#ef4444" stroke-width="2">
-                    <path d="M10.29 3.86L1.82 18a2 2 0 0 0 1.71 3h16.94a2 2 0 0 0 1.71-3L13.71 3.86a2 2 0 0 0-3.42 0z"></path>
-                    <line x1="12" y1="9" x2="12" y2="13"></line>
-                    <line x1="12" y1="17" x2="12.01" y2="17"></line>
-                </svg>
-            </div>
-            <div>
-                <p style="color: #f8f9fa; margin: 0; font-size: 0.9rem;">High concentration in ALEX (45%)</p>
-                <p style="color: #94a3b8; margin: 0; font-size: 0.8rem;">Consider diversifying</p>
-            </div>
-        </div>
-        <div style="display: flex; align-items: center; margin-bottom: 15px;">
-            <div style="background: rgba(234, 179, 8, 0.2); padding: 5px; border-radius: 6px; margin-right: 10px;">
-                <svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#f59e0b" stroke-width="2">
-                    <circle cx="12" cy="12" r="10"></circle>
-                    <line x1="12" y1="8" x2="12" y2="12"></line>
-                    <line x1="12" y1="16" x2="12.01" y2="16"></line>
-                </svg>
-            </div>
-            <div>
-                <p style="color: #f8f9fa; margin: 0; font-size: 0.9rem;">Arkadiko APY increased</p>
-                <p style="color: #94a3b8; margin: 0; font-size: 0.8rem;">Now at 5.3% (+0.2%)</p>
-            </div>
-        </div>
-        <div style="display: flex; align-items: center;">
-            <div style="background: rgba(76, 175, 80, 0.2); padding: 5px; border-radius: 6px; margin-right: 10px;">
-                <svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#4CAF50" stroke-width="2">
-                    <path d="M22 11.08V12a10 10 0 1 1-5.93-9.14"></path>
-                    <polyline points="22 4 12 14.01 9 11.01"></polyline>
-                </svg>
-            </div>
-            <div>
-                <p style="color: #f8f9fa; margin: 0; font-size: 0.9rem;">$0.15 sBTC rewards ready</p>
-                <p style="color: #94a3b8; margin: 0; font-size: 0.8rem;">Claim in Bitflow</p>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Protocol Filter
+    # Portfolio Alerts: rules are evaluated by a process-wide engine that only
+    # re-checks data changed since the last rerun (see sbtc.alerts)
+    alert_engine = get_alert_engine(
+        get_secret("ALERT_RULES"),
+        cooldown=float(get_secret("ALERT_COOLDOWN", 3600)),
+        ttl=float(get_secret("ALERT_TTL", 86400))
+    )
+    st.markdown(alerts_html(alert_engine.evaluate(portfolio.positions, portfolio.history)), unsafe_allow_html=True)
+
+    # Protocol Filter (the multiselect is rendered by the overview fragment below,
+    # so changing it only reruns that fragment)
     st.markdown("---")
     st.subheader("Filter Protocols")
-    if not portfolio_df.empty and 'protocol' in portfolio_df.columns:
-        unique_protocols = sorted(portfolio_df['protocol'].unique())
-        # Check if 'selected_protocols' is already in session state to maintain selection across reruns
-        if 'selected_protocols' not in st.session_state:
-            st.session_state.selected_protocols = list(unique_protocols) # Default to all selected initially
-
-        # Update session state when multiselect changes
-        st.session_state.selected_protocols = st.multiselect(
-            "Select protocols to display:",
-            options=unique_protocols,
-            default=st.session_state.selected_protocols # Use session state for default
-        )
-    else:
-        st.markdown("No protocol data available to filter.")
-        st.session_state.selected_protocols = [] # Ensure it's an empty list if no data
+    protocol_filter_slot = st.container()
 
     # Hackathon Resources
     st.markdown("""
@@ -295,304 +267,403 @@ with st.sidebar:
     If you found this project helpful, you can [support me here](https://atiflatif7.gumroad.com/l/xyobfh)!
     """)
 
-# Filter the main DataFrame based on sidebar selection
-if 'selected_protocols' in st.session_state and st.session_state.selected_protocols:
-    filtered_portfolio_df = portfolio_df[portfolio_df['protocol'].isin(st.session_state.selected_protocols)]
-else:
-    # If no protocols are selected (e.g., user deselects all), or if state isn't set yet,
-    # show all data or an empty state based on preference. For now, show all if nothing selected.
-    filtered_portfolio_df = portfolio_df.copy() # Or pd.DataFrame() to show nothing
-
 # =============================================
-# HEADER SECTION
+# INTERACTIVE FRAGMENTS
 # =============================================
-# --- Portfolio Summary Metrics ---
-st.header("📊 Portfolio Overview")
-
-# Update metrics based on filtered_portfolio_df
-if not filtered_portfolio_df.empty:
-    total_sbtc = filtered_portfolio_df['sbtc_balance'].sum()
-    avg_apy = (filtered_portfolio_df['sbtc_balance'] * filtered_portfolio_df['apy']).sum() / total_sbtc if total_sbtc > 0 else 0
-    total_yield_30d = filtered_portfolio_df['yield_earned'].sum() # Assuming yield_earned is for 30d
-    # Risk score calculation might need more complex logic, e.g., weighted average or max
-    # For simplicity, let's take the mode or a simple average if numeric, or a qualitative summary
-    # Assuming risk_score is numeric (1-5)
-    avg_risk_score_val = filtered_portfolio_df['risk_score'].mean() if not filtered_portfolio_df.empty else 0
-    if avg_risk_score_val == 0:
-        risk_level_display = "N/A"
-        risk_color = "#94a3b8" # Neutral color
-    elif avg_risk_score_val <= 2:
-        risk_level_display = "Low"
-        risk_color = "#4CAF50" # Green
-    elif avg_risk_score_val <= 3.5:
-        risk_level_display = "Medium"
-        risk_color = "#f59e0b" # Orange
-    else:
-        risk_level_display = "High"
-        risk_color = "#ef4444" # Red
-    num_protocols = filtered_portfolio_df['protocol'].nunique()
-else:
-    total_sbtc, avg_apy, total_yield_30d, risk_level_display, num_protocols = 0, 0, 0, "N/A", 0
-    risk_color = "#94a3b8"
-
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-title">Total sBTC</div>
-        <div class="metric-value">{total_sbtc:.2f}</div>
-        <div style="color: #94a3b8; font-size: 0.9rem;">Across {num_protocols} selected protocol(s)</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col2:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-title">Average APY</div>
-        <div class="metric-value">{avg_apy:.2f}%</div>
-        <div style="color: #94a3b8; font-size: 0.9rem;">Weighted by balance</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col3:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-title">30d Yield (Est.)</div>
-        <div class="metric-value">{total_yield_30d:.4f} sBTC</div>
-        <div style="color: #94a3b8; font-size: 0.9rem;">Based on current holdings</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-with col4:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-title">Avg. Risk Score</div>
-        <div class="metric-value" style="color: {risk_color};">{risk_level_display}</div>
-        <div style="color: #94a3b8; font-size: 0.9rem;">Across selected protocols</div>
-    </div>
-    """, unsafe_allow_html=True)
-
-
-# --- Portfolio Data & Visualizations (Now uses filtered_portfolio_df) ---
-st.header("🔍 Protocol Breakdown")
-
-if filtered_portfolio_df.empty:
-    st.info("No data to display for the selected protocols. Please select protocols from the sidebar filter.")
-else:
-    tab1, tab2, tab3 = st.tabs(["Portfolio Distribution", "Performance Analysis", "Protocol Details"])
+# The protocol filter, overview metrics and breakdown tabs are fragments: a
+# widget change inside them reruns only the enclosing fragment, fed by the
+# portfolio loaded (from the shared cache) on the last full run, instead of the
+# whole script with its CSS, static HTML and debug panel.
+@contextlib.contextmanager
+def profiled(name):
+    """Profile `name` as a section of this run, or as its own rerun when only a fragment reruns"""
+    if rerun_profile.wall_ms is None:
+        rerun_profile.section(name)
+        yield
+        return
+    fragment_profile = get_profiler().start_rerun()
+    try:
+        with fragment_profile.span(name):
+            yield
+    finally:
+        fragment_profile.finish()
+
+
+@st.fragment
+def performance_panel(portfolio, protocol_options, chart_point_budget, projection_paths):
+    """Tab 2: historical charts and projections for one protocol; its widgets rerun only this panel"""
+    with profiled("performance_tab"):
+        # Maintain selection for this specific selectbox if possible
+        current_selection_tab2 = st.session_state.get('tab2_protocol_select', protocol_options[0])
+        if current_selection_tab2 not in protocol_options:
+            current_selection_tab2 = protocol_options[0]
+
+        protocol_for_history = st.selectbox(
+            "Select Protocol for Historical Data",
+            protocol_options,
+            index=protocol_options.index(current_selection_tab2),
+            key='tab2_protocol_select' # Add a key to help preserve state
+        )
 
-    with tab1:
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            if not filtered_portfolio_df.empty and 'sbtc_balance' in filtered_portfolio_df.columns and filtered_portfolio_df['sbtc_balance'].sum() > 0:
-                fig = px.pie(
-                    filtered_portfolio_df, 
-                    values='sbtc_balance', 
-                    names='protocol', 
-                    hole=0.4,
-                    color_discrete_sequence=px.colors.sequential.Viridis
+        # Range and resolution pick a slice of one pyramid level; each level is
+        # resampled once per history version, whatever the zoom
+        pyramid = get_pyramid(portfolio.history)
+        first_date, last_date = portfolio.history.date_bounds()
+        span_days = (last_date - first_date).days + 1 if first_date is not None else 0
+        range_options = [name for name, days in HISTORY_RANGES.items() if days is None or days < span_days]
+        range_col, resolution_col = st.columns([3, 1])
+        with range_col:
+            history_range = st.radio("Date range", range_options, index=len(range_options) - 1, horizontal=True,
+                                     key='history_range')
+        with resolution_col:
+            resolution_choice = st.selectbox("Resolution", ["Auto"] + pyramid.resolutions,
+                                             format_func=str.capitalize, key='history_resolution')
+        history_start = pyramid.window_start(HISTORY_RANGES[history_range])
+        history_resolution = (pyramid.auto_resolution(history_start, max_points=chart_point_budget)
+                              if resolution_choice == "Auto" else resolution_choice)
+
+        if protocol_for_history:
+            # Historical data is not filtered by the main selection; figures are built
+            # from the shared history pyramid once per (protocol, range, resolution, data version)
+            figures = performance_figures(portfolio.history, protocol_for_history, history_start,
+                                          max_points=chart_point_budget, resolution=history_resolution)
+            if figures is not None:
+                line_fig, yield_fig, balance_fig = figures
+                st.plotly_chart(line_fig, use_container_width=True)
+                col1_tab2, col2_tab2 = st.columns(2)
+                with col1_tab2:
+                    st.plotly_chart(yield_fig, use_container_width=True)
+                with col2_tab2:
+                    st.plotly_chart(balance_fig, use_container_width=True)
+            else:
+                st.markdown(f"<p style='color: #94a3b8;'>No historical data available for {protocol_for_history}.</p>", unsafe_allow_html=True)
+
+            # Rolling windows are extended incrementally as new days reach the history store
+            st.subheader("Rolling Analytics")
+            rolling_window = st.select_slider("Rolling window (days)", options=[7, 14, 30, 90], value=DEFAULT_WINDOW,
+                                              key='rolling_window')
+            rolling = portfolio.rolling(rolling_window)
+            rolling_figs = rolling_figures(rolling, protocol_for_history, max_points=chart_point_budget)
+            if rolling_figs is not None:
+                col1_roll, col2_roll = st.columns(2)
+                with col1_roll:
+                    st.plotly_chart(rolling_figs[0], use_container_width=True)
+                with col2_roll:
+                    st.plotly_chart(rolling_figs[1], use_container_width=True)
+            rolling_summary = rolling.summary(protocol_options)
+            if not rolling_summary.empty:
+                def rolling_table():
+                    table = rolling_summary.assign(
+                        volatility=rolling_summary['volatility'] * 100,
+                        drawdown=rolling_summary['drawdown'] * 100,
+                        max_drawdown=rolling_summary['max_drawdown'] * 100
+                    ).rename_axis('Protocol').reset_index()[
+                        ['Protocol', 'apy', 'apy_mean', 'apy_std', 'volatility', 'drawdown', 'max_drawdown', 'cum_yield']
+                    ].rename(columns={
+                        'apy': 'APY (%)', 'apy_mean': f'{rolling_window}d Mean APY (%)', 'apy_std': f'{rolling_window}d APY Std',
+                        'volatility': 'Ann. Volatility (%)', 'drawdown': 'Drawdown (%)',
+                        'max_drawdown': 'Max Drawdown (%)', 'cum_yield': 'Cumulative Yield (sBTC)'
+                    })
+                    return compact_frame(table, categorical=()) if compact_schema else table
+
+                # Formatting is done by the frontend (column_config), so in compact mode the
+                # Arrow table is built once per history version and passed through as-is
+                number_formats = {column: st.column_config.NumberColumn(format="%.2f") for column in (
+                    'APY (%)', f'{rolling_window}d Mean APY (%)', f'{rolling_window}d APY Std',
+                    'Ann. Volatility (%)', 'Drawdown (%)', 'Max Drawdown (%)'
+                )}
+                number_formats['Cumulative Yield (sBTC)'] = st.column_config.NumberColumn(format="%.4f")
+                st.dataframe(
+                    arrow_table(("rolling_summary", rolling.version, rolling_window, tuple(protocol_options)),
+                                rolling_table) if compact_schema else rolling_table(),
+                    column_config=number_formats, hide_index=True, use_container_width=True
                 )
-                fig.update_layout(
-                    title="sBTC Allocation by Protocol",
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font_color='white'
+
+            # Monte Carlo fan charts calibrated from this protocol's history
+            st.subheader("Yield Projection")
+            horizon = st.select_slider("Projection horizon (days)", options=[7, 30, 90, 180, 365], value=30,
+                                       key='projection_horizon')
+            with st.spinner("Simulating paths..."):
+                projection = portfolio.project([protocol_for_history], horizon, paths=projection_paths)
+            col1_fan, col2_fan = st.columns(2)
+            with col1_fan:
+                st.plotly_chart(fan_figure(projection, 'yield'), use_container_width=True)
+            with col2_fan:
+                st.plotly_chart(fan_figure(projection, 'apy'), use_container_width=True)
+            st.caption(f"{projection.paths:,} simulated paths · simulated in {projection.elapsed:.2f}s")
+        else:
+            st.markdown("<p style='color: #94a3b8;'>Select a protocol to view its historical performance.</p>", unsafe_allow_html=True)
+
+
+@st.fragment
+def protocol_details(filtered_portfolio_df):
+    """Tab 3: searchable, sortable, paginated position cards"""
+    with profiled("details_tab"):
+        # Search/sort/paginate first, then format only the visible page in one pass
+        search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+        with search_col:
+            details_search = st.text_input("Search positions", key="details_search", placeholder="Protocol name...")
+        with sort_col:
+            details_sort = st.selectbox("Sort by", list(SORT_OPTIONS), key="details_sort")
+        with order_col:
+            details_descending = st.checkbox("Descending", value=True, key="details_descending")
+        with size_col:
+            details_page_size = st.selectbox("Per page", [10, 25, 50, 100], key="details_page_size")
+
+        matching_positions = query_positions(
+            filtered_portfolio_df, details_search, SORT_OPTIONS[details_sort], ascending=not details_descending
+        )
+        page_count = page_bounds(len(matching_positions), details_page_size, 1)[2]
+        if st.session_state.get('details_page', 1) > page_count:
+            st.session_state.details_page = page_count # Keep the page valid after search/page-size changes
+        details_page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="details_page") if page_count > 1 else 1
+        page_start, page_stop, _ = page_bounds(len(matching_positions), details_page_size, details_page)
+        if matching_positions.empty:
+            st.markdown("<p style='color: #94a3b8;'>No positions match your search.</p>", unsafe_allow_html=True)
+        else:
+            st.caption(f"Showing {page_start + 1}–{page_stop} of {len(matching_positions)} position(s)")
+            st.markdown(format_cards(matching_positions.iloc[page_start:page_stop]), unsafe_allow_html=True)
+
+
+@st.fragment
+def portfolio_overview(portfolio, filter_slot):
+    """Sidebar protocol filter, overview metrics and the Protocol Breakdown tabs"""
+    with profiled("overview"):
+        with filter_slot:
+            if portfolio.protocols:
+                # Check if 'selected_protocols' is already in session state to maintain selection across reruns
+                if 'selected_protocols' not in st.session_state:
+                    st.session_state.selected_protocols = list(portfolio.protocols) # Default to all selected initially
+
+                # Update session state when multiselect changes
+                st.session_state.selected_protocols = st.multiselect(
+                    "Select protocols to display:",
+                    options=portfolio.protocols,
+                    default=[p for p in st.session_state.selected_protocols if p in portfolio.protocols] # Use session state for default
                 )
-                st.plotly_chart(fig, use_container_width=True)
             else:
-                st.markdown("<p style='text-align: center; color: #94a3b8;'>No sBTC balance data to display for pie chart.</p>", unsafe_allow_html=True)
+                st.markdown("No protocol data available to filter.")
+                st.session_state.selected_protocols = [] # Ensure it's an empty list if no data
+
+        # Filter the main DataFrame based on sidebar selection. If no protocols are
+        # selected (e.g., user deselects all), or if state isn't set yet, show all data.
+        filtered_portfolio_df = portfolio.filter(st.session_state.get('selected_protocols'))
+
+        # --- Portfolio Summary Metrics ---
+        st.header("📊 Portfolio Overview")
+
+        # Metrics come from per-protocol partial sums, memoized by selection and data
+        # version, so reruns don't re-reduce the filtered frame.
+        overview = portfolio.overview(st.session_state.get('selected_protocols'))
+        total_sbtc = overview['total_sbtc']
+        avg_apy = overview['avg_apy']  # Weighted by balance
+        # 30d yield is the Monte Carlo median with its 5-95 percentile band
+        yield_30d = portfolio.project(
+            st.session_state.get('selected_protocols'), 30, paths=int(get_secret("PROJECTION_PATHS", DEFAULT_PATHS))
+        ).at_horizon('yield')
+        num_protocols = overview['num_protocols']
+        # Risk score is the simple average of the numeric (1-5) protocol scores
+        risk_level_display, risk_color = risk_level(overview['avg_risk_score'])
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Total sBTC</div>
+                <div class="metric-value">{total_sbtc:.2f}</div>
+                <div style="color: #94a3b8; font-size: 0.9rem;">Across {num_protocols} selected protocol(s)</div>
+            </div>
+            """, unsafe_allow_html=True)
+
         with col2:
-            st.markdown("### Allocation Strategy")
-            st.markdown("""
-            <div style="background: rgba(30, 41, 59, 0.7); padding: 15px; border-radius: 10px;">
-                <p style="color: #94a3b8;">Based on your current selection, we recommend:</p>
-                <ul style="color: #f8f9fa;">
-                    <li>Analyzing protocols with highest APY in selection.</li>
-                    <li>Considering diversification if heavily weighted.</li>
-                </ul>
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Average APY</div>
+                <div class="metric-value">{avg_apy:.2f}%</div>
+                <div style="color: #94a3b8; font-size: 0.9rem;">Weighted by balance</div>
             </div>
             """, unsafe_allow_html=True)
-            # Diversity score could also be updated based on filtered_portfolio_df
-            st.metric("Portfolio Diversity Score", f"{min(num_protocols * 20, 80) + np.random.randint(0,5)}/100", "Dynamic based on selection")
 
-    with tab2:
-        if not filtered_portfolio_df.empty and 'protocol' in filtered_portfolio_df.columns and filtered_portfolio_df['protocol'].nunique() > 0:
-            # Ensure the selectbox options are from the filtered data
-            protocol_options_tab2 = sorted(filtered_portfolio_df['protocol'].unique())
-            # Maintain selection for this specific selectbox if possible
-            current_selection_tab2 = st.session_state.get('tab2_protocol_select', protocol_options_tab2[0] if protocol_options_tab2 else None)
-            if current_selection_tab2 not in protocol_options_tab2 and protocol_options_tab2:
-                current_selection_tab2 = protocol_options_tab2[0]
-            
-            protocol_for_history = st.selectbox(
-                "Select Protocol for Historical Data", 
-                protocol_options_tab2, 
-                index=protocol_options_tab2.index(current_selection_tab2) if current_selection_tab2 and current_selection_tab2 in protocol_options_tab2 else 0,
-                key='tab2_protocol_select' # Add a key to help preserve state
-            )
-            
-            if protocol_for_history:
-                # Get historical data from the original portfolio_df as historical data is per protocol
-                # and not directly filtered by the main selection (it's nested)
-                original_protocol_data = portfolio_df[portfolio_df['protocol'] == protocol_for_history]
-                if not original_protocol_data.empty and isinstance(original_protocol_data.iloc[0]['historical'], pd.DataFrame):
-                    selected_data = original_protocol_data.iloc[0]['historical']
-                    # ... rest of the plotting code for tab2, ensure it uses 'selected_data' ...
-                    fig = px.line(
-                        selected_data,
-                        x='date',
-                        y=['sbtc_balance', 'apy'],
-                        title=f"{protocol_for_history} Historical Performance",
-                        labels={'value': 'Metric', 'variable': 'Legend'},
-                        color_discrete_map={'sbtc_balance': '#4CAF50', 'apy': '#636EFA'}
-                    )
-                    fig.update_layout(
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font_color='white',
-                        hovermode="x unified"
-                    )
-                    fig.update_yaxes(title_text="sBTC Balance / APY (%)")
+        with col3:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">30d Yield (Est.)</div>
+                <div class="metric-value">{yield_30d[50]:.4f} sBTC</div>
+                <div style="color: #94a3b8; font-size: 0.9rem;">90% range {yield_30d[5]:.4f}–{yield_30d[95]:.4f} sBTC</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        with col4:
+            st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Avg. Risk Score</div>
+                <div class="metric-value" style="color: {risk_color};">{risk_level_display}</div>
+                <div style="color: #94a3b8; font-size: 0.9rem;">Across selected protocols</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+    # --- Portfolio Data & Visualizations (Now uses filtered_portfolio_df) ---
+    with profiled("breakdown_tabs"):
+        st.header("🔍 Protocol Breakdown")
+
+        if filtered_portfolio_df.empty:
+            st.info("No data to display for the selected protocols. Please select protocols from the sidebar filter.")
+            return
+
+        # Health scores and recommendations for the selection, memoized per portfolio fingerprint
+        insights = portfolio.insights(st.session_state.get('selected_protocols'), rebalance_options)
+
+        tab1, tab2, tab3 = st.tabs(["Portfolio Distribution", "Performance Analysis", "Protocol Details"])
+
+        with tab1:
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                if 'sbtc_balance' in filtered_portfolio_df.columns and filtered_portfolio_df['sbtc_balance'].sum() > 0:
+                    fig = allocation_figure(filtered_portfolio_df)
                     st.plotly_chart(fig, use_container_width=True)
-                    # ... (col1, col2 for bar and area charts remain the same, using selected_data)
-                    col1_tab2, col2_tab2 = st.columns(2)
-                    with col1_tab2:
-                        st.plotly_chart(px.bar(
-                            selected_data,
-                            x='date',
-                            y='yield_earned',
-                            title="Daily Yield Earned",
-                            color_discrete_sequence=['#F0B90B']
-                        ).update_layout(
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            font_color='white'
-                        ), use_container_width=True)
-                    with col2_tab2:
-                        st.plotly_chart(px.area(
-                            selected_data,
-                            x='date',
-                            y='sbtc_balance',
-                            title="sBTC Balance Growth",
-                            color_discrete_sequence=['#4CAF50']
-                        ).update_layout(
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            font_color='white'
-                        ), use_container_width=True)
                 else:
-                    st.markdown(f"<p style='color: #94a3b8;'>No historical data available for {protocol_for_history}.</p>", unsafe_allow_html=True)
-            else:
-                st.markdown("<p style='color: #94a3b8;'>Select a protocol to view its historical performance.</p>", unsafe_allow_html=True)
-        else:
-            st.markdown("<p style='color: #94a3b8;'>No protocols selected or available for performance analysis.</p>", unsafe_allow_html=True)
-
-    with tab3:
-        if not filtered_portfolio_df.empty:
-            for _, row in filtered_portfolio_df.iterrows():
-                # ... existing protocol card HTML, ensure it uses 'row' from filtered_portfolio_df ...
-                st.markdown(f"""
-                <div class="protocol-card">
-                    <h3 style="color: #f8f9fa; margin-bottom: 5px;">{row['protocol']}</h3>
-                    <div style="display: flex; justify-content: space-between;">
-                        <div>
-                            <p style="color: #94a3b8; margin: 2px 0;">sBTC Balance</p>
-                            <p style="color: #f8f9fa; font-weight: bold; margin: 2px 0;">{row['sbtc_balance']:.4f}</p>
-                        </div>
-                        <div>
-                            <p style="color: #94a3b8; margin: 2px 0;">APY</p>
-                            <p style="color: #4CAF50; font-weight: bold; margin: 2px 0;">{row['apy']:.2f}%</p>
-                        </div>
-                        <div>
-                            <p style="color: #94a3b8; margin: 2px 0;">Yield (30d)</p>
-                            <p style="color: #f8f9fa; font-weight: bold; margin: 2px 0;">{row['yield_earned']:.4f}</p>
-                        </div>
-                        <div>
-                            <p style="color: #94a3b8; margin: 2px 0;">Risk</p>
-                            <p style="color: {'#ef4444' if row['risk_score'] > 3 else ('#f59e0b' if row['risk_score'] > 1 else '#4CAF50')}; font-weight: bold; margin: 2px 0;">
-                                {'High' if row['risk_score'] > 3 else ('Medium' if row['risk_score'] > 1 else 'Low')}
-                            </p>
-                        </div>
-                    </div>
+                    st.markdown("<p style='text-align: center; color: #94a3b8;'>No sBTC balance data to display for pie chart.</p>", unsafe_allow_html=True)
+            with col2:
+                st.markdown("### Allocation Strategy")
+                st.markdown("""
+                <div style="background: rgba(30, 41, 59, 0.7); padding: 15px; border-radius: 10px;">
+                    <p style="color: #94a3b8;">Based on your current selection, we recommend:</p>
+                    <ul style="color: #f8f9fa;">
+                        <li>Analyzing protocols with highest APY in selection.</li>
+                        <li>Considering diversification if heavily weighted.</li>
+                    </ul>
                 </div>
                 """, unsafe_allow_html=True)
-        else:
-            st.markdown("<p style='color: #94a3b8;'>No protocol details to display for the current selection.</p>", unsafe_allow_html=True)
+                # HHI-based diversity of the selection (see sbtc.insights)
+                diversity_score, diversity_label, _ = insights.scores['diversity']
+                st.metric("Portfolio Diversity Score", f"{diversity_score:.0f}/100", diversity_label, delta_color="off")
 
-# =============================================
-# AI ANALYTICS SECTION (Now uses filtered_portfolio_df if applicable)
-# =============================================
-st.header("🤖 AI-Powered Portfolio Insights")
+        with tab2:
+            # Ensure the selectbox options are from the filtered data
+            protocol_options_tab2 = sorted(filtered_portfolio_df['protocol'].unique())
+            if protocol_options_tab2:
+                performance_panel(
+                    portfolio, protocol_options_tab2,
+                    int(get_secret("CHART_POINT_BUDGET", DEFAULT_POINT_BUDGET)),
+                    int(get_secret("PROJECTION_PATHS", DEFAULT_PATHS))
+                )
+            else:
+                st.markdown("<p style='color: #94a3b8;'>No protocols selected or available for performance analysis.</p>", unsafe_allow_html=True)
 
-col1, col2 = st.columns([1, 2])
+        with tab3:
+            protocol_details(filtered_portfolio_df)
 
-with col1:
-    st.markdown("""
-    <div style="background: rgba(30, 41, 59, 0.7); padding: 20px; border-radius: 10px; height: 100%;">
-        <h3 style="color: #f8f9fa;">Portfolio Health</h3>
-        <div style="margin: 15px 0;">
-            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                <span style="color: #94a3b8;">Diversity</span>
-                <span style="color: #f8f9fa;">Good</span>
-            </div>
-            <div style="height: 8px; background: #2d3748; border-radius: 4px;">
-                <div style="width: 75%; height: 100%; background: #4CAF50; border-radius: 4px;"></div>
-            </div>
-        </div>
-        <div style="margin: 15px 0;">
-            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                <span style="color: #94a3b8;">Yield Efficiency</span>
-                <span style="color: #f8f9fa;">Excellent</span>
-            </div>
-            <div style="height: 8px; background: #2d3748; border-radius: 4px;">
-                <div style="width: 90%; height: 100%; background: #4CAF50; border-radius: 4px;"></div>
-            </div>
-        </div>
-        <div style="margin: 15px 0;">
-            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                <span style="color: #94a3b8;">Risk Management</span>
-                <span style="color: #f8f9fa;">Moderate</span>
-            </div>
-            <div style="height: 8px; background: #2d3748; border-radius: 4px;">
-                <div style="width: 60%; height: 100%; background: #f59e0b; border-radius: 4px;"></div>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    # --- AI Analytics (rule-based scores of the filtered selection, no external model) ---
+    with profiled("ai_insights"):
+        st.header("🤖 AI-Powered Portfolio Insights")
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.markdown(health_html(insights), unsafe_allow_html=True)
+        with col2:
+            st.markdown(recommendations_html(insights), unsafe_allow_html=True)
+
+
+portfolio_overview(portfolio, protocol_filter_slot)
+
+# =============================================
+# LIVE APY/TVL STREAM (optional)
+# =============================================
+# A background thread fills fixed-size ring buffers from the stream source; only
+# this fragment reruns on its timer, redrawing the live cards and charts.
+rerun_profile.section("live_stream")
+stream_source = get_secret("STREAM_SOURCE", "")
+if stream_source:
+    live_stream = get_stream(
+        stream_source,
+        portfolio.protocols,
+        capacity=int(get_secret("STREAM_BUFFER", DEFAULT_CAPACITY)),
+        interval=float(get_secret("STREAM_INTERVAL", 1.0))
+    )
+
+    @st.fragment(run_every=float(get_secret("STREAM_CADENCE", 2.0)))
+    def live_panel(stream):
+        """Latest streamed APY/TVL per selected protocol plus their buffered history"""
+        selected = st.session_state.get('selected_protocols') or stream.hub.protocols
+        latest = stream.hub.latest([p for p in selected if p in stream.hub.protocols])
+        if latest.empty:
+            st.caption("Waiting for the first stream updates...")
+            return
+        for col, (protocol, row) in zip(st.columns(len(latest)), latest.iterrows()):
+            with col:
+                st.metric(f"{protocol} APY", f"{row['apy']:.2f}%", f"{row['apy_change']:+.3f}%")
+                st.metric(f"{protocol} TVL", f"{row['tvl']:,.0f}", f"{row['tvl_change']:+,.0f}")
+        series = stream.hub.series(list(latest.index))
+        apy_col, tvl_col = st.columns(2)
+        with apy_col:
+            st.plotly_chart(live_figure(series, 'apy'), use_container_width=True)
+        with tvl_col:
+            st.plotly_chart(live_figure(series, 'tvl'), use_container_width=True)
+        stats = stream.stats()
+        st.caption(f"Last update {latest['ts'].max():%H:%M:%S} UTC · {stats['updates']} updates received · "
+                   f"{stats['buffer_bytes'] / 1024:.0f} KB buffered" + (f" · {stats['errors']} feed error(s)" if stats['errors'] else ""))
+
+    st.header("📡 Live APY & TVL")
+    live_panel(live_stream)
 
-with col2:
-    st.markdown("""
-    <div style="background: rgba(30, 41, 59, 0.7); padding: 20px; border-radius: 10px; height: 100%;">
-        <h3 style="color: #f8f9fa;">AI Recommendations</h3>
-        <div style="margin-top: 15px;">
-            <div style="display: flex; align-items: flex-start; margin-bottom: 15px;">
-                <div style="background: #4CAF50; color: white; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; margin-right: 10px; flex-shrink: 0;">1</div>
-                <div>
-                    <p style="color: #f8f9fa; margin: 0; font-weight: 500;">Rebalance to Arkadiko</p>
-                    <p style="color: #94a3b8; margin: 0; font-size: 0.9rem;">Increase allocation by 15% to capture higher yields (currently 5.1% APY)</p>
-                </div>
-            </div>
-            <div style="display: flex; align-items: flex-start; margin-bottom: 15px;">
-                <div style="background: #4CAF50; color: white; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; margin-right: 10px; flex-shrink: 0;">2</div>
-                <div>
-                    <p style="color: #f8f9fa; margin: 0; font-weight: 500;">Consider Stackswap for Stability</p>
-                    <p style="color: #94a3b8; margin: 0; font-size: 0.9rem;">Lower risk option with consistent 3.9% APY</p>
-                </div>
-            </div>
-            <div style="display: flex; align-items: flex-start;">
-                <div style="background: #4CAF50; color: white; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; margin-right: 10px; flex-shrink: 0;">3</div>
-                <div>
-                    <p style="color: #f8f9fa; margin: 0; font-weight: 500;">Monitor ALEX Vaults</p>
-                    <p style="color: #94a3b8; margin: 0; font-size: 0.9rem;">TVL has increased 22% this month - potential for APY adjustments</p>
-                </div>
-            </div>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
 
 # =============================================
 # WALLET INTEGRATION & EDUCATIONAL CONTENT
 # =============================================
+# Addresses are indexed into a local SQLite store with a block-height checkpoint,
+# so a sync only fetches new events and repeat lookups never hit the node.
+node_api_url = get_secret("NODE_API_URL", "")
+index_db_path = get_secret("INDEX_DB_PATH", "data/index.sqlite")
+
+
+@st.fragment
+def wallet_panel(portfolio):
+    """Address entry, incremental sync and the indexed positions; reruns only this panel"""
+    with profiled("wallet"):
+        if not node_api_url:
+            st.caption("Set `NODE_API_URL` in the Streamlit secrets to look up wallet positions "
+                       "(`python -m sbtc.stub_server` serves a mock node API).")
+            return
+        indexer = get_indexer(node_api_url, index_db_path)
+        address_col, sync_col = st.columns([4, 1])
+        with address_col:
+            address = st.text_input("Enter Address Manually", key="wallet_address",
+                                    placeholder="SP...").strip().upper()
+        with sync_col:
+            st.write("")  # align the button with the input box
+            sync_clicked = st.button("Sync positions", key="wallet_sync", disabled=not address)
+        if not address:
+            st.caption("Browser wallet connection (Hiro, Xverse, Leather) is not available yet; enter your address instead.")
+            return
+        if not is_stacks_address(address):
+            st.warning("That doesn't look like a Stacks address (SP..., SM..., ST... or SN...).")
+            return
+        if sync_clicked or indexer.index.checkpoint(address) is None:
+            try:
+                with st.spinner("Syncing new events..."):
+                    result = indexer.sync(address)
+                st.caption(f"Fetched {result.new_events} new event(s) in {result.pages} page(s) up to block "
+                           f"{result.to_height:,} ({result.elapsed:.2f}s)")
+            except Exception as e:
+                st.warning(f"Could not sync {address}: {str(e)[:200]}. Showing the last indexed positions.")
+        wallet_positions = indexer.positions(address)
+        if wallet_positions.empty:
+            st.info("No sBTC positions found for this address.")
+            return
+        checkpoint = indexer.index.checkpoint(address)
+        st.caption(f"Indexed up to block {checkpoint:,}" if checkpoint is not None else "Not synced yet")
+        market = portfolio.positions.groupby('protocol', observed=True)[['apy', 'risk_score']].mean()
+        st.dataframe(
+            wallet_positions.join(market, on='protocol')[
+                ['protocol', 'sbtc_balance', 'rewards', 'apy', 'risk_score', 'events', 'last_height']
+            ].rename(columns={
+                'protocol': 'Protocol', 'sbtc_balance': 'sBTC Balance', 'rewards': 'Rewards (sBTC)', 'apy': 'APY (%)',
+                'risk_score': 'Risk', 'events': 'Events', 'last_height': 'Last Block'
+            }).style.format({'sBTC Balance': '{:.4f}', 'Rewards (sBTC)': '{:.4f}', 'APY (%)': '{:.2f}',
+                             'Risk': '{:.0f}'}, na_rep='–'),
+            hide_index=True, use_container_width=True
+        )
+
+rerun_profile.section("education")
 st.header("🔗 Wallet Integration & Education")
 
 tab1, tab2, tab3 = st.tabs(["Connect Wallet", "Learn About sBTC", "DeFi Strategies"])
@@ -604,15 +675,12 @@ with tab1:
         <p style="color: #94a3b8; margin-bottom: 20px;">
             View your actual sBTC balances and positions across all integrated protocols
         </p>
-        <div style="margin: 20px 0;">
-            <button style="background: #5546FF; color: white; border: none; padding: 10px 20px; border-radius: 8px; font-weight: bold; margin-right: 10px; cursor: pointer;">
-                Connect Hiro Wallet
-            </button>
-            <button style="background: #2d3748; color: white; border: none; padding: 10px 20px; border-radius: 8px; font-weight: bold; cursor: pointer;">
-                Enter Address Manually
-            </button>
-        </div>
-        <div style="margin-top: 30px;">
+    </div>
+    """, unsafe_allow_html=True)
+    wallet_panel(portfolio)
+    st.markdown("""
+    <div style="background: rgba(30, 41, 59, 0.7); padding: 20px; border-radius: 10px;">
+        <div>
             <h4 style="color: #f8f9fa;">Supported Wallets</h4>
             <div style="display: flex; gap: 32px; margin-top: 18px; justify-content: center; align-items: flex-end; flex-wrap: wrap;">
                 <div style="text-align: center; min-width: 90px;">
@@ -731,6 +799,7 @@ with tab3:
 # =============================================
 # FOOTER & CREDITS
 # =============================================
+rerun_profile.section("footer")
 st.markdown("""
 <div style="text-align: center; margin-top: 50px; padding: 20px; color: #94a3b8; font-size: 0.9rem;">
     <p>Built for the B25 Hackathon | Powered by Stacks, sBTC, and Bitcoin DeFi</p>
@@ -741,10 +810,8 @@ st.markdown("""
 # =============================================
 # HIDDEN DEBUG FEATURES (For Judges)
 # =============================================
-try:
-    debug_mode = st.secrets.get("DEBUG_MODE", False)
-except Exception:
-    debug_mode = False
+rerun_profile.finish() # Debug panel below reads the finished rerun
+debug_mode = get_secret("DEBUG_MODE", False)
 if debug_mode:
     with st.expander("🚨 Judge Debug Panel"):
         st.write("## Hackathon Submission Details")
@@ -780,13 +847,47 @@ if debug_mode:
         3. **Q1 2025**: Mobile app release
         4. **Q2 2025**: Multi-chain sBTC support
         """)
+        st.write("## Cache Stats")
+        st.json({name: cache.stats() for name, cache in all_caches().items()})
+        st.write("## Portfolio Snapshot")
+        st.json(get_snapshot_store("portfolio").stats())
+        st.write("## History Pyramid")
+        st.json(get_pyramid(portfolio.history).stats())
+        if metrics_api_port:
+            st.write("## Metrics API")
+            st.json(metrics_server.stats())
+        if node_api_url:
+            st.write("## Address Index")
+            st.json(get_indexer(node_api_url, index_db_path).stats())
+        st.write("## Alert Engine")
+        st.json(alert_engine.stats())
+        if stream_source:
+            st.write("## Stream Stats")
+            st.json(live_stream.stats())
+        st.write("## Rerun Profile")
+        profiler = get_profiler()
+        rerun_rows = [
+            dict({"rerun": i, "total_ms": r.wall_ms}, **{rec["section"]: rec["wall_ms"] for rec in r.sections})
+            for i, r in enumerate(profiler.reruns(), start=profiler.total_reruns - len(profiler.reruns()) + 1)
+        ]
+        st.dataframe(rerun_rows, use_container_width=True)
+        st.write("**Last rerun by section**")
+        st.dataframe(rerun_profile.sections, use_container_width=True)
+        st.write("**Cache hit rates (last rerun)**")
+        st.json(rerun_profile.cache_hit_rates)
+        export_col1, export_col2 = st.columns(2)
+        with export_col1:
+            st.download_button("⬇️ Export JSON lines", profiler.to_jsonl(), file_name="rerun_profile.jsonl",
+                               mime="application/x-ndjson", key="export_profile_jsonl")
+        with export_col2:
+            st.download_button("⬇️ Export Prometheus", profiler.to_prometheus(), file_name="rerun_profile.prom",
+                               mime="text/plain", key="export_profile_prom")
 
 # =============================================
 # SESSION STATE MANAGEMENT
 # =============================================
-if 'portfolio_df' not in st.session_state:
-    st.session_state.portfolio_df = fetch_sbtc_portfolio_live()
-
+# Portfolio data lives in the process-wide cache, so a refresh only drops the
+# cached snapshot; the rerun below reloads it exactly once.
 if st.button("🔄 Refresh All Data", key="refresh_all"):
-    st.session_state.portfolio_df = fetch_sbtc_portfolio_live()
-    st.rerun()
\ No newline at end of file
+    portfolio_cache.invalidate("portfolio")
+    st.rerun()
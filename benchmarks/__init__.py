@@ -0,0 +1 @@
+"""Benchmarks for the sBTC dashboard (run with `python -m benchmarks.<name>`)."""
@@ -0,0 +1,383 @@
+"""
+Benchmark every data stage of a dashboard rerun, plus the full script.
+
+Each stage is timed on a grid of protocol counts x history lengths:
+
+    history_generation   seeded synthetic history (sbtc.synthetic)
+    fetch_validate       concurrent fetch from a local stub API + validation/flattening
+    filter               sidebar protocol filtering
+    overview             overview metric reductions (cold aggregates)
+    figures              tab 1 allocation pie + tab 2 performance figures (uncached)
+    cards_html           tab 3 search/sort + card HTML for one page
+    rebalance            target allocation from the optimizer (uncached)
+    rebalance_min_move   the same with a 2% cap and a min move of 1% of the portfolio,
+                         where most moves are small and have to be re-solved
+    projection           30-day Monte Carlo yield projection, 10k paths (uncached)
+    rolling              7-day rolling analytics over the full history
+    rolling_extend       the same analytics extended by one new day
+    history_pyramid      daily/weekly/monthly resampled levels of the full history
+    history_zoom         one protocol at the whole range (auto resolution) and at the last week, levels built
+    metrics_api          1,000 keep-alive GET /metrics?protocols=... against sbtc.api
+    script_cold          headless app.py run via Streamlit AppTest, caches cleared
+    script_rerun         second run of the same AppTest session (warm caches)
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_dashboard                         # compare with baseline
+    python -m benchmarks.bench_dashboard --save-baseline         # record a new baseline
+    python -m benchmarks.bench_dashboard --protocols 3,300 --days 30,1095 --threshold 0.25
+
+Results are compared with benchmarks/baseline.json (record it on the machine
+you compare on); stages slower than baseline x (1 + threshold) are flagged and
+the process exits with status 1. Stages registered with an absolute `budget`
+(seconds) also fail when their median exceeds it, baseline or not.
+"""
+import argparse
+import contextlib
+import copy
+import gc
+import http.client
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sbtc.aggregates import PortfolioAggregates
+from sbtc.api import MetricsServer, MetricsService
+from sbtc.cache import all_caches
+from sbtc.fetcher import ProtocolFetcher, protocol_endpoints, results_to_frame
+from sbtc.history import HistoryStore
+from sbtc.optimizer import build_plan
+from sbtc.projection import calibrate, simulate
+from sbtc.resample import HistoryPyramid
+from sbtc.rolling import DEFAULT_WINDOW, RollingAnalytics
+from sbtc.snapshot import Snapshot, SnapshotStore
+from sbtc.portfolio import Portfolio, build_portfolio
+from sbtc.stub_server import StubProtocolServer
+from sbtc.synthetic import generate_history, random_params
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+STAGES = {}
+BUDGETS = {}
+
+
+def stage(name, budget=None):
+    """
+    Register a setup function: (protocols, days) -> context manager yielding the
+    timed callable. `budget` is the most seconds its median may take.
+    """
+    def register(setup):
+        STAGES[name] = contextlib.contextmanager(setup)
+        if budget is not None:
+            BUDGETS[name] = budget
+        return setup
+    return register
+
+
+def synthetic_positions(n, seed=25):
+    rng = np.random.default_rng(seed)
+    params = random_params(n, seed)
+    balance = rng.uniform(0.05, 3.0, n)
+    return pd.DataFrame({
+        'protocol': params.index,
+        'sbtc_balance': balance,
+        'apy': params['apy_mean'].to_numpy(),
+        'yield_earned': balance * params['apy_mean'].to_numpy() / 100 * 30 / 365,
+        'tvl': rng.uniform(5000, 50000, n),
+        'risk_score': rng.integers(1, 6, n),
+    })
+
+
+@contextlib.contextmanager
+def stub_api(n, days):
+    positions = synthetic_positions(n).set_index('protocol')
+    with StubProtocolServer(positions=positions.to_dict('index'), history_days=days) as server:
+        yield server, list(positions.index)
+
+
+@stage("history_generation")
+def _history_generation(n, days):
+    params = random_params(n)
+    yield lambda: generate_history(params, days)
+
+
+@stage("fetch_validate")
+def _fetch_validate(n, days):
+    with stub_api(n, days) as (server, protocols):
+        fetcher = ProtocolFetcher(protocol_endpoints(server.url, protocols), max_workers=16, per_host_limit=16)
+
+        def run():
+            raw = results_to_frame(fetcher.fetch_all(deadline=60))
+            return build_portfolio(raw, history_path=None, history_days=days)
+
+        yield run
+        fetcher.close()
+
+
+@stage("filter")
+def _filter(n, days):
+    positions = synthetic_positions(n)
+    portfolio = Portfolio(positions, history=None)
+    selection = list(positions['protocol'][::2])
+    yield lambda: portfolio.filter(selection)
+
+
+@stage("overview")
+def _overview(n, days):
+    positions = synthetic_positions(n)
+    selection = list(positions['protocol'][::2])
+    yield lambda: PortfolioAggregates(positions).summary(selection)
+
+
+@stage("figures")
+def _figures(n, days):
+    from dashboard.figures import DEFAULT_POINT_BUDGET, allocation_figure, build_performance_figures
+    positions = synthetic_positions(n)
+    history = generate_history(random_params(n), days)
+    protocol = positions['protocol'].iloc[0]
+
+    def run():
+        allocation_figure(positions)
+        return build_performance_figures(history, protocol, None, None, DEFAULT_POINT_BUDGET)
+
+    yield run
+
+
+@stage("cards_html")
+def _cards_html(n, days):
+    from dashboard.cards import format_cards, page_bounds, query_positions
+    positions = synthetic_positions(n)
+
+    def run():
+        matching = query_positions(positions, "", "sbtc_balance", ascending=False)
+        start, stop, _ = page_bounds(len(matching), 10, 1)
+        return format_cards(matching.iloc[start:stop])
+
+    yield run
+
+
+@stage("rebalance", budget=0.1)
+def _rebalance(n, days):
+    positions = synthetic_positions(n)
+    history = generate_history(random_params(n), days)
+    yield lambda: build_plan(positions, history, max_weight=0.1, risk_budget=2.5)
+
+
+@stage("rebalance_min_move", budget=0.1)
+def _rebalance_min_move(n, days):
+    positions = synthetic_positions(n)
+    history = generate_history(random_params(n), days)
+    min_move = 0.01 * positions['sbtc_balance'].sum()
+    yield lambda: build_plan(positions, history, max_weight=0.02, risk_budget=2.2, min_move=min_move)
+
+
+@stage("projection")
+def _projection(n, days):
+    positions = synthetic_positions(n)
+    history = generate_history(random_params(n), days)
+    yield lambda: simulate(calibrate(history, positions), 30, paths=10_000)
+
+
+@stage("rolling")
+def _rolling(n, days):
+    history = generate_history(random_params(n), days)
+    yield lambda: RollingAnalytics(DEFAULT_WINDOW).update(history)
+
+
+@stage("rolling_extend")
+def _rolling_extend(n, days):
+    history = generate_history(random_params(n), days)
+    _, last = history.date_bounds()
+    analytics = RollingAnalytics(DEFAULT_WINDOW).update(HistoryStore(history.select(end=last - pd.Timedelta(days=1))))
+    # Each run extends a fresh shallow copy of the analytics by the last day
+    yield lambda: copy.copy(analytics).update(history)
+
+
+@stage("history_pyramid")
+def _history_pyramid(n, days):
+    history = generate_history(random_params(n), days)
+
+    def run():
+        pyramid = HistoryPyramid(history)
+        return [pyramid.level(resolution) for resolution in pyramid.resolutions]
+
+    yield run
+
+
+@stage("history_zoom")
+def _history_zoom(n, days):
+    history = generate_history(random_params(n), days)
+    pyramid = HistoryPyramid(history)
+    protocol = history.protocols[0]
+    for resolution in pyramid.resolutions:
+        pyramid.level(resolution)
+    week = pyramid.window_start(7)
+
+    def run():
+        pyramid.select(protocol, pyramid.auto_resolution(max_points=100))
+        return pyramid.select(protocol, pyramid.auto_resolution(week, max_points=100), week)
+
+    yield run
+
+
+@stage("metrics_api")
+def _metrics_api(n, days):
+    positions = synthetic_positions(n)
+    store = SnapshotStore()
+    store.publish(Snapshot(Portfolio(positions, generate_history(random_params(n), days))))
+    server = MetricsServer(MetricsService(store, projection_paths=10_000), port=0).start()
+    client = http.client.HTTPConnection(*server.httpd.server_address[:2])
+    path = "/metrics?protocols=" + ",".join(positions['protocol'][::2])
+
+    def run():
+        for _ in range(1000):
+            client.request("GET", path)
+            client.getresponse().read()
+
+    yield run
+    client.close()
+    server.stop()
+
+
+def _app_test(server_url, protocols, days):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.secrets["REBAR_API_URL"] = server_url
+    at.secrets["PROTOCOLS"] = ",".join(protocols)
+    at.secrets["HISTORY_DAYS"] = days
+    at.secrets["HISTORY_STORE_PATH"] = ""
+    return at
+
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError(f"app.py raised: {at.exception[0].message}")
+
+
+@stage("script_cold")
+def _script_cold(n, days):
+    with stub_api(n, days) as (server, protocols):
+        def run():
+            for cache in all_caches().values():
+                cache.invalidate()
+            _check(_app_test(server.url, protocols, days).run())
+
+        yield run
+
+
+@stage("script_rerun")
+def _script_rerun(n, days):
+    with stub_api(n, days) as (server, protocols):
+        at = _app_test(server.url, protocols, days).run()
+        _check(at)
+        yield lambda: _check(at.run())
+
+
+def time_stage(name, n, days, repeat):
+    with STAGES[name](n, days) as run:
+        run()  # warm-up (imports, JIT-free first-call costs)
+        samples = []
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - started)
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples), "repeat": repeat}
+
+
+def result_key(name, n, days):
+    return f"{name}[protocols={n},days={days}]"
+
+
+def compare(results, baseline, threshold):
+    """Keys whose median regressed more than `threshold` (fractional) vs. the baseline"""
+    regressions = {}
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference and result["median"] > reference["median"] * (1 + threshold):
+            regressions[key] = result["median"] / reference["median"] - 1
+    return regressions
+
+
+def over_budget(results):
+    """Keys whose median exceeds their stage's absolute budget"""
+    return {key: result["median"] for key, result in results.items()
+            if result["median"] > BUDGETS.get(key.split("[")[0], float("inf"))}
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sBTC dashboard data stages and full rerun.")
+    parser.add_argument("--protocols", type=_int_list, default=[3, 30, 300], help="comma-separated protocol counts")
+    parser.add_argument("--days", type=_int_list, default=[30, 365], help="comma-separated history lengths")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of stages")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in stages:
+        for n in args.protocols:
+            for days in args.days:
+                key = result_key(name, n, days)
+                results[key] = time_stage(name, n, days, args.repeat)
+                print(f"{key:<50} median {results[key]['median'] * 1000:10.2f} ms   "
+                      f"min {results[key]['min'] * 1000:10.2f} ms", flush=True)
+
+    document = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+
+    slow = over_budget(results)
+    for key, median in sorted(slow.items()):
+        print(f"OVER BUDGET {key}: {median * 1000:.1f} ms > {BUDGETS[key.split('[')[0]] * 1000:.0f} ms")
+
+    if args.save_baseline:
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline["machine"] = document["machine"]
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if slow else 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to record one.")
+        return 1 if slow else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for key, slowdown in sorted(regressions.items()):
+        print(f"REGRESSION {key}: {slowdown:+.0%} vs. baseline")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} of the baseline.")
+    return 1 if regressions or slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
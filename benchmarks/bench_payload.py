@@ -0,0 +1,105 @@
+"""
+Memory and frontend payload of the default vs. compact schema (sbtc.schema).
+
+For each protocol count x history length, the frames a rerun sends to the
+browser are built twice:
+
+    default   float64 metrics, protocol as Python strings and, for history,
+              `datetime.date` objects (the shape fetched histories used to have)
+    compact   categorical protocol, float32 metrics, datetime64 dates
+
+and measured for deep memory, Arrow IPC bytes (what Streamlit writes to the
+websocket) and the pandas -> Arrow conversion time:
+
+    positions         the portfolio positions frame
+    history           the full long-format history
+    rolling_summary   the all-protocol rolling analytics table
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_payload
+    python -m benchmarks.bench_payload --protocols 3,300 --days 30,1825 --output payload.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from sbtc.rolling import DEFAULT_WINDOW, RollingAnalytics
+from sbtc.schema import arrow_nbytes, compact_frame, compact_positions, to_arrow
+from sbtc.synthetic import generate_history, random_params
+
+from .bench_dashboard import _int_list, synthetic_positions
+
+
+def default_history(history):
+    frame = history.frame.reset_index()
+    return frame.assign(
+        protocol=frame['protocol'].astype(str).astype(object),
+        date=frame['date'].dt.date,
+        **{column: frame[column].astype(np.float64) for column in history.metrics}
+    )
+
+
+def frames(n, days):
+    """{name: (default frame, compact frame)} for `n` protocols and `days` of history"""
+    positions = synthetic_positions(n)
+    history = generate_history(random_params(n), days)
+    summary = RollingAnalytics(DEFAULT_WINDOW).update(history).summary().rename_axis('protocol').reset_index()
+    return {
+        'positions': (positions, compact_positions(positions)),
+        'history': (default_history(history), history.frame.reset_index()),
+        'rolling_summary': (summary.astype({c: np.float64 for c in summary.columns if c not in ('protocol', 'date')}),
+                            compact_frame(summary)),
+    }
+
+
+def convert_seconds(frame, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        to_arrow(frame)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def measure(frame, repeat):
+    return {
+        'memory_bytes': int(frame.memory_usage(deep=True).sum()),
+        'arrow_bytes': arrow_nbytes(frame),
+        'convert_ms': convert_seconds(frame, repeat) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare memory and Arrow payload of the default and compact schema.")
+    parser.add_argument("--protocols", type=_int_list, default=[3, 30, 300], help="comma-separated protocol counts")
+    parser.add_argument("--days", type=_int_list, default=[30, 365], help="comma-separated history lengths")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for n in args.protocols:
+        for days in args.days:
+            for name, (default, compact) in frames(n, days).items():
+                key = f"{name}[protocols={n},days={days}]"
+                before, after = measure(default, args.repeat), measure(compact, args.repeat)
+                results[key] = {'default': before, 'compact': after}
+                print(f"{key:<45} memory {before['memory_bytes'] / 1024:9.1f} -> {after['memory_bytes'] / 1024:9.1f} KiB"
+                      f"   arrow {before['arrow_bytes'] / 1024:9.1f} -> {after['arrow_bytes'] / 1024:9.1f} KiB"
+                      f"   convert {before['convert_ms']:7.2f} -> {after['convert_ms']:7.2f} ms", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"machine": {"python": platform.python_version(), "platform": platform.platform()},
+                       "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
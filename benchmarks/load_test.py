@@ -0,0 +1,355 @@
+"""
+Multi-session load test for the dashboard.
+
+Starts app.py with `streamlit run` on a local port (live data from a local
+stub API) and drives many simulated browser sessions against it over
+Streamlit's websocket protocol, the same protobuf messages the frontend
+sends. Each session loads the page, then performs a seeded random sequence
+of interactions:
+
+    toggle_protocol   add/remove one protocol in the sidebar multiselect
+    switch_protocol   pick another protocol in `tab2_protocol_select`
+    refresh           press "Refresh All Data" (drops the shared portfolio snapshot)
+
+Widgets inside a fragment send a fragment-scoped rerun, like the browser.
+For every concurrency level it reports p50/p95/p99 rerun latency (send to
+`script_finished`, overall and per interaction), page-load latency,
+throughput in reruns per second, server RSS and RSS added per connected
+session.
+
+Usage (from the repository root):
+
+    python -m benchmarks.load_test --concurrency 1,4,16,64 --actions 20 --output load.json
+    python -m benchmarks.load_test --baseline load.json          # compare with an earlier run
+    python -m benchmarks.load_test --secret COMPACT_SCHEMA=true --secret PROJECTION_PATHS=10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from .bench_dashboard import APP_PATH, _int_list, stub_api
+
+ACTIONS = ('toggle_protocol', 'switch_protocol', 'refresh')
+DEFAULT_WEIGHTS = (0.5, 0.4, 0.1)
+PERCENTILES = (50, 95, 99)
+WIDGET_TYPES = ('multiselect', 'selectbox', 'button')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _toml_value(value):
+    return json.dumps(value) if isinstance(value, (str, bool, int, float)) else json.dumps(str(value))
+
+
+def _parse_secret(value):
+    name, _, raw = value.partition("=")
+    try:
+        return name, json.loads(raw)
+    except ValueError:
+        return name, raw
+
+
+def rss_bytes(pid):
+    """Resident set size of process `pid` (None where /proc is unavailable)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+class DashboardServer:
+    """`streamlit run app.py` on a free local port with the given secrets, as a context manager"""
+
+    def __init__(self, secrets, startup_timeout=60.0):
+        self.secrets = secrets
+        self.startup_timeout = startup_timeout
+        self.port = _free_port()
+        self.process = None
+        self._tmp = None
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def rss(self):
+        return rss_bytes(self.process.pid)
+
+    def __enter__(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        secrets_path = os.path.join(self._tmp.name, "secrets.toml")
+        with open(secrets_path, "w") as f:
+            f.writelines(f"{name} = {_toml_value(value)}\n" for name, value in self.secrets.items())
+        self.log = open(os.path.join(self._tmp.name, "server.log"), "w+")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+             "--server.port", str(self.port), "--server.enableXsrfProtection", "false",
+             "--server.enableCORS", "false", "--secrets.files", secrets_path,
+             "--browser.gatherUsageStats", "false"],
+            cwd=os.path.dirname(APP_PATH), stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1).read()
+                return self
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.log.seek(0)
+                    self.__exit__(None, None, None)
+                    raise RuntimeError(f"streamlit server did not start:\n{self.log.read()[-2000:]}")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        self._tmp.cleanup()
+
+
+class Session:
+    """
+    One simulated browser session. Widget ids, options and fragment ids are
+    read from the deltas of each run; the widget states a browser would hold
+    are sent back with every rerun.
+    """
+
+    def __init__(self, url, seed):
+        self.url = url
+        self.rng = random.Random(seed)
+        self.widgets = {}  # user key (or label) -> (kind, proto, fragment_id)
+        self.states = {}  # widget id -> WidgetState
+        self.selected = None
+        self.samples = []  # (action, seconds, ok)
+        self.ws = None
+
+    async def connect(self):
+        import websockets
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        await self.ws.close()
+
+    def _track(self, msg):
+        delta = msg.delta
+        if delta.WhichOneof("type") != "new_element":
+            return False
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            return True
+        if kind in WIDGET_TYPES:
+            widget = getattr(element, kind)
+            key = widget.id.rsplit("-", 1)[-1]
+            self.widgets[widget.label if key == "None" else key] = (kind, widget, delta.fragment_id)
+        return False
+
+    async def _rerun(self, action, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        back = BackMsg()
+        back.rerun_script.query_string = ""
+        back.rerun_script.page_script_hash = ""
+        back.rerun_script.widget_states.widgets.extend(self.states.values())
+        if fragment_id:
+            back.rerun_script.fragment_id = fragment_id
+        failed = False
+        started = time.perf_counter()
+        await self.ws.send(back.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "delta":
+                failed = self._track(msg) or failed
+            elif kind == "script_finished":
+                status = msg.script_finished
+                if status == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue  # st.rerun(): the follow-up run reports the result
+                ok = not failed and status != ForwardMsg.FINISHED_WITH_COMPILE_ERROR
+                break
+        self.samples.append((action, time.perf_counter() - started, ok))
+        # Triggers (button clicks) only fire once
+        self.states = {i: s for i, s in self.states.items() if s.WhichOneof("value") != "trigger_value"}
+
+    def _set(self, name, field, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        _, widget, fragment_id = self.widgets[name]
+        state = WidgetState(id=widget.id)
+        if field == "string_array_value":
+            state.string_array_value.data.extend(value)
+        else:
+            setattr(state, field, value)
+        self.states[widget.id] = state
+        return fragment_id
+
+    async def load(self):
+        await self._rerun('load')
+
+    async def interact(self, action):
+        if action == 'toggle_protocol':
+            name = next(n for n, (kind, *_) in self.widgets.items() if kind == 'multiselect')
+            options = list(self.widgets[name][1].options)
+            selected = list(options) if self.selected is None else self.selected
+            option = self.rng.choice(options)
+            if option in selected and len(selected) > 1:
+                selected.remove(option)
+            elif option not in selected:
+                selected.append(option)
+            self.selected = selected
+            fragment_id = self._set(name, "string_array_value", selected)
+        elif action == 'switch_protocol':
+            options = list(self.widgets['tab2_protocol_select'][1].options)
+            fragment_id = self._set('tab2_protocol_select', "string_value", self.rng.choice(options))
+        else:
+            fragment_id = self._set('refresh_all', "trigger_value", True)
+        await self._rerun(action, fragment_id)
+
+    async def play(self, actions, weights, think):
+        for action in self.rng.choices(ACTIONS, weights, k=actions):
+            try:
+                await self.interact(action)
+            except (KeyError, StopIteration):  # widget missing after a failed run
+                self.samples.append((action, 0.0, False))
+            if think:
+                await asyncio.sleep(self.rng.expovariate(1 / think))
+
+
+def summarize(seconds):
+    if not seconds:
+        return {'count': 0}
+    values = np.asarray(seconds) * 1000
+    summary = {f"p{p}_ms": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary.update(count=len(values), mean_ms=float(values.mean()), max_ms=float(values.max()))
+    return summary
+
+
+async def run_level(server, concurrency, actions, weights, think, seed):
+    """Connect `concurrency` sessions at once; latency, throughput and memory for the level"""
+    rss_before = server.rss()
+    sessions = [Session(server.url, seed * 1000 + i) for i in range(concurrency)]
+    await asyncio.gather(*(s.connect() for s in sessions))
+    started = time.perf_counter()
+    await asyncio.gather(*(s.load() for s in sessions))
+    rss_loaded = server.rss()
+    await asyncio.gather(*(s.play(actions, weights, think) for s in sessions))
+    elapsed = time.perf_counter() - started
+    rss_after = server.rss()
+    await asyncio.gather(*(s.close() for s in sessions))
+
+    samples = [sample for s in sessions for sample in s.samples]
+    interactions = [sample for sample in samples if sample[0] != 'load']
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'reruns': len(samples),
+        'errors': sum(1 for *_, ok in samples if not ok),
+        'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+        'latency': summarize([seconds for _, seconds, ok in interactions if ok]),
+        'load_latency': summarize([seconds for action, seconds, ok in samples if ok and action == 'load']),
+        'by_action': {a: summarize([seconds for action, seconds, ok in samples if ok and action == a]) for a in ACTIONS},
+        'rss_mb': None if rss_after is None else rss_after / 2 ** 20,
+        'rss_per_session_mb': None if rss_before is None else max(rss_loaded - rss_before, 0) / 2 ** 20 / concurrency,
+    }
+
+
+def compare(levels, baseline):
+    """Lines comparing p95 latency and throughput with a baseline document, per concurrency"""
+    reference = {level['concurrency']: level for level in baseline.get('levels', [])}
+    lines = []
+    for level in levels:
+        old = reference.get(level['concurrency'])
+        if not old or not old['latency'].get('count') or not level['latency'].get('count'):
+            continue
+        lines.append(f"concurrency {level['concurrency']:>3}: p95 {level['latency']['p95_ms'] / old['latency']['p95_ms'] - 1:+.0%}"
+                     f", throughput {level['throughput_rps'] / old['throughput_rps'] - 1:+.0%} vs. baseline")
+    return lines
+
+
+def _format_level(level):
+    latency = level['latency']
+    rss = "n/a" if level['rss_mb'] is None else f"{level['rss_mb']:7.1f} MiB (+{level['rss_per_session_mb']:.2f}/session)"
+    return (f"sessions {level['concurrency']:>3}  reruns {level['reruns']:>5}  errors {level['errors']:>3}  "
+            f"p50 {latency.get('p50_ms', 0):8.1f} ms  p95 {latency.get('p95_ms', 0):8.1f} ms  "
+            f"p99 {latency.get('p99_ms', 0):8.1f} ms  {level['throughput_rps']:6.2f} reruns/s  RSS {rss}")
+
+
+async def run(args, weights, secrets):
+    levels = []
+    with stub_api(args.protocols, args.days) as (api, protocols):
+        secrets = dict({"REBAR_API_URL": api.url, "PROTOCOLS": ",".join(protocols), "HISTORY_DAYS": args.days,
+                        "HISTORY_STORE_PATH": ""}, **secrets)
+        with DashboardServer(secrets) as server:
+            warmup = Session(server.url, args.seed)  # imports and the first snapshot
+            await warmup.connect()
+            await warmup.load()
+            await warmup.close()
+            for concurrency in args.concurrency:
+                level = await run_level(server, concurrency, args.actions, weights, args.think, args.seed)
+                levels.append(level)
+                print(_format_level(level), flush=True)
+    return levels, secrets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with many concurrent websocket sessions.")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16], help="comma-separated session counts")
+    parser.add_argument("--actions", type=int, default=20, help="interactions per session after the page load")
+    parser.add_argument("--weights", default=",".join(map(str, DEFAULT_WEIGHTS)),
+                        help="relative frequency of toggle_protocol,switch_protocol,refresh")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between interactions (seconds)")
+    parser.add_argument("--protocols", type=int, default=30, help="protocols served by the stub API")
+    parser.add_argument("--days", type=int, default=90, help="history length")
+    parser.add_argument("--secret", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra Streamlit secret for the server (value parsed as JSON when possible)")
+    parser.add_argument("--seed", type=int, default=25)
+    parser.add_argument("--baseline", help="earlier --output document to compare with")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    weights = [float(w) for w in args.weights.split(",")]
+    if len(weights) != len(ACTIONS):
+        parser.error(f"--weights needs {len(ACTIONS)} values")
+    secrets = dict(_parse_secret(s) for s in args.secret)
+    secrets.setdefault("PROJECTION_PATHS", 10_000)
+    levels, secrets = asyncio.run(run(args, weights, secrets))
+
+    document = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"actions": args.actions, "weights": dict(zip(ACTIONS, weights)), "think_s": args.think,
+                   "protocols": args.protocols, "days": args.days, "seed": args.seed,
+                   "secrets": {k: v for k, v in secrets.items() if k != "REBAR_API_URL"}},
+        "levels": levels,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            for line in compare(levels, json.load(f)):
+                print(line)
+    return 1 if any(level['errors'] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
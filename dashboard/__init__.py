@@ -0,0 +1,6 @@
+"""
+View helpers for the Streamlit dashboard (figures, HTML rendering).
+
+Unlike the `sbtc` analytics core, modules here may depend on Plotly and
+Streamlit.
+"""
@@ -0,0 +1,54 @@
+"""
+Sidebar "Portfolio Alerts" panel rendered from sbtc.alerts.Alert tuples.
+
+Each severity keeps the icon and colours of the original static panel;
+the panel is emitted as one HTML block and capped at `limit` rows.
+"""
+import html
+
+SEVERITY_ICONS = {
+    'critical': ("rgba(239, 68, 68, 0.2)", """<svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#ef4444" stroke-width="2">
+                    <path d="M10.29 3.86L1.82 18a2 2 0 0 0 1.71 3h16.94a2 2 0 0 0 1.71-3L13.71 3.86a2 2 0 0 0-3.42 0z"></path>
+                    <line x1="12" y1="9" x2="12" y2="13"></line>
+                    <line x1="12" y1="17" x2="12.01" y2="17"></line>
+                </svg>"""),
+    'warning': ("rgba(234, 179, 8, 0.2)", """<svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#f59e0b" stroke-width="2">
+                    <circle cx="12" cy="12" r="10"></circle>
+                    <line x1="12" y1="8" x2="12" y2="12"></line>
+                    <line x1="12" y1="16" x2="12.01" y2="16"></line>
+                </svg>"""),
+    'info': ("rgba(76, 175, 80, 0.2)", """<svg width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="#4CAF50" stroke-width="2">
+                    <path d="M22 11.08V12a10 10 0 1 1-5.93-9.14"></path>
+                    <polyline points="22 4 12 14.01 9 11.01"></polyline>
+                </svg>"""),
+}
+
+ALERT_TEMPLATE = """
+        <div style="display: flex; align-items: center; margin-bottom: 15px;">
+            <div style="background: {background}; padding: 5px; border-radius: 6px; margin-right: 10px;">
+                {icon}
+            </div>
+            <div>
+                <p style="color: #f8f9fa; margin: 0; font-size: 0.9rem;">{title}</p>
+                <p style="color: #94a3b8; margin: 0; font-size: 0.8rem;">{detail}</p>
+            </div>
+        </div>"""
+
+
+def alerts_html(alerts, limit=5):
+    """The Portfolio Alerts panel for already sorted alerts"""
+    rows = []
+    for alert in alerts[:limit]:
+        background, icon = SEVERITY_ICONS[alert.severity]
+        rows.append(ALERT_TEMPLATE.format(background=background, icon=icon, title=html.escape(alert.title),
+                                          detail=html.escape(alert.detail)))
+    if not rows:
+        rows.append('\n        <p style="color: #94a3b8; margin: 0; font-size: 0.9rem;">No alerts. Everything looks healthy.</p>')
+    more = len(alerts) - limit
+    if more > 0:
+        rows.append(f'\n        <p style="color: #94a3b8; margin: 0; font-size: 0.8rem;">+{more} more</p>')
+    return f"""
+    <div style="background: rgba(30, 41, 59, 0.7); padding: 15px; border-radius: 10px; margin-bottom: 20px;">
+        <h3 style="color: #f8f9fa; margin-top: 0;">Portfolio Alerts</h3>{"".join(rows)}
+    </div>
+    """
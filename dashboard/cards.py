@@ -0,0 +1,90 @@
+"""
+Protocol Details cards: search, sort, paginate and render in one pass.
+
+Only the rows on the current page are formatted, and all of them are
+formatted together with NumPy string operations, then emitted as a single
+HTML block. Rerun cost and payload therefore depend on the page size rather
+than on how many positions a wallet holds.
+"""
+import html
+import math
+
+import numpy as np
+
+SORT_OPTIONS = {
+    "sBTC Balance": "sbtc_balance",
+    "APY": "apy",
+    "Yield (30d)": "yield_earned",
+    "Risk": "risk_score",
+    "Protocol": "protocol",
+}
+
+CARD_TEMPLATE = """
+<div class="protocol-card">
+    <h3 style="color: #f8f9fa; margin-bottom: 5px;">{protocol}</h3>
+    <div style="display: flex; justify-content: space-between;">
+        <div>
+            <p style="color: #94a3b8; margin: 2px 0;">sBTC Balance</p>
+            <p style="color: #f8f9fa; font-weight: bold; margin: 2px 0;">{balance}</p>
+        </div>
+        <div>
+            <p style="color: #94a3b8; margin: 2px 0;">APY</p>
+            <p style="color: #4CAF50; font-weight: bold; margin: 2px 0;">{apy}%</p>
+        </div>
+        <div>
+            <p style="color: #94a3b8; margin: 2px 0;">Yield (30d)</p>
+            <p style="color: #f8f9fa; font-weight: bold; margin: 2px 0;">{yield_earned}</p>
+        </div>
+        <div>
+            <p style="color: #94a3b8; margin: 2px 0;">Risk</p>
+            <p style="color: {risk_color}; font-weight: bold; margin: 2px 0;">
+                {risk_label}
+            </p>
+        </div>
+    </div>
+</div>
+"""
+
+# Split the template once at its placeholders so cards can be assembled with
+# element-wise array concatenation instead of per-row str.format calls.
+_FIELDS = ['protocol', 'balance', 'apy', 'yield_earned', 'risk_color', 'risk_label']
+_PIECES = [CARD_TEMPLATE]
+for _field in _FIELDS:
+    _head, _tail = _PIECES.pop().split("{" + _field + "}")
+    _PIECES += [_head, _tail]
+
+
+def query_positions(df, search="", sort_by="sbtc_balance", ascending=False):
+    """Rows whose protocol contains `search` (case-insensitive), sorted by `sort_by`"""
+    if search:
+        df = df[df['protocol'].astype(str).str.contains(search, case=False, regex=False)]
+    if sort_by in df.columns:
+        df = df.sort_values(sort_by, ascending=ascending, kind='stable')
+    return df
+
+
+def page_bounds(total, page_size, page):
+    """(start, stop, page_count) for 1-based `page`, clamped to the valid range"""
+    page_count = max(1, math.ceil(total / page_size))
+    page = min(max(1, int(page)), page_count)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total), page_count
+
+
+def format_cards(df):
+    """HTML for all rows of `df`, formatted column-wise in one pass"""
+    if df.empty:
+        return ""
+    risk = df['risk_score'].to_numpy(dtype=float)
+    values = {
+        'protocol': np.array([html.escape(str(p)) for p in df['protocol']], dtype=object),
+        'balance': np.char.mod('%.4f', df['sbtc_balance'].to_numpy(dtype=float)).astype(object),
+        'apy': np.char.mod('%.2f', df['apy'].to_numpy(dtype=float)).astype(object),
+        'yield_earned': np.char.mod('%.4f', df['yield_earned'].to_numpy(dtype=float)).astype(object),
+        'risk_color': np.select([risk > 3, risk > 1], ['#ef4444', '#f59e0b'], '#4CAF50').astype(object),
+        'risk_label': np.select([risk > 3, risk > 1], ['High', 'Medium'], 'Low').astype(object),
+    }
+    cards = np.full(len(df), _PIECES[0], dtype=object)
+    for field, piece in zip(_FIELDS, _PIECES[1:]):
+        cards = cards + values[field] + piece
+    return "".join(cards)
@@ -0,0 +1,185 @@
+"""
+Plotly figures for the Protocol Breakdown tabs, rolling analytics, projections and the live stream panel.
+
+Performance Analysis figures are keyed by (protocol, date range, resolution,
+history version, point budget) in a process-wide LRU cache, so a rerun with
+unchanged inputs reuses the figures built earlier. With a resolution they are
+drawn from that level of the resampled history pyramid (sbtc.resample); long
+series are LTTB-downsampled to the point budget before plotting to keep the
+websocket payload small.
+"""
+import plotly.express as px
+import plotly.graph_objects as go
+
+from sbtc.cache import get_lru_cache
+from sbtc.downsample import downsample_frame
+from sbtc.resample import get_pyramid
+
+DEFAULT_POINT_BUDGET = 1500
+
+TRANSPARENT_LAYOUT = dict(
+    plot_bgcolor='rgba(0,0,0,0)',
+    paper_bgcolor='rgba(0,0,0,0)',
+    font_color='white'
+)
+
+
+def allocation_figure(positions):
+    """Donut chart of sBTC allocation by protocol (Portfolio Distribution tab)"""
+    fig = px.pie(
+        positions,
+        values='sbtc_balance',
+        names='protocol',
+        hole=0.4,
+        color_discrete_sequence=px.colors.sequential.Viridis
+    )
+    fig.update_layout(title="sBTC Allocation by Protocol", **TRANSPARENT_LAYOUT)
+    return fig
+
+
+BUCKET_LABELS = {'hourly': "Hourly", 'daily': "Daily", 'weekly': "Weekly", 'monthly': "Monthly"}
+
+
+def resampled_history(history, protocol, resolution, start=None, end=None):
+    """
+    One protocol's history at `resolution` in the raw history's column layout:
+    closing balance, mean APY and summed yield per bucket, plus apy_low/apy_high.
+    """
+    buckets = get_pyramid(history).select(protocol, resolution, start, end, aggregates=('low', 'high', 'close', 'mean', 'sum'))
+    return buckets.assign(
+        sbtc_balance=buckets['sbtc_balance_close'], apy=buckets['apy_mean'], yield_earned=buckets['yield_earned_sum']
+    )[['date', 'sbtc_balance', 'apy', 'yield_earned', 'apy_low', 'apy_high']]
+
+
+def build_performance_figures(history, protocol, start, end, max_points, resolution=None):
+    """
+    Uncached (line, bar, area) figures for one protocol, or None without history.
+    Without a `resolution` the raw history is plotted.
+    """
+    if resolution is None:
+        selected_data = history.for_protocol(protocol, start, end)
+    else:
+        selected_data = resampled_history(history, protocol, resolution, start, end)
+    if selected_data.empty:
+        return None
+
+    line_data = downsample_frame(selected_data, 'date', ['sbtc_balance', 'apy'], max_points)
+    line = px.line(
+        line_data,
+        x='date',
+        y=['sbtc_balance', 'apy'],
+        title=f"{protocol} Historical Performance",
+        labels={'value': 'Metric', 'variable': 'Legend'},
+        color_discrete_map={'sbtc_balance': '#4CAF50', 'apy': '#636EFA'}
+    )
+    if resolution is not None and resolution != get_pyramid(history).resolutions[0]:
+        # Buckets span several raw points: shade each bucket's APY low-high range
+        line.add_trace(go.Scatter(x=line_data['date'], y=line_data['apy_high'], mode='lines', line=dict(width=0),
+                                  showlegend=False, hoverinfo='skip'))
+        line.add_trace(go.Scatter(x=line_data['date'], y=line_data['apy_low'], mode='lines', line=dict(width=0),
+                                  fill='tonexty', fillcolor='rgba(99, 110, 250, 0.2)', name="APY low-high"))
+    line.update_layout(hovermode="x unified", **TRANSPARENT_LAYOUT)
+    line.update_yaxes(title_text="sBTC Balance / APY (%)")
+
+    bar = px.bar(
+        downsample_frame(selected_data, 'date', ['yield_earned'], max_points),
+        x='date',
+        y='yield_earned',
+        title=f"{BUCKET_LABELS.get(resolution, 'Daily')} Yield Earned",
+        color_discrete_sequence=['#F0B90B']
+    ).update_layout(**TRANSPARENT_LAYOUT)
+
+    area = px.area(
+        downsample_frame(selected_data, 'date', ['sbtc_balance'], max_points),
+        x='date',
+        y='sbtc_balance',
+        title="sBTC Balance Growth",
+        color_discrete_sequence=['#4CAF50']
+    ).update_layout(**TRANSPARENT_LAYOUT)
+    return line, bar, area
+
+
+def performance_figures(history, protocol, start=None, end=None, max_points=DEFAULT_POINT_BUDGET,
+                        resolution=None, cache_size=64):
+    """
+    (performance line, yield bar, balance area) figures for one protocol at
+    `resolution` (raw history when None), or None when the protocol has no
+    history in the requested range.
+    """
+    cache = get_lru_cache("figures", max_entries=cache_size)
+    key = ("performance", protocol, start, end, resolution, history.version, max_points)
+    return cache.get(key, lambda: build_performance_figures(history, protocol, start, end, max_points, resolution))
+
+
+def build_rolling_figures(rolling, protocol, max_points):
+    """Uncached (APY with rolling mean/band, drawdown with cumulative yield) figures, or None"""
+    data = rolling.for_protocol(protocol)
+    if data.empty:
+        return None
+    data = downsample_frame(data, 'date', ['apy', 'drawdown', 'cum_yield'], max_points)
+    upper, lower = data['apy_mean'] + data['apy_std'], data['apy_mean'] - data['apy_std']
+
+    apy = go.Figure()
+    apy.add_trace(go.Scatter(x=data['date'], y=upper, mode='lines', line=dict(width=0), showlegend=False,
+                             hoverinfo='skip'))
+    apy.add_trace(go.Scatter(x=data['date'], y=lower, mode='lines', line=dict(width=0), fill='tonexty',
+                             fillcolor='rgba(99, 110, 250, 0.2)', name="±1σ"))
+    apy.add_trace(go.Scatter(x=data['date'], y=data['apy'], mode='lines', line=dict(color='#636EFA', width=1),
+                             name="APY"))
+    apy.add_trace(go.Scatter(x=data['date'], y=data['apy_mean'], mode='lines', line=dict(color='#F0B90B', width=2),
+                             name=f"{rolling.window}d mean"))
+    apy.update_layout(title=f"{protocol} APY with {rolling.window}-Day Rolling Mean", yaxis_title="APY (%)",
+                      hovermode="x unified", **TRANSPARENT_LAYOUT)
+
+    drawdown = go.Figure()
+    drawdown.add_trace(go.Scatter(x=data['date'], y=data['drawdown'] * 100, mode='lines', fill='tozeroy',
+                                  line=dict(color='#ef4444', width=1), name="Drawdown (%)"))
+    drawdown.add_trace(go.Scatter(x=data['date'], y=data['cum_yield'], mode='lines', yaxis='y2',
+                                  line=dict(color='#4CAF50', width=2), name="Cumulative yield (sBTC)"))
+    drawdown.update_layout(
+        title="Balance Drawdown & Cumulative Yield", yaxis=dict(title="Drawdown (%)"),
+        yaxis2=dict(title="sBTC", overlaying='y', side='right', showgrid=False), hovermode="x unified",
+        **TRANSPARENT_LAYOUT
+    )
+    return apy, drawdown
+
+
+def rolling_figures(rolling, protocol, max_points=DEFAULT_POINT_BUDGET, cache_size=64):
+    """
+    (APY with rolling mean and ±1σ band, drawdown with cumulative yield)
+    figures from a RollingAnalytics, or None when the protocol has no history.
+    """
+    cache = get_lru_cache("figures", max_entries=cache_size)
+    key = ("rolling", protocol, rolling.window, rolling.version, max_points)
+    return cache.get(key, lambda: build_rolling_figures(rolling, protocol, max_points))
+
+
+def live_figure(series, field='apy', max_points=DEFAULT_POINT_BUDGET):
+    """Line per protocol of a streamed `field` (from StreamHub.series); rebuilt every tick, so not cached"""
+    per_protocol = max(3, max_points // max(1, series['protocol'].nunique()))
+    data = series.groupby('protocol', group_keys=False)[['time', 'protocol', field]].apply(
+        lambda g: downsample_frame(g, 'time', [field], per_protocol)
+    )
+    title, label = {'apy': ("Live APY", "APY (%)"), 'tvl': ("Live TVL", "TVL")}.get(field, (field, field))
+    fig = px.line(data, x='time', y=field, color='protocol', title=title, labels={field: label, 'time': ''})
+    fig.update_layout(hovermode="x unified", uirevision=field, **TRANSPARENT_LAYOUT)
+    return fig
+
+
+def fan_figure(projection, metric='yield', title=None):
+    """Fan chart of a Projection: 5-95 and 25-75 percentile bands around the median"""
+    bands = projection.bands[metric]
+    days = bands.index
+    label = {'yield': "Cumulative Yield (sBTC)", 'balance': "Balance (sBTC)", 'apy': "APY (%)"}.get(metric, metric)
+    fig = go.Figure()
+    for low, high, opacity in ((5, 95, 0.15), (25, 75, 0.3)):
+        fig.add_trace(go.Scatter(x=days, y=bands[high], mode='lines', line=dict(width=0), showlegend=False,
+                                 hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=days, y=bands[low], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f'rgba(76, 175, 80, {opacity})', name=f"P{low}–P{high}"))
+    fig.add_trace(go.Scatter(x=days, y=bands[50], mode='lines', line=dict(color='#F0B90B', width=2), name="Median"))
+    fig.update_layout(
+        title=title or f"Projected {label}", xaxis_title="Days ahead", yaxis_title=label,
+        hovermode="x unified", **TRANSPARENT_LAYOUT
+    )
+    return fig
@@ -0,0 +1,57 @@
+"""
+HTML for the "AI-Powered Portfolio Insights" cards, from sbtc.insights.Insights.
+
+Markup matches the original static Portfolio Health bars and numbered
+recommendations; only the numbers, labels and texts are filled in.
+"""
+import html
+
+HEALTH_NAMES = (('diversity', "Diversity"), ('yield_efficiency', "Yield Efficiency"),
+                ('risk_management', "Risk Management"))
+
+HEALTH_BAR = """
+        <div style="margin: 15px 0;">
+            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+                <span style="color: #94a3b8;">{name}</span>
+                <span style="color: #f8f9fa;">{label}</span>
+            </div>
+            <div style="height: 8px; background: #2d3748; border-radius: 4px;">
+                <div style="width: {score:.0f}%; height: 100%; background: {color}; border-radius: 4px;"></div>
+            </div>
+        </div>"""
+
+RECOMMENDATION = """
+            <div style="display: flex; align-items: flex-start; margin-bottom: 15px;">
+                <div style="background: #4CAF50; color: white; border-radius: 50%; width: 24px; height: 24px; display: flex; align-items: center; justify-content: center; margin-right: 10px; flex-shrink: 0;">{rank}</div>
+                <div>
+                    <p style="color: #f8f9fa; margin: 0; font-weight: 500;">{title}</p>
+                    <p style="color: #94a3b8; margin: 0; font-size: 0.9rem;">{detail}</p>
+                </div>
+            </div>"""
+
+
+def health_html(insights):
+    bars = "".join(
+        HEALTH_BAR.format(name=name, label=insights.scores[key][1], score=insights.scores[key][0],
+                          color=insights.scores[key][2])
+        for key, name in HEALTH_NAMES
+    )
+    return f"""
+    <div style="background: rgba(30, 41, 59, 0.7); padding: 20px; border-radius: 10px; height: 100%;">
+        <h3 style="color: #f8f9fa;">Portfolio Health</h3>{bars}
+    </div>
+    """
+
+
+def recommendations_html(insights):
+    items = "".join(
+        RECOMMENDATION.format(rank=rank, title=html.escape(r.title), detail=html.escape(r.detail))
+        for rank, r in enumerate(insights.recommendations, start=1)
+    )
+    return f"""
+    <div style="background: rgba(30, 41, 59, 0.7); padding: 20px; border-radius: 10px; height: 100%;">
+        <h3 style="color: #f8f9fa;">AI Recommendations</h3>
+        <div style="margin-top: 15px;">{items}
+        </div>
+    </div>
+    """
@@ -0,0 +1,78 @@
+"""
+Analytics core for the sBTC DeFi Intelligence Dashboard.
+
+Everything in this package is plain Python/pandas/NumPy so it can be reused
+outside of the Streamlit script (batch jobs, services, benchmarks); nothing
+here imports Streamlit or Plotly. Public names are loaded lazily, so
+`import sbtc` itself costs next to nothing:
+
+    import sbtc
+    portfolio = sbtc.load_portfolio()
+    portfolio.overview()
+"""
+import importlib
+
+_EXPORTS = {
+    'Portfolio': 'portfolio',
+    'build_portfolio': 'portfolio',
+    'load_portfolio': 'portfolio',
+    'fetch_sbtc_portfolio_live': 'portfolio',
+    'validate_portfolio': 'portfolio',
+    'dummy_portfolio': 'portfolio',
+    'filter_portfolio': 'portfolio',
+    'load_history': 'portfolio',
+    'PortfolioAggregates': 'aggregates',
+    'get_aggregates': 'aggregates',
+    'risk_level': 'aggregates',
+    'HistoryStore': 'history',
+    'generate_history': 'synthetic',
+    'mock_history': 'synthetic',
+    'ParquetHistoryStore': 'storage',
+    'open_history_store': 'storage',
+    'ProtocolFetcher': 'fetcher',
+    'SWRCache': 'cache',
+    'LRUCache': 'cache',
+    'get_cache': 'cache',
+    'plan_rebalance': 'optimizer',
+    'optimize_weights': 'optimizer',
+    'project': 'projection',
+    'calibrate': 'projection',
+    'AddressIndex': 'indexer',
+    'AddressIndexer': 'indexer',
+    'IncompleteSyncError': 'indexer',
+    'get_indexer': 'indexer',
+    'Snapshot': 'snapshot',
+    'SnapshotStore': 'snapshot',
+    'build_snapshot': 'snapshot',
+    'get_snapshot_store': 'snapshot',
+    'MetricsService': 'api',
+    'UnknownProtocolsError': 'api',
+    'MetricsServer': 'api',
+    'get_metrics_server': 'api',
+    'HistoryPyramid': 'resample',
+    'get_pyramid': 'resample',
+    'RollingAnalytics': 'rolling',
+    'get_rolling': 'rolling',
+    'get_insights': 'insights',
+    'insight_features': 'insights',
+    'AlertEngine': 'alerts',
+    'get_alert_engine': 'alerts',
+    'StreamHub': 'streaming',
+    'StreamIngestor': 'streaming',
+    'get_stream': 'streaming',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
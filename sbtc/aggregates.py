@@ -0,0 +1,169 @@
+"""
+Incremental aggregates for the Portfolio Overview metrics.
+
+Per-protocol partial sums (balance, balance x APY, yield, risk, row count and
+count of rows with a risk score, so missing scores are skipped like mean()) are
+kept in NumPy arrays, so the overview for any protocol selection is answered
+in O(k) for k selected protocols without slicing or copying DataFrames.
+Results are memoized by (selection, data version), and `update()` adjusts a
+single protocol in place instead of rebuilding everything.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .hashing import frame_fingerprint
+
+SUM_FIELDS = ('sbtc_balance', 'balance_apy', 'yield_earned', 'risk_score', 'risk_rows', 'rows')
+OVERVIEW_COLUMNS = ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'risk_score']
+
+
+def risk_level(avg_risk_score):
+    """Map an average 1-5 risk score to a (label, color) pair for display"""
+    if not avg_risk_score or np.isnan(avg_risk_score):
+        return "N/A", "#94a3b8"  # Neutral color
+    if avg_risk_score <= 2:
+        return "Low", "#4CAF50"  # Green
+    if avg_risk_score <= 3.5:
+        return "Medium", "#f59e0b"  # Orange
+    return "High", "#ef4444"  # Red
+
+
+class PortfolioAggregates:
+    """Per-protocol partial sums answering overview metrics for any selection."""
+
+    def __init__(self, portfolio_df, memo_size=256):
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self.version = 0
+
+        frame = portfolio_df.reindex(columns=OVERVIEW_COLUMNS)
+        names, codes = np.unique(frame['protocol'].astype(str).to_numpy(), return_inverse=True)
+        self.protocols = list(names)
+        self._slot = {p: i for i, p in enumerate(self.protocols)}
+
+        balance = frame['sbtc_balance'].to_numpy(np.float64)
+        risk = frame['risk_score'].to_numpy(np.float64)
+        # Missing values are skipped, as pandas sum()/mean() do (bincount would propagate NaN)
+        columns = {
+            'sbtc_balance': np.nan_to_num(balance, nan=0.0),
+            'balance_apy': np.nan_to_num(balance * frame['apy'].to_numpy(np.float64), nan=0.0),
+            'yield_earned': np.nan_to_num(frame['yield_earned'].to_numpy(np.float64), nan=0.0),
+            'risk_score': np.nan_to_num(risk, nan=0.0),
+            'risk_rows': (~np.isnan(risk)).astype(np.float64),
+            'rows': np.ones(len(frame)),
+        }
+        # One row of partial sums per protocol (duplicate protocol rows are folded together)
+        self._sums = {f: np.bincount(codes, weights=columns[f], minlength=len(names)) for f in SUM_FIELDS}
+        self._totals = {f: float(self._sums[f].sum()) for f in SUM_FIELDS}
+
+    def _metrics(self, sums, num_protocols):
+        total_sbtc = sums['sbtc_balance']
+        return {
+            'total_sbtc': total_sbtc,
+            'avg_apy': sums['balance_apy'] / total_sbtc if total_sbtc > 0 else 0,
+            'total_yield_30d': sums['yield_earned'],
+            'avg_risk_score': sums['risk_score'] / sums['risk_rows'] if sums['risk_rows'] else 0,
+            'num_protocols': num_protocols,
+        }
+
+    def summary(self, selected=None):
+        """
+        Overview metrics for `selected` protocols (None or empty means all):
+        total_sbtc, avg_apy (balance-weighted), total_yield_30d, avg_risk_score
+        and num_protocols. Unknown protocol names are ignored.
+        """
+        key = (frozenset(selected) if selected else None, self.version)
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._memo.move_to_end(key)
+                return cached
+
+            if key[0] is None:
+                present = int(np.count_nonzero(self._sums['rows']))
+                result = self._metrics(self._totals, present)
+            else:
+                slots = np.fromiter((self._slot[p] for p in key[0] if p in self._slot), dtype=np.intp)
+                sums = {f: float(self._sums[f][slots].sum()) for f in SUM_FIELDS}
+                result = self._metrics(sums, int(np.count_nonzero(self._sums['rows'][slots])))
+
+            self._memo[key] = result
+            while len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+            return result
+
+    def update(self, protocol, sbtc_balance, apy, yield_earned, risk_score):
+        """
+        Replace one protocol's numbers (adding it if new) and bump the version.
+        Only that protocol's partial sums and the running totals change.
+        """
+        risk_score = float(risk_score)
+        new = {
+            'sbtc_balance': np.nan_to_num(float(sbtc_balance)),
+            'balance_apy': np.nan_to_num(float(sbtc_balance) * float(apy)),
+            'yield_earned': np.nan_to_num(float(yield_earned)),
+            'risk_score': 0.0 if np.isnan(risk_score) else risk_score,
+            'risk_rows': 0.0 if np.isnan(risk_score) else 1.0,
+            'rows': 1.0,
+        }
+        with self._lock:
+            slot = self._slot.get(protocol)
+            if slot is None:
+                slot = self._slot[protocol] = len(self.protocols)
+                self.protocols.append(protocol)
+                for f in SUM_FIELDS:
+                    self._sums[f] = np.append(self._sums[f], 0.0)
+            for f in SUM_FIELDS:
+                self._totals[f] += new[f] - float(self._sums[f][slot])
+                self._sums[f][slot] = new[f]
+            self.version += 1
+            self._memo.clear()
+
+
+_aggregates = OrderedDict()
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates(portfolio_df, max_entries=8):
+    """
+    Process-wide PortfolioAggregates for the contents of `portfolio_df`.
+
+    Frames with identical overview columns share one instance (and its memo),
+    even when the DataFrame object itself is rebuilt on every rerun.
+    """
+    key = frame_fingerprint(portfolio_df, OVERVIEW_COLUMNS)
+    with _aggregates_lock:
+        aggregates = _aggregates.get(key)
+        if aggregates is None:
+            aggregates = _aggregates[key] = PortfolioAggregates(portfolio_df)
+            while len(_aggregates) > max_entries:
+                _aggregates.popitem(last=False)
+        else:
+            _aggregates.move_to_end(key)
+        return aggregates
+
+
+def grouped_overview(positions, by):
+    """
+    Overview metrics for every group of `positions` in one vectorized pass.
+
+    Same definitions as PortfolioAggregates.summary(): balance-weighted APY,
+    mean risk score and distinct protocol count per group. Returns a frame
+    indexed by `by`.
+    """
+    frame = positions.assign(balance_apy=positions['sbtc_balance'] * positions['apy'])
+    grouped = frame.groupby(by, sort=False, observed=True).agg(
+        total_sbtc=('sbtc_balance', 'sum'),
+        balance_apy=('balance_apy', 'sum'),
+        total_yield_30d=('yield_earned', 'sum'),
+        avg_risk_score=('risk_score', 'mean'),
+        num_protocols=('protocol', 'nunique'),
+    )
+    total = grouped['total_sbtc']
+    grouped['avg_apy'] = (grouped['balance_apy'] / total.where(total > 0)).fillna(0.0)
+    grouped['avg_risk_score'] = grouped['avg_risk_score'].fillna(0.0)
+    grouped['risk_level'] = [risk_level(score)[0] for score in grouped['avg_risk_score']]
+    return grouped[['total_sbtc', 'avg_apy', 'total_yield_30d', 'avg_risk_score', 'risk_level', 'num_protocols']]
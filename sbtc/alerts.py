@@ -0,0 +1,273 @@
+"""
+Declarative, incremental portfolio alerts.
+
+Rules are plain dicts (e.g. from Streamlit secrets) turned into rule objects
+by `parse_rules`:
+
+    {"type": "concentration", "threshold": 0.4}      # share of total sBTC
+    {"type": "apy_change", "bp": 20, "days": 7}      # |APY move| in basis points
+    {"type": "tvl_drop", "pct": 10}                  # TVL fall since the last refresh
+    {"type": "rewards", "min_sbtc": 0.05}            # unclaimed yield worth claiming
+
+Every rule is evaluated for all protocols at once with NumPy. An
+`AlertEngine` only does work when its inputs change: position rules rerun
+when the positions fingerprint changes, history rules when the history
+version changes, and then only over the dates after each protocol's
+watermark. Alerts are keyed by (rule, protocol): position rules are "state"
+alerts that stay active while their condition holds, history and TVL rules
+are "event" alerts that stay active for `ttl` seconds. Re-firing the same key
+within `cooldown` seconds is suppressed, so one noisy series cannot flood
+the sidebar.
+"""
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .hashing import frame_fingerprint
+
+SEVERITIES = ('critical', 'warning', 'info')
+
+Alert = namedtuple("Alert", ["rule", "protocol", "severity", "title", "detail", "value", "fired_at"])
+
+
+class Rule:
+    """Base rule: `source` says which input it reads, `kind` whether alerts are state or event based"""
+    type = None
+    source = 'positions'
+    kind = 'state'
+
+    def __init__(self, severity='warning', name=None):
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unknown severity {severity!r}; expected one of {SEVERITIES}")
+        self.severity = severity
+        self.name = name or self.type
+
+    @property
+    def id(self):
+        params = ",".join(f"{k}={v}" for k, v in sorted(vars(self).items()) if k not in ('severity', 'name'))
+        return f"{self.name}({params})"
+
+
+class ConcentrationRule(Rule):
+    type = 'concentration'
+
+    def __init__(self, threshold=0.4, severity='critical', name=None):
+        super().__init__(severity, name)
+        self.threshold = float(threshold)
+
+    def evaluate(self, balances):
+        share = balances / balances.sum() if balances.sum() > 0 else balances * 0
+        hits = share[share > self.threshold]
+        return [(p, float(v), f"High concentration in {p} ({v:.0%})", "Consider diversifying")
+                for p, v in hits.items()]
+
+
+class RewardsRule(Rule):
+    type = 'rewards'
+
+    def __init__(self, min_sbtc=0.05, severity='info', name=None):
+        super().__init__(severity, name)
+        self.min_sbtc = float(min_sbtc)
+
+    def evaluate(self, rewards):
+        hits = rewards[rewards >= self.min_sbtc]
+        return [(p, float(v), f"{v:.2f} sBTC rewards ready", f"Claim in {p}") for p, v in hits.items()]
+
+
+class TvlDropRule(Rule):
+    type = 'tvl_drop'
+    source = 'tvl'
+    kind = 'event'
+
+    def __init__(self, pct=10.0, severity='critical', name=None):
+        super().__init__(severity, name)
+        self.pct = float(pct)
+
+    def evaluate(self, previous, current):
+        previous = previous.reindex(current.index)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drop = (1 - current / previous) * 100
+        hits = drop[drop >= self.pct]
+        return [(p, float(v), f"{p} TVL dropped {v:.0f}%", f"Now at {current[p]:,.0f} (was {previous[p]:,.0f})")
+                for p, v in hits.items()]
+
+
+class ApyChangeRule(Rule):
+    type = 'apy_change'
+    source = 'history'
+    kind = 'event'
+
+    def __init__(self, bp=20, days=7, severity='warning', name=None):
+        super().__init__(severity, name)
+        self.bp = float(bp)
+        self.days = int(days)
+
+    def evaluate(self, apy, watermarks):
+        """
+        `apy` is a (date x protocol) frame that covers `days` days before the
+        oldest watermark; only rows after each protocol's watermark are
+        checked, and the latest breach per protocol is reported. Each value is
+        compared with the last one on or before its date minus `days`, so gaps
+        and intraday rows don't change the lag.
+        """
+        values = apy.to_numpy(np.float64)
+        past = apy.ffill().reindex(apy.index - pd.Timedelta(days=self.days), method='ffill').to_numpy(np.float64)
+        change = values - past
+        marks = watermarks.reindex(apy.columns).to_numpy('datetime64[ns]')
+        fresh = apy.index.to_numpy('datetime64[ns]')[:, None] > np.where(np.isnat(marks), np.datetime64(0, 'ns'), marks)
+        with np.errstate(invalid='ignore'):
+            breach = fresh & (np.abs(change) * 100 >= self.bp)
+        results = []
+        for col in np.flatnonzero(breach.any(axis=0)):
+            row = np.flatnonzero(breach[:, col])[-1]
+            protocol, delta = apy.columns[col], change[row, col]
+            direction = "increased" if delta > 0 else "decreased"
+            results.append((protocol, float(delta), f"{protocol} APY {direction}",
+                            f"Now at {values[row, col]:.1f}% ({delta:+.1f}% over {self.days}d)"))
+        return results
+
+
+RULE_TYPES = {cls.type: cls for cls in (ConcentrationRule, RewardsRule, TvlDropRule, ApyChangeRule)}
+
+DEFAULT_RULES = [
+    {'type': 'concentration', 'threshold': 0.4},
+    {'type': 'apy_change', 'bp': 20, 'days': 7},
+    {'type': 'tvl_drop', 'pct': 10},
+    {'type': 'rewards', 'min_sbtc': 0.05},
+]
+
+
+def parse_rules(specs=None):
+    """Rule objects from a list of dicts or a JSON string (default: DEFAULT_RULES)"""
+    if specs is None:
+        specs = DEFAULT_RULES
+    if isinstance(specs, str):
+        specs = json.loads(specs)
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        kind = spec.pop('type', None)
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Unknown alert rule type {kind!r}; expected one of {sorted(RULE_TYPES)}")
+        rules.append(RULE_TYPES[kind](**spec))
+    return rules
+
+
+class AlertEngine:
+    """Evaluates rules incrementally and keeps the deduplicated, rate-limited active alerts"""
+
+    def __init__(self, rules=None, cooldown=3600.0, ttl=86400.0, clock=time.time, log_size=500):
+        self.rules = parse_rules() if rules is None else list(rules)
+        self.cooldown = float(cooldown)
+        self.ttl = float(ttl)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._positions_key = None
+        self._history_version = None
+        self._watermarks = {}  # rule id -> Series of last checked date per protocol
+        self._tvl = None
+        self._state = {}       # (rule id, protocol) -> Alert, replaced on every positions change
+        self._events = {}      # (rule id, protocol) -> Alert
+        self._last_fired = {}  # (rule id, protocol) -> time
+        self.log = deque(maxlen=log_size)
+        self.counters = {'evaluations': 0, 'skipped': 0, 'points_checked': 0, 'fired': 0, 'suppressed': 0}
+
+    def _fire(self, rule, protocol, value, title, detail, now):
+        key = (rule.id, protocol)
+        alert = Alert(rule.id, protocol, rule.severity, title, detail, value, now)
+        store = self._state if rule.kind == 'state' else self._events
+        last = self._last_fired.get(key)
+        if last is not None and now - last < self.cooldown:
+            self.counters['suppressed'] += 1
+            if key in store:  # keep the first firing time, refresh the numbers
+                store[key] = alert._replace(fired_at=store[key].fired_at)
+            elif rule.kind == 'state':
+                store[key] = alert
+            return
+        store[key] = alert
+        self._last_fired[key] = now
+        self.counters['fired'] += 1
+        self.log.append(alert)
+
+    def _evaluate_positions(self, positions, now):
+        grouped = positions.groupby('protocol', sort=True, observed=True).agg(
+            sbtc_balance=('sbtc_balance', 'sum'), yield_earned=('yield_earned', 'sum'), tvl=('tvl', 'sum')
+        )
+        self.counters['points_checked'] += len(grouped)
+        self._state = {}
+        for rule in self.rules:
+            if rule.source == 'positions':
+                column = 'sbtc_balance' if rule.type == 'concentration' else 'yield_earned'
+                for hit in rule.evaluate(grouped[column]):
+                    self._fire(rule, *hit, now)
+            elif rule.source == 'tvl' and self._tvl is not None:
+                for hit in rule.evaluate(self._tvl, grouped['tvl']):
+                    self._fire(rule, *hit, now)
+        self._tvl = grouped['tvl']
+
+    def _evaluate_history(self, history, now):
+        rules = [r for r in self.rules if r.source == 'history']
+        if not rules or history is None or history.empty:
+            return
+        for rule in rules:
+            marks = self._watermarks.get(rule.id, pd.Series(dtype='datetime64[ns]'))
+            protocols = history.protocols
+            known = marks.reindex(protocols)
+            start = None if known.isna().any() else known.min() - pd.Timedelta(days=rule.days)
+            apy = history.select(protocols, start=start, columns=['apy'])['apy'].unstack('protocol')
+            apy.columns = apy.columns.astype(str)
+            checked_until = known.reindex(apy.columns).fillna(pd.Timestamp(0)).to_numpy()
+            self.counters['points_checked'] += int((apy.index.to_numpy()[:, None] > checked_until).sum())
+            for hit in rule.evaluate(apy, marks):
+                self._fire(rule, *hit, now)
+            self._watermarks[rule.id] = pd.Series(apy.index.max(), index=apy.columns)
+
+    def evaluate(self, positions, history=None):
+        """Check whatever changed since the last call and return the active alerts"""
+        with self._lock:
+            now = self._clock()
+            positions_key = frame_fingerprint(positions, ['protocol', 'sbtc_balance', 'yield_earned', 'tvl'])
+            history_version = None if history is None else history.version
+            changed = False
+            if positions_key != self._positions_key:
+                self._evaluate_positions(positions, now)
+                self._positions_key = positions_key
+                changed = True
+            if history_version != self._history_version:
+                self._evaluate_history(history, now)
+                self._history_version = history_version
+                changed = True
+            self.counters['evaluations' if changed else 'skipped'] += 1
+            return self._active(now)
+
+    def _active(self, now):
+        self._events = {k: a for k, a in self._events.items() if now - a.fired_at < self.ttl}
+        alerts = list(self._state.values()) + list(self._events.values())
+        return sorted(alerts, key=lambda a: (SEVERITIES.index(a.severity), -abs(a.value)))
+
+    def active(self):
+        with self._lock:
+            return self._active(self._clock())
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, rules=len(self.rules), active=len(self._state) + len(self._events))
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_alert_engine(rules=None, cooldown=3600.0, ttl=86400.0):
+    """Process-wide AlertEngine per rule set, so watermarks and cooldowns survive reruns"""
+    parsed = parse_rules(rules)
+    key = (tuple(r.id for r in parsed), float(cooldown), float(ttl))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = AlertEngine(parsed, cooldown, ttl)
+        return engine
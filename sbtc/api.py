@@ -0,0 +1,288 @@
+"""
+JSON metrics endpoint backed by the shared portfolio snapshot.
+
+    GET /metrics                      overview + per-protocol rows for all protocols
+    GET /metrics?protocols=ALEX,Bitflow   ... for a selection (`protocol=` may repeat;
+                                      unknown names give a 400)
+    GET /health                       snapshot version and age
+
+Responses are built from the same Snapshot (sbtc.snapshot) and aggregation
+code the dashboard uses: Portfolio.overview() for the totals, the 30-day
+Monte Carlo projection for the yield estimate and risk_level() for the label.
+Each body is serialized once per (snapshot version, normalized selection) and
+kept as bytes together with its ETag, so a repeat request is a dictionary
+lookup and a socket write. Raw query strings are memoized onto those bodies
+in a separate bounded map, so arbitrary query strings can't evict them.
+Clients that send `If-None-Match` with the current ETag get an empty 304.
+
+Inside the dashboard process the server reads whatever snapshot app.py
+published (set the `METRICS_API_PORT` secret). Standalone,
+
+    python -m sbtc.api --port 8700 --api-url http://127.0.0.1:8600
+
+runs its own refresher thread that rebuilds the snapshot every `--ttl` seconds.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .aggregates import risk_level
+from .cache import get_lru_cache
+from .projection import DEFAULT_PATHS
+from .snapshot import build_snapshot, get_snapshot_store
+
+PROTOCOL_FIELDS = ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score']
+DEFAULT_PORT = 8700
+
+
+class UnknownProtocolsError(ValueError):
+    """A /metrics query named protocols that aren't in the snapshot"""
+
+    def __init__(self, names):
+        super().__init__(f"unknown protocols: {', '.join(names)}")
+        self.names = list(names)
+
+
+class CachedBody:
+    """A serialized response body and its ETag"""
+
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header (a list of possibly weak tags, or *) matches `etag`"""
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def metrics_payload(snapshot, selected=None, projection_paths=DEFAULT_PATHS):
+    """The /metrics document for `selected` protocols (None means all)"""
+    portfolio = snapshot.portfolio
+    overview = portfolio.overview(selected)
+    yield_30d = portfolio.project(selected, 30, paths=projection_paths).at_horizon('yield')
+    rows = portfolio.filter(selected).reindex(columns=PROTOCOL_FIELDS)
+    protocols = []
+    for row in rows.itertuples(index=False):
+        record = {field: (value.item() if hasattr(value, 'item') else value) for field, value in zip(PROTOCOL_FIELDS, row)}
+        record['risk_level'] = risk_level(record['risk_score'])[0]
+        protocols.append(record)
+    return {
+        'version': snapshot.version,
+        'built_at': snapshot.built_at,
+        'source': portfolio.source,
+        'selected': sorted(selected) if selected else portfolio.protocols,
+        'overview': {
+            'total_sbtc': overview['total_sbtc'],
+            'avg_apy': overview['avg_apy'],
+            'total_yield_30d': overview['total_yield_30d'],
+            'yield_30d_estimate': {f"p{p}": float(v) for p, v in yield_30d.items()},
+            'avg_risk_score': overview['avg_risk_score'],
+            'risk_level': overview['risk_level'],
+            'num_protocols': overview['num_protocols'],
+        },
+        'protocols': protocols,
+    }
+
+
+class MetricsService:
+    """
+    Precomputed /metrics bodies for the current snapshot of a SnapshotStore.
+
+    Bodies are memoized per (snapshot version, selection) in the "api" LRU
+    cache. Each raw query string is memoized onto its selection's body in the
+    separate "api_queries" LRU, so unusual query strings only compete with
+    each other. A new snapshot version simply stops hitting the old entries.
+    """
+
+    def __init__(self, store=None, projection_paths=DEFAULT_PATHS, cache_size=256, query_cache_size=1024):
+        self.store = get_snapshot_store("portfolio") if store is None else store
+        self.projection_paths = int(projection_paths)
+        self.cache = get_lru_cache("api", max_entries=cache_size)
+        self.queries = get_lru_cache("api_queries", max_entries=query_cache_size)
+
+    def selection(self, query, snapshot):
+        """
+        Protocols named in `protocols=` / `protocol=` params, as a sorted tuple
+        (None for all). Raises UnknownProtocolsError for names not in the snapshot.
+        """
+        names = {n.strip() for values in (query.get('protocols', []) + query.get('protocol', []))
+                 for n in values.split(",") if n.strip()}
+        if not names:
+            return None
+        unknown = names - set(snapshot.portfolio.protocols)
+        if unknown:
+            raise UnknownProtocolsError(sorted(unknown))
+        return tuple(sorted(names))
+
+    def metrics(self, query_string):
+        """
+        CachedBody for a raw query string, or None before the first snapshot.
+        Raises UnknownProtocolsError for a selection with unknown protocols.
+        """
+        snapshot = self.store.current
+        if snapshot is None:
+            return None
+        # A repeat query string skips parsing and shares its selection's body
+        return self.queries.get((snapshot.version, query_string), lambda: self._body(snapshot, parse_qs(query_string)))
+
+    def _body(self, snapshot, query):
+        selected = self.selection(query, snapshot)
+        return self.cache.get((snapshot.version, selected), lambda: CachedBody(
+            metrics_payload(snapshot, list(selected) if selected is not None else None, self.projection_paths)
+        ))
+
+    def health(self):
+        snapshot = self.store.current
+        if snapshot is None:
+            return {'status': 'starting', 'version': None}
+        return {'status': 'ok', 'version': snapshot.version, 'age_s': round(time.time() - snapshot.built_at, 1),
+                'source': snapshot.portfolio.source}
+
+
+class MetricsServer:
+    """Threaded HTTP/1.1 (keep-alive) server for a MetricsService"""
+
+    def __init__(self, service=None, host="127.0.0.1", port=DEFAULT_PORT):
+        self.service = MetricsService() if service is None else service
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+        self.requests = 0
+        self.not_modified = 0
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+        service = self.service
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate small writes; without TCP_NODELAY a
+            # keep-alive client waits on a delayed ACK for every response.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body=b"", etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                server.requests += 1
+                url = urlsplit(self.path)
+                if url.path == "/metrics":
+                    try:
+                        cached = service.metrics(url.query)
+                    except UnknownProtocolsError as e:
+                        self._send(400, json.dumps({'error': 'unknown protocols', 'protocols': e.names}).encode())
+                        return
+                    if cached is None:
+                        self._send(503, b'{"error":"no portfolio snapshot yet"}')
+                    elif etag_matches(self.headers.get("If-None-Match"), cached.etag):
+                        server.not_modified += 1
+                        self._send(304, etag=cached.etag)
+                    else:
+                        self._send(200, cached.body, cached.etag)
+                elif url.path == "/health":
+                    self._send(200, json.dumps(service.health()).encode())
+                else:
+                    self._send(404, b'{"error":"not found"}')
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return {'url': self.url, 'requests': self.requests, 'not_modified': self.not_modified,
+                'cache': self.service.cache.stats(), 'query_cache': self.service.queries.stats()}
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_metrics_server(host="127.0.0.1", port=DEFAULT_PORT, projection_paths=DEFAULT_PATHS):
+    """Process-wide MetricsServer on (host, port), started on first use"""
+    with _servers_lock:
+        server = _servers.get((host, int(port)))
+        if server is None:
+            service = MetricsService(projection_paths=projection_paths)
+            server = _servers[(host, int(port))] = MetricsServer(service, host, int(port)).start()
+        return server
+
+
+def refresh_forever(store, loader, ttl, stop):
+    """Publish `loader()`'s snapshot every `ttl` seconds until `stop` is set (errors keep the last one)"""
+    while True:
+        try:
+            store.publish(loader())
+        except Exception as e:  # keep serving the last good snapshot
+            print(f"snapshot refresh failed: {e}")
+        if stop.wait(ttl):
+            return
+
+
+def main(argv=None):
+    from .portfolio import fetch_sbtc_portfolio_live
+
+    parser = argparse.ArgumentParser(description="Serve dashboard metrics as JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--api-url", help="positions API base URL (demo data when omitted)")
+    parser.add_argument("--deadline", type=float, default=8.0, help="fetch deadline in seconds")
+    parser.add_argument("--history-path", default="data/history", help="Parquet history store ('' for memory)")
+    parser.add_argument("--history-days", type=int, default=30)
+    parser.add_argument("--ttl", type=float, default=300.0, help="seconds between snapshot refreshes")
+    parser.add_argument("--paths", type=int, default=DEFAULT_PATHS, help="Monte Carlo paths for the 30d yield")
+    args = parser.parse_args(argv)
+
+    store = get_snapshot_store("portfolio")
+    stop = threading.Event()
+    refresher = threading.Thread(
+        target=refresh_forever, name="snapshot-refresh", daemon=True,
+        args=(store, lambda: build_snapshot(fetch_sbtc_portfolio_live(args.api_url, args.deadline),
+                                            args.history_path or None, args.history_days), args.ttl, stop),
+    )
+    refresher.start()
+    server = MetricsServer(MetricsService(store, args.paths), args.host, args.port)
+    print(f"Metrics API listening on {server.url}/metrics (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Batch overview metrics for many Stacks addresses.
+
+Addresses are split into chunks and fanned out across a process pool; each
+worker pulls its chunk's positions from a pluggable AddressSource and
+computes every address's overview (total sBTC, weighted APY, 30d yield,
+risk level) in one grouped pass. Finished chunks are streamed to CSV or
+Parquet as they complete, so memory stays bounded by the number of chunks
+in flight, and throughput is reported as the job runs.
+
+    python -m sbtc.batch addresses.txt --source positions.csv --out overview.parquet --workers 8
+
+`--make-demo N` writes N demo addresses plus a matching positions file for
+trying the job locally.
+"""
+import abc
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import grouped_overview
+from .portfolio import POSITION_COLUMNS
+
+RESULT_COLUMNS = ['address', 'total_sbtc', 'avg_apy', 'total_yield_30d', 'avg_risk_score', 'risk_level',
+                  'num_protocols']
+
+
+class AddressSource(abc.ABC):
+    """
+    Where per-address positions come from. Instances are pickled to worker
+    processes, so keep them to plain configuration (paths, URLs) and load lazily.
+    """
+
+    @abc.abstractmethod
+    def positions_for(self, addresses):
+        """Frame with an 'address' column plus the portfolio position columns for `addresses`"""
+
+
+_loaded_files = {}
+
+
+class FileAddressSource(AddressSource):
+    """Positions for all addresses in one local CSV, JSON-lines or Parquet file"""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+
+    def _frame(self):
+        # Loaded once per worker process, then indexed by address for fast lookups
+        frame = _loaded_files.get(self.path)
+        if frame is None:
+            if self.path.endswith('.parquet'):
+                frame = pd.read_parquet(self.path)
+            elif self.path.endswith(('.jsonl', '.json')):
+                frame = pd.read_json(self.path, lines=self.path.endswith('.jsonl'))
+            else:
+                frame = pd.read_csv(self.path)
+            frame = _loaded_files[self.path] = frame.set_index('address').sort_index()
+        return frame
+
+    def positions_for(self, addresses):
+        frame = self._frame()
+        present = frame.index.intersection(pd.Index(addresses))
+        return frame.loc[present].rename_axis('address').reset_index()
+
+
+def overview_chunk(source, addresses):
+    """Overview rows for one chunk of addresses (addresses without positions get zeros)"""
+    positions = source.positions_for(addresses)
+    overview = grouped_overview(positions, 'address') if len(positions) else None
+    result = pd.DataFrame({'address': list(addresses)})
+    if overview is not None:
+        result = result.join(overview, on='address')
+    result = result.reindex(columns=RESULT_COLUMNS)
+    result['risk_level'] = result['risk_level'].fillna("N/A")
+    result = result.fillna({c: 0 for c in RESULT_COLUMNS if c not in ('address', 'risk_level')})
+    return result.astype({'num_protocols': 'int64'})
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(RESULT_COLUMNS)
+
+    def write(self, frame):
+        self._writer.writerows(frame.itertuples(index=False, name=None))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._writer = pq.ParquetWriter(path, pa.schema([
+            ('address', pa.string()), ('total_sbtc', pa.float64()), ('avg_apy', pa.float64()),
+            ('total_yield_30d', pa.float64()), ('avg_risk_score', pa.float64()), ('risk_level', pa.string()),
+            ('num_protocols', pa.int64()),
+        ]))
+
+    def write(self, frame):
+        # One row group per finished chunk
+        table = self._pa.Table.from_pandas(frame, preserve_index=False)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path):
+    return _ParquetWriter(path) if os.fspath(path).endswith('.parquet') else _CsvWriter(path)
+
+
+def run_batch(addresses, source, out_path, workers=None, chunksize=500, progress=None):
+    """
+    Compute overview rows for `addresses` and stream them to `out_path`.
+
+    At most 2 x workers chunks are in flight at once. `progress(done, total,
+    elapsed)` is called after every finished chunk. Returns a stats dict with
+    the address count, elapsed seconds and addresses per second.
+    """
+    addresses = list(addresses)
+    chunks = [addresses[i:i + chunksize] for i in range(0, len(addresses), chunksize)]
+    workers = workers or os.cpu_count() or 1
+    writer = open_writer(out_path)
+    started = time.perf_counter()
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            chunk_iter = iter(chunks)
+            while True:
+                while len(pending) < 2 * workers:
+                    chunk = next(chunk_iter, None)
+                    if chunk is None:
+                        break
+                    pending.add(pool.submit(overview_chunk, source, chunk))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rows = future.result()
+                    writer.write(rows)
+                    done += len(rows)
+                    if progress:
+                        progress(done, len(addresses), time.perf_counter() - started)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    return {'addresses': done, 'seconds': elapsed, 'addresses_per_second': done / elapsed if elapsed else 0.0}
+
+
+def make_demo(n, addresses_path, positions_path, seed=25, protocols=('ALEX', 'Bitflow', 'Arkadiko')):
+    """Write `n` demo addresses and random positions for them (1-3 protocols each)"""
+    rng = np.random.default_rng(seed)
+    addresses = np.array([f"SP{i:038d}" for i in range(n)])
+    held = rng.random((n, len(protocols))) < 0.7
+    held[~held.any(axis=1), 0] = True
+    rows, cols = np.nonzero(held)
+    positions = pd.DataFrame({
+        'address': addresses[rows],
+        'protocol': np.array(protocols)[cols],
+        'sbtc_balance': rng.uniform(0.01, 5.0, len(rows)).round(6),
+        'apy': rng.uniform(3.0, 6.5, len(rows)).round(3),
+        'tvl': rng.uniform(5000, 15000, len(rows)).round(0),
+        'risk_score': rng.integers(1, 6, len(rows)),
+    })
+    positions['yield_earned'] = (positions['sbtc_balance'] * positions['apy'] / 100 * 30 / 365).round(8)
+    positions[['address'] + POSITION_COLUMNS].to_csv(positions_path, index=False)
+    with open(addresses_path, 'w') as f:
+        f.write("\n".join(addresses) + "\n")
+
+
+def _read_addresses(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute sBTC portfolio overviews for many Stacks addresses.")
+    parser.add_argument("addresses", help="text file with one Stacks address per line")
+    parser.add_argument("--source", required=True, help="positions file (CSV, JSON lines or Parquet) keyed by address")
+    parser.add_argument("--out", required=True, help="output file; .parquet for Parquet, anything else for CSV")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=500, help="addresses per task")
+    parser.add_argument("--make-demo", type=int, metavar="N", help="first write N demo addresses/positions to the given paths")
+    args = parser.parse_args(argv)
+
+    if args.make_demo:
+        make_demo(args.make_demo, args.addresses, args.source)
+
+    def report(done, total, elapsed):
+        sys.stderr.write(f"\r{done}/{total} addresses, {done / elapsed:,.0f} addr/s")
+        sys.stderr.flush()
+
+    stats = run_batch(_read_addresses(args.addresses), FileAddressSource(args.source), args.out,
+                      workers=args.workers, chunksize=args.chunksize, progress=report)
+    sys.stderr.write(f"\nWrote {stats['addresses']} rows to {args.out} in {stats['seconds']:.2f}s "
+                     f"({stats['addresses_per_second']:,.0f} addresses/s)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Process-wide caches, including a stale-while-revalidate (SWR) cache.
+
+Streamlit re-executes app.py on every widget interaction, but imported modules
+stay loaded for the lifetime of the server process. Caches created here are
+therefore shared by every rerun and every browser session.
+
+Reads never block on a refresh once a value exists: a fresh entry is returned
+as-is, a stale entry is returned immediately while a single background thread
+reloads it. Only the very first load of a key (a miss) runs in the caller.
+
+`LRUCache` is the TTL-less sibling used for derived values (figures, scores)
+whose keys already include a data version.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class _Entry:
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+
+
+class SWRCache:
+    """
+    Size-bounded LRU cache with a TTL and stale-while-revalidate reads.
+
+    `ttl` is the number of seconds an entry is considered fresh, `max_entries`
+    bounds the number of keys kept (least recently used keys are evicted).
+    """
+
+    def __init__(self, ttl=300.0, max_entries=32, clock=time.monotonic):
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.evictions = 0
+        self.last_error = None
+
+    def get(self, key, loader):
+        """
+        Return the cached value for `key`, calling `loader()` when needed.
+
+        Misses load synchronously (concurrent misses for the same key share a
+        single load). Stale hits return the old value and schedule one
+        background refresh. Loader errors during a miss are re-raised; errors
+        during a background refresh keep the last good value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if self._clock() - entry.loaded_at < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._schedule_refresh(key, loader)
+                return entry.value
+
+            self.misses += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                self.last_error = repr(e)
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def _schedule_refresh(self, key, loader):
+        # Called with the lock held; at most one refresh per key at a time.
+        if key in self._inflight:
+            return
+        future = self._inflight[key] = Future()
+        thread = threading.Thread(
+            target=self._refresh, args=(key, loader, future),
+            name=f"swr-refresh-{key}", daemon=True
+        )
+        thread.start()
+
+    def _refresh(self, key, loader, future):
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                self.last_error = repr(e)
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self.refreshes += 1
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def _store(self, key, value):
+        self._entries[key] = _Entry(value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, key, default=None):
+        """Return the cached value without loading, refreshing or counting."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry.value
+
+    def age(self, key):
+        """Seconds since `key` was last loaded, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else self._clock() - entry.loaded_at
+
+    def invalidate(self, key=None):
+        """Drop one key (or every key) so the next read reloads it."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def wait(self, key, timeout=None):
+        """Block until an in-flight load/refresh of `key` finishes (if any)."""
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def stats(self):
+        """Snapshot of the cache counters and per-key ages (in seconds)."""
+        with self._lock:
+            now = self._clock()
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "refreshing": len(self._inflight),
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "ages": {str(k): round(now - e.loaded_at, 3) for k, e in self._entries.items()},
+            }
+
+
+class LRUCache:
+    """
+    Plain size-bounded LRU memo (no TTL) for derived values such as figures.
+
+    Keys should include every input that changes the result, typically a data
+    version, so entries never need explicit invalidation.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, builder):
+        """Return the value for `key`, building (outside the lock) on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = builder()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name, ttl=300.0, max_entries=32):
+    """
+    Return the process-wide cache called `name`, creating it on first use.
+
+    Later calls with a different `ttl`/`max_entries` reconfigure the existing
+    cache in place so settings changes apply without a server restart.
+    """
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = _registry[name] = SWRCache(ttl=ttl, max_entries=max_entries)
+        else:
+            cache.ttl = float(ttl)
+            cache.max_entries = int(max_entries)
+        return cache
+
+
+def get_lru_cache(name, max_entries=64):
+    """Return the process-wide LRUCache called `name`, creating it on first use"""
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = _registry[name] = LRUCache(max_entries=max_entries)
+        else:
+            cache.max_entries = int(max_entries)
+        return cache
+
+
+def all_caches():
+    """Mapping of cache name to cache for every cache created in this process."""
+    with _registry_lock:
+        return dict(_registry)
@@ -0,0 +1,69 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) downsampling.
+
+LTTB keeps the visual shape of a line series (peaks, troughs, trends) while
+reducing it to a fixed point budget, which keeps chart payloads small no
+matter how long the underlying history is.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the `threshold` points LTTB keeps from the series (x, y).
+
+    `x` must be sorted; datetimes are accepted. The first and last points are
+    always kept. Returns all indices when the series is already small enough.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket edges over the interior points (first/last are fixed)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    # Average point of every bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        cx, cy = avg_x[bucket + 1], avg_y[bucket + 1]
+        # Twice the triangle area for every candidate in this bucket at once
+        areas = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
+
+
+def downsample_frame(df, x, columns, max_points):
+    """
+    Downsample `df` for plotting `columns` against `x` within `max_points`.
+
+    Each column gets an equal share of the budget and the union of the kept
+    rows is returned, so every series keeps its own peaks and troughs.
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    share = max(3, max_points // max(1, len(columns)))
+    xs = df[x].to_numpy()
+    keep = np.unique(np.concatenate([lttb_indices(xs, df[c].to_numpy(), share) for c in columns]))
+    return df.iloc[keep]
+
+
+def downsample_series(series, max_points):
+    """LTTB for a Series indexed by its x values"""
+    if max_points is None or len(series) <= max_points:
+        return series
+    return series.iloc[lttb_indices(series.index.to_numpy(), series.to_numpy(), max_points)]
@@ -0,0 +1,190 @@
+"""
+Concurrent per-protocol position fetcher.
+
+Each protocol (ALEX, Bitflow, Arkadiko, ...) is fetched in its own worker so
+the wall time of a refresh is bounded by the slowest protocol rather than the
+sum of all of them. All workers share one keep-alive `requests.Session`, every
+request carries a (connect, read) timeout, transient failures are retried with
+jittered exponential backoff, and a per-host semaphore caps how many requests
+hit the same upstream at once. Protocols that fail or miss the deadline are
+reported individually so callers can render partial results.
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_PROTOCOLS = ("ALEX", "Bitflow", "Arkadiko")
+PORTFOLIO_COLUMNS = ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score', 'historical']
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+FetchResult = namedtuple("FetchResult", ["protocol", "ok", "data", "error", "attempts", "elapsed"])
+
+
+class RetryableHTTPError(requests.HTTPError):
+    """Raised for responses whose status code is worth retrying (429/5xx)"""
+
+
+def protocol_endpoints(base_url, protocols=DEFAULT_PROTOCOLS, path="/positions/{protocol}"):
+    """Map each protocol to its positions URL under a common API base URL"""
+    base_url = base_url.rstrip("/")
+    return {protocol: base_url + path.format(protocol=protocol) for protocol in protocols}
+
+
+class ProtocolFetcher:
+    """
+    Fetch JSON positions for many protocols concurrently.
+
+    `endpoints` maps protocol name to URL; protocols may live on different
+    hosts. `timeout` is a (connect, read) tuple in seconds, `retries` is the
+    number of extra attempts after the first one, and `per_host_limit` caps
+    in-flight requests per host across all workers.
+    """
+
+    def __init__(self, endpoints, timeout=(3.05, 10.0), retries=2, backoff=0.25,
+                 max_backoff=2.0, per_host_limit=4, max_workers=8, headers=None, session=None):
+        self.endpoints = dict(endpoints)
+        self.timeout = timeout
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.per_host_limit = int(per_host_limit)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="protocol-fetch")
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        self._random = random.Random()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        if headers:
+            session.headers.update(headers)
+        session.headers.setdefault("Accept", "application/json")
+        self.session = session
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            semaphore = self._host_limits.get(host)
+            if semaphore is None:
+                semaphore = self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return semaphore
+
+    def _sleep_before_retry(self, attempt, deadline):
+        # "Full jitter" backoff: uniform in [0, min(cap, base * 2**attempt)].
+        delay = self._random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        time.sleep(delay)
+
+    def _request_timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout("deadline exceeded before request was sent")
+        connect, read = self.timeout
+        return (min(connect, remaining), min(read, remaining))
+
+    def fetch_one(self, protocol, deadline=None):
+        """Fetch one protocol with retries; never raises, returns a FetchResult"""
+        url = self.endpoints[protocol]
+        semaphore = self._host_semaphore(url)
+        started = time.monotonic()
+        attempts = 0
+        error = None
+        for attempt in range(self.retries + 1):
+            attempts += 1
+            try:
+                with semaphore:
+                    response = self.session.get(url, timeout=self._request_timeout(deadline))
+                if response.status_code in RETRY_STATUSES:
+                    raise RetryableHTTPError(f"HTTP {response.status_code} from {url}", response=response)
+                response.raise_for_status()
+                return FetchResult(protocol, True, response.json(), None, attempts, time.monotonic() - started)
+            except (requests.ConnectionError, requests.Timeout, RetryableHTTPError) as e:
+                error = e
+                out_of_time = deadline is not None and time.monotonic() >= deadline
+                if attempt == self.retries or out_of_time:
+                    break
+                self._sleep_before_retry(attempt, deadline)
+            except (requests.RequestException, ValueError) as e:
+                # Non-retryable: 4xx responses or a body that isn't JSON
+                error = e
+                break
+        return FetchResult(protocol, False, None, f"{type(error).__name__}: {error}", attempts,
+                           time.monotonic() - started)
+
+    def fetch_all(self, protocols=None, deadline=None):
+        """
+        Fetch every protocol concurrently and return {protocol: FetchResult}.
+
+        `deadline` is an overall budget in seconds; protocols still running when
+        it expires are reported as failed instead of delaying the others.
+        """
+        protocols = list(self.endpoints if protocols is None else protocols)
+        started = time.monotonic()
+        absolute_deadline = None if deadline is None else started + deadline
+        futures = {self._executor.submit(self.fetch_one, p, absolute_deadline): p for p in protocols}
+        done, _ = wait(futures, timeout=deadline)
+
+        results = {}
+        for future, protocol in futures.items():
+            if future in done:
+                results[protocol] = future.result()
+            else:
+                results[protocol] = FetchResult(protocol, False, None, "deadline exceeded", 0,
+                                                time.monotonic() - started)
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_fetchers = {}
+_fetchers_lock = threading.Lock()
+
+
+def get_fetcher(base_url, protocols=DEFAULT_PROTOCOLS, **options):
+    """Return a process-wide fetcher for `base_url` so its connection pool is reused"""
+    key = (base_url.rstrip("/"), tuple(protocols))
+    with _fetchers_lock:
+        fetcher = _fetchers.get(key)
+        if fetcher is None:
+            fetcher = _fetchers[key] = ProtocolFetcher(protocol_endpoints(base_url, protocols), **options)
+        return fetcher
+
+
+def results_to_frame(results):
+    """
+    Build a portfolio DataFrame from the successful FetchResults.
+
+    Failed protocols are left out and listed in `df.attrs['fetch_errors']`.
+    """
+    rows = []
+    errors = {}
+    for protocol, result in results.items():
+        if not result.ok:
+            errors[protocol] = result.error
+            continue
+        row = dict(result.data)
+        row.setdefault('protocol', protocol)
+        if isinstance(row.get('historical'), list):
+            historical = pd.DataFrame(row['historical'])
+            if 'date' in historical.columns:
+                historical['date'] = pd.to_datetime(historical['date'])
+            historical['protocol'] = row['protocol']
+            row['historical'] = historical
+        rows.append(row)
+    df = pd.DataFrame(rows, columns=PORTFOLIO_COLUMNS) if rows else pd.DataFrame()
+    df.attrs['fetch_errors'] = errors
+    return df
@@ -0,0 +1,20 @@
+"""
+Content fingerprints for DataFrames, used as memoization keys.
+
+Two frames with the same values, columns and index get the same fingerprint,
+so caches stay warm across reruns even when the frame object is rebuilt.
+"""
+import hashlib
+
+import pandas as pd
+
+
+def frame_fingerprint(df, columns=None):
+    """Stable hex digest of `df` (optionally restricted to `columns`)"""
+    if columns is not None:
+        df = df.loc[:, [c for c in columns if c in df.columns]]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((list(df.columns), [str(t) for t in df.dtypes])).encode())
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,163 @@
+"""
+Columnar, long-format store for per-protocol history.
+
+Instead of one nested DataFrame per portfolio row, every protocol's daily
+history lives in a single frame indexed by (protocol, date):
+
+    protocol  date        sbtc_balance  apy  yield_earned
+    ALEX      2024-05-01  1.31          4.4  0.0158
+    ...
+
+`protocol` is categorical, metrics are float32 and the index is sorted, so
+selecting protocols and/or a date range is a single vectorized slice.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+HISTORY_METRICS = ['sbtc_balance', 'apy', 'yield_earned']
+INDEX_NAMES = ['protocol', 'date']
+
+_versions = itertools.count(1)
+
+
+class HistoryStore:
+    """
+    Immutable long-format history keyed by (protocol, date).
+
+    Every store gets a process-unique `version`, which downstream caches use
+    as part of their keys.
+    """
+
+    def __init__(self, frame, version=None):
+        self.frame = self._normalize(frame)
+        self.version = next(_versions) if version is None else version
+        self._present = None
+
+    @staticmethod
+    def _is_canonical(frame):
+        index = frame.index
+        return (
+            isinstance(index, pd.MultiIndex)
+            and list(index.names) == INDEX_NAMES
+            and isinstance(index.levels[0], pd.CategoricalIndex)
+            and index.levels[0].is_monotonic_increasing
+            and isinstance(index.levels[1], pd.DatetimeIndex)
+            and all(dtype == np.float32 for dtype in frame.dtypes)
+            and index.is_monotonic_increasing
+        )
+
+    @classmethod
+    def _normalize(cls, frame):
+        if cls._is_canonical(frame):
+            # Already (protocol, date)-sorted with compact dtypes: use as-is
+            return frame
+        if isinstance(frame.index, pd.MultiIndex) and list(frame.index.names) == INDEX_NAMES:
+            frame = frame.reset_index()
+        frame = frame.loc[:, INDEX_NAMES + [c for c in frame.columns if c not in INDEX_NAMES]]
+        protocols = frame['protocol']
+        categories = protocols.cat.categories if isinstance(protocols.dtype, pd.CategoricalDtype) else None
+        columns = {
+            'protocol': pd.Categorical(protocols.astype(str),
+                                       categories=sorted(categories if categories is not None else protocols.unique())),
+            'date': pd.to_datetime(frame['date']),
+        }
+        for column in frame.columns.drop(INDEX_NAMES):
+            values = frame[column]
+            columns[column] = values.astype(np.float32) if pd.api.types.is_numeric_dtype(values) else values
+        return pd.DataFrame(columns).set_index(INDEX_NAMES).sort_index()
+
+    @classmethod
+    def empty_store(cls):
+        return cls(pd.DataFrame(columns=INDEX_NAMES + HISTORY_METRICS))
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Build a store from per-protocol frames that each carry a 'protocol' column"""
+        frames = [f for f in frames if f is not None and not f.empty]
+        return cls(pd.concat(frames, ignore_index=True)) if frames else cls.empty_store()
+
+    @classmethod
+    def from_nested(cls, portfolio_df, column='historical'):
+        """Flatten a portfolio frame whose `column` holds one history DataFrame per row"""
+        if column not in portfolio_df.columns:
+            return cls.empty_store()
+        frames = []
+        for protocol, history in zip(portfolio_df['protocol'], portfolio_df[column]):
+            if isinstance(history, pd.DataFrame) and not history.empty:
+                frames.append(history.assign(protocol=protocol))
+        return cls.from_frames(frames)
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def _present_protocols(self):
+        # Computed once per (immutable) store: the codes are sorted, so the used
+        # protocols are where they change. Unused categories (which a Parquet
+        # load of a date window keeps) are left out.
+        if self._present is None:
+            codes = self.frame.index.codes[0]
+            first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.intp)
+            names = list(self.frame.index.levels[0].take(codes[first]))
+            self._present = (names, frozenset(names))
+        return self._present
+
+    @property
+    def protocols(self):
+        """Protocols that have at least one history row, in sorted order"""
+        return list(self._present_protocols()[0])
+
+    @property
+    def metrics(self):
+        return list(self.frame.columns)
+
+    def has_protocol(self, protocol):
+        """Whether `protocol` has at least one row (a set lookup)"""
+        return protocol in self._present_protocols()[1]
+
+    def date_bounds(self):
+        """(first, last) timestamp in the store, or (None, None) when empty"""
+        if self.frame.empty:
+            return None, None
+        # The date level is sorted, so the bounds are its entries at the extreme codes
+        codes, dates = self.frame.index.codes[1], self.frame.index.levels[1]
+        return dates[codes.min()], dates[codes.max()]
+
+    def select(self, protocols=None, start=None, end=None, columns=None):
+        """
+        Slice the store by protocol list, inclusive date range and columns.
+
+        Returns a (protocol, date)-indexed frame; unknown protocols are ignored.
+        """
+        frame = self.frame if columns is None else self.frame.loc[:, list(columns)]
+        if frame.empty:
+            return frame
+        if protocols is not None:
+            protocols = [p for p in protocols if self.has_protocol(p)]
+        dates = slice(None if start is None else pd.Timestamp(start), None if end is None else pd.Timestamp(end))
+        key = (slice(None) if protocols is None else protocols, dates)
+        return frame.loc[pd.IndexSlice[key], :]
+
+    def for_protocol(self, protocol, start=None, end=None, columns=None):
+        """History of one protocol as a flat frame with a 'date' column, ready for plotting"""
+        if not self.has_protocol(protocol):
+            return pd.DataFrame(columns=['date'] + list(columns or self.metrics))
+        # The index is sorted, so one protocol is a contiguous block and the date
+        # range a binary search inside it: O(log rows + rows returned)
+        block = self.frame.index.get_loc(protocol)
+        if not isinstance(block, slice):
+            return self.select([protocol], start, end, columns).droplevel('protocol').reset_index()
+        dates = self.frame.index.levels[1].take(self.frame.index.codes[1][block])
+        lo = block.start + (0 if start is None else dates.searchsorted(pd.Timestamp(start), 'left'))
+        hi = block.start + (len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), 'right'))
+        frame = self.frame.iloc[lo:hi] if columns is None else self.frame.iloc[lo:hi][list(columns)]
+        return frame.droplevel('protocol').reset_index()
+
+    def memory_usage(self):
+        """Deep memory footprint of the store in bytes"""
+        return int(self.frame.memory_usage(deep=True).sum() + self.frame.index.memory_usage(deep=True))
@@ -0,0 +1,276 @@
+"""
+Address-indexed sBTC positions, synced incrementally from a node/indexer API.
+
+For a Stacks address the indexer pages through its sBTC events (deposits,
+withdrawals, rewards across ALEX, Bitflow, Arkadiko, ...) from
+
+    GET <node>/v2/info                                    -> chain tip height
+    GET <node>/extended/v1/address/<address>/sbtc-events  -> one page of events
+        ?from_height=<checkpoint>&to_height=<tip>&limit=<n>&offset=<k>
+
+and stores them in a local SQLite database:
+
+    events       one row per (address, tx_id, event_index)
+    positions    per (address, protocol) balance, rewards and event count,
+                 updated from each batch of new events
+    checkpoints  per address, the last block height processed
+
+A sync only asks for events above the address's checkpoint, pinned to the
+tip seen at the start so the pages don't shift underneath it. After the first
+page reports the total, the remaining pages are fetched concurrently in
+batches, stepping by the page size the node actually returned (it may cap
+the requested one). A sync whose pages don't add up to the reported total
+raises IncompleteSyncError without committing anything. Each sync commits
+events, positions and the new checkpoint in one transaction, so an
+interrupted sync leaves the previous state intact. Lookups read the
+positions table and never touch the network.
+
+`python -m sbtc.stub_server` serves a mock node API for local testing.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .fetcher import RETRY_STATUSES
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_BATCH_PAGES = 4
+EVENTS_PATH = "/extended/v1/address/{address}/sbtc-events"
+INFO_PATH = "/v2/info"
+POSITION_COLUMNS = ['protocol', 'sbtc_balance', 'rewards', 'events', 'last_height']
+EVENT_COLUMNS = ['block_height', 'tx_id', 'event_index', 'protocol', 'kind', 'amount', 'timestamp']
+# Standard (SP/SM mainnet, ST/SN testnet) c32 addresses
+ADDRESS_PATTERN = re.compile(r"^S[PMTN][0-9A-HJKMNP-Z]{28,41}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    address TEXT NOT NULL, block_height INTEGER NOT NULL, tx_id TEXT NOT NULL, event_index INTEGER NOT NULL,
+    protocol TEXT NOT NULL, kind TEXT NOT NULL, amount REAL NOT NULL, timestamp TEXT,
+    PRIMARY KEY (address, tx_id, event_index)
+);
+CREATE INDEX IF NOT EXISTS events_by_height ON events (address, block_height);
+CREATE TABLE IF NOT EXISTS positions (
+    address TEXT NOT NULL, protocol TEXT NOT NULL, sbtc_balance REAL NOT NULL, rewards REAL NOT NULL,
+    events INTEGER NOT NULL, last_height INTEGER NOT NULL,
+    PRIMARY KEY (address, protocol)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    address TEXT PRIMARY KEY, block_height INTEGER NOT NULL, synced_at REAL NOT NULL
+);
+"""
+
+# Net balance/reward change per event, summed per protocol in SQL
+UPSERT_POSITIONS = """
+INSERT INTO positions (address, protocol, sbtc_balance, rewards, events, last_height)
+SELECT address, protocol,
+       SUM(CASE kind WHEN 'withdraw' THEN -amount ELSE amount END),
+       SUM(CASE kind WHEN 'reward' THEN amount ELSE 0 END),
+       COUNT(*), MAX(block_height)
+FROM events WHERE address = ? AND block_height > ? AND block_height <= ?
+GROUP BY address, protocol
+ON CONFLICT (address, protocol) DO UPDATE SET
+    sbtc_balance = sbtc_balance + excluded.sbtc_balance,
+    rewards = rewards + excluded.rewards,
+    events = events + excluded.events,
+    last_height = MAX(last_height, excluded.last_height)
+"""
+
+SyncResult = namedtuple("SyncResult", ["address", "from_height", "to_height", "new_events", "pages", "elapsed"])
+
+
+def is_stacks_address(address):
+    return bool(ADDRESS_PATTERN.match(address or ""))
+
+
+class AddressIndex:
+    """
+    Local SQLite store of events, positions and checkpoints per address.
+
+    One connection is shared by all threads of the process and serialized by
+    a lock; `path=":memory:"` keeps everything in memory.
+    """
+
+    def __init__(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def checkpoint(self, address):
+        """Last processed block height of `address` (None when never synced)"""
+        with self._lock:
+            row = self._conn.execute("SELECT block_height FROM checkpoints WHERE address = ?", (address,)).fetchone()
+        return None if row is None else row[0]
+
+    def commit_batch(self, address, events, from_height, to_height):
+        """
+        Store `events` (dicts with EVENT_COLUMNS) above `from_height`, fold them
+        into the positions and move the checkpoint to `to_height`, atomically.
+        Returns the number of events that were new.
+        """
+        rows = [(address,) + tuple(e[c] for c in EVENT_COLUMNS) for e in events]
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO events (address, " + ", ".join(EVENT_COLUMNS) +
+                                 ") VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                inserted = conn.total_changes - before
+                conn.execute(UPSERT_POSITIONS, (address, from_height, to_height))
+                conn.execute("INSERT INTO checkpoints (address, block_height, synced_at) VALUES (?, ?, ?) "
+                             "ON CONFLICT (address) DO UPDATE SET block_height = excluded.block_height, "
+                             "synced_at = excluded.synced_at", (address, to_height, time.time()))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return inserted
+
+    def positions(self, address):
+        """Per-protocol positions of `address` (POSITION_COLUMNS), largest balance first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT " + ", ".join(POSITION_COLUMNS) + " FROM positions WHERE address = ? "
+                "ORDER BY sbtc_balance DESC", (address,)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=POSITION_COLUMNS)
+
+    def events(self, address, protocol=None, limit=50, offset=0):
+        """One page of stored events, newest first"""
+        query = "SELECT " + ", ".join(EVENT_COLUMNS) + " FROM events WHERE address = ?"
+        params = [address]
+        if protocol is not None:
+            query += " AND protocol = ?"
+            params.append(protocol)
+        query += " ORDER BY block_height DESC, event_index DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + [int(limit), int(offset)]).fetchall()
+        return pd.DataFrame(rows, columns=EVENT_COLUMNS)
+
+    def stats(self):
+        with self._lock:
+            counts = {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ('events', 'positions', 'checkpoints')}
+        return dict(counts, path=self.path)
+
+
+class IncompleteSyncError(RuntimeError):
+    """The pages of a sync didn't add up to the total the node reported"""
+
+
+class AddressIndexer:
+    """
+    Syncs addresses from a node API into an AddressIndex.
+
+    `page_size` is the events per request and `batch_pages` how many pages are
+    requested concurrently. Transient HTTP errors (429/5xx, connection
+    errors) are retried with exponential backoff by the session's adapter.
+    """
+
+    def __init__(self, node_url, index, page_size=DEFAULT_PAGE_SIZE, batch_pages=DEFAULT_BATCH_PAGES,
+                 timeout=(3.05, 10.0), retries=2, session=None):
+        self.node_url = node_url.rstrip("/")
+        self.index = index
+        self.page_size = int(page_size)
+        self.batch_pages = int(batch_pages)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.batch_pages, thread_name_prefix="address-index")
+        self._address_locks = {}
+        self._locks_lock = threading.Lock()
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=retries, backoff_factor=0.25, status_forcelist=sorted(RETRY_STATUSES),
+                          allowed_methods=["GET"])
+            adapter = HTTPAdapter(pool_connections=self.batch_pages, pool_maxsize=self.batch_pages, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        session.headers.setdefault("Accept", "application/json")
+        self.session = session
+        self.counters = {'syncs': 0, 'requests': 0, 'events_fetched': 0}
+
+    def _get(self, path, **params):
+        response = self.session.get(self.node_url + path, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def tip_height(self):
+        return int(self._get(INFO_PATH)['stacks_tip_height'])
+
+    def _page(self, address, from_height, to_height, offset):
+        return self._get(EVENTS_PATH.format(address=address), from_height=from_height, to_height=to_height,
+                         limit=self.page_size, offset=offset)
+
+    def _lock_for(self, address):
+        with self._locks_lock:
+            return self._address_locks.setdefault(address, threading.Lock())
+
+    def sync(self, address):
+        """Fetch and store the events of `address` since its checkpoint; returns a SyncResult"""
+        if not is_stacks_address(address):
+            raise ValueError(f"Not a Stacks address: {address!r}")
+        with self._lock_for(address):
+            started = time.monotonic()
+            from_height = self.index.checkpoint(address) or 0
+            to_height = self.tip_height()
+            self.counters['requests'] += 1
+            if to_height <= from_height:
+                return SyncResult(address, from_height, from_height, 0, 0, time.monotonic() - started)
+
+            first = self._page(address, from_height, to_height, 0)
+            events = list(first['results'])
+            total = int(first['total'])
+            # The server may cap the page size below ours: step by what it actually returns
+            step = int(first.get('limit') or len(events))
+            offsets = range(len(events), total, step) if step > 0 else range(0)
+            for lo in range(0, len(offsets), self.batch_pages):
+                batch = offsets[lo:lo + self.batch_pages]
+                for page in self._executor.map(lambda k: self._page(address, from_height, to_height, k), batch):
+                    events.extend(page['results'])
+            if len(events) != total:
+                raise IncompleteSyncError(f"Fetched {len(events)} of {total} events for {address} between blocks "
+                                          f"{from_height} and {to_height}; checkpoint not advanced")
+            new_events = self.index.commit_batch(address, events, from_height, to_height)
+            self.counters['syncs'] += 1
+            self.counters['requests'] += 1 + len(offsets)
+            self.counters['events_fetched'] += new_events
+            return SyncResult(address, from_height, to_height, new_events, 1 + len(offsets),
+                              time.monotonic() - started)
+
+    def positions(self, address):
+        """Stored positions of `address` (no network access)"""
+        return self.index.positions(address)
+
+    def stats(self):
+        return dict(self.counters, **self.index.stats())
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_indexers = {}
+_indexers_lock = threading.Lock()
+
+
+def get_indexer(node_url, db_path, **options):
+    """Process-wide AddressIndexer per (node URL, database path)"""
+    key = (node_url.rstrip("/"), db_path if db_path == ":memory:" else os.path.abspath(db_path))
+    with _indexers_lock:
+        indexer = _indexers.get(key)
+        if indexer is None:
+            indexer = _indexers[key] = AddressIndexer(node_url, AddressIndex(db_path), **options)
+        return indexer
@@ -0,0 +1,176 @@
+"""
+Local, rule-based scoring for the "AI-Powered Portfolio Insights" section.
+
+Three 0-100 health scores are computed from the positions themselves:
+
+- diversity: 1 - HHI of the sBTC weights, scaled so an equal split across
+  the held protocols scores 100 and a single protocol scores 0;
+- yield efficiency: balance-weighted APY as a share of the best APY on offer;
+- risk management: how far the balance-weighted 1-5 risk score (the
+  risk-weighted exposure) sits below the riskiest possible allocation.
+
+`insight_features` computes the underlying features for any number of
+portfolios at once with one groupby (e.g. per address in batch jobs).
+Recommendations are candidate actions (rebalance, diversify, de-risk, monitor)
+each with a 0-1 priority, ranked highest first. Results are memoized per
+portfolio fingerprint and history version; no external service is involved.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .cache import get_lru_cache
+from .hashing import frame_fingerprint
+from .optimizer import plan_rebalance
+
+FEATURE_COLUMNS = ['total_sbtc', 'num_protocols', 'hhi', 'effective_protocols', 'max_weight', 'avg_apy',
+                   'best_apy', 'risk_exposure', 'diversity', 'yield_efficiency', 'risk_management']
+SCORE_LABELS = ((80, "Excellent", "#4CAF50"), (60, "Good", "#4CAF50"), (40, "Moderate", "#f59e0b"),
+                (0, "Poor", "#ef4444"))
+CONCENTRATION_LIMIT = 0.4
+CONCENTRATION_MARGIN = 0.15
+RISK_COMFORT = 2.5
+
+Recommendation = namedtuple("Recommendation", ["kind", "title", "detail", "priority", "protocol"])
+
+
+def score_label(score):
+    """(label, color) for a 0-100 health score"""
+    for floor, label, color in SCORE_LABELS:
+        if score >= floor:
+            return label, color
+    return SCORE_LABELS[-1][1:]
+
+
+def insight_features(positions, by=None, best_apy=None):
+    """
+    Health features per group of `positions` (one row for the whole frame
+    when `by` is None). `best_apy` defaults to the highest APY in `positions`.
+    """
+    frame = positions.assign(
+        _group=0 if by is None else positions[by],
+        _b2=positions['sbtc_balance'] ** 2,
+        _bapy=positions['sbtc_balance'] * positions['apy'],
+        _brisk=positions['sbtc_balance'] * positions['risk_score'],
+    )
+    grouped = frame.groupby('_group', sort=False, observed=True).agg(
+        total_sbtc=('sbtc_balance', 'sum'), max_balance=('sbtc_balance', 'max'), b2=('_b2', 'sum'),
+        bapy=('_bapy', 'sum'), brisk=('_brisk', 'sum'), num_protocols=('protocol', 'nunique'),
+    )
+    total = grouped['total_sbtc'].where(grouped['total_sbtc'] > 0)
+    n = grouped['num_protocols'].to_numpy(np.float64)
+    features = pd.DataFrame(index=grouped.index)
+    features['total_sbtc'] = grouped['total_sbtc']
+    features['num_protocols'] = grouped['num_protocols']
+    features['hhi'] = (grouped['b2'] / total ** 2).fillna(1.0)
+    features['effective_protocols'] = 1 / features['hhi']
+    features['max_weight'] = (grouped['max_balance'] / total).fillna(0.0)
+    features['avg_apy'] = (grouped['bapy'] / total).fillna(0.0)
+    features['best_apy'] = float(positions['apy'].max()) if best_apy is None else float(best_apy)
+    features['risk_exposure'] = (grouped['brisk'] / total).fillna(0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        diversity = np.where(n > 1, (1 - features['hhi']) / (1 - 1 / n), 0.0)
+    features['diversity'] = np.clip(np.nan_to_num(diversity) * 100, 0, 100)
+    features['yield_efficiency'] = np.clip(
+        (features['avg_apy'] / features['best_apy']).where(features['best_apy'] > 0, 0.0) * 100, 0, 100
+    )
+    features['risk_management'] = np.clip((5 - features['risk_exposure']) / 4 * 100, 0, 100).where(total.notna(), 0.0)
+    if by is None:
+        features.index = [None]
+    else:
+        features.index.name = by
+    return features[FEATURE_COLUMNS]
+
+
+class Insights:
+    """Health scores (`scores`: name -> (score, label, color)), features and ranked recommendations"""
+
+    def __init__(self, features, recommendations):
+        self.features = features
+        self.recommendations = recommendations
+        self.scores = {
+            name: (float(features[name]),) + score_label(float(features[name]))
+            for name in ('diversity', 'yield_efficiency', 'risk_management')
+        }
+
+
+def _candidates(positions, history, features, plan):
+    weights = positions.groupby('protocol', observed=True)['sbtc_balance'].sum()
+    weights = weights / weights.sum() if weights.sum() > 0 else weights
+    apy = positions.groupby('protocol', observed=True)['apy'].mean()
+    risk = positions.groupby('protocol', observed=True)['risk_score'].mean()
+
+    if plan is not None:
+        buys = plan.moves[plan.moves['move_sbtc'] > 0]
+        if not buys.empty and plan.apy_gain > 0:
+            top = buys.iloc[0]
+            increase = top['move_sbtc'] / top['current_sbtc'] if top['current_sbtc'] else 1.0
+            yield Recommendation(
+                'rebalance', f"Rebalance to {top['protocol']}",
+                f"Increase allocation by {increase:.0%} to capture higher yields (expected {top['apy']:.1f}% APY); "
+                f"portfolio APY {plan.apy_before:.2f}% → {plan.apy_after:.2f}%",
+                float(min(1.0, 0.5 + plan.apy_gain)), top['protocol'],
+            )
+
+    # An even split over n protocols already puts 1/n in each, so with few
+    # protocols the limit only bites once the largest weight is well above
+    # that; a single protocol is always concentrated.
+    held = int(features['num_protocols'])
+    limit = CONCENTRATION_LIMIT if held < 2 else max(CONCENTRATION_LIMIT, 1 / held + CONCENTRATION_MARGIN)
+    if features['max_weight'] > limit:
+        largest = weights.idxmax()
+        yield Recommendation(
+            'diversify', f"Diversify Away From {largest}",
+            f"{weights[largest]:.0%} of your sBTC sits in one protocol; "
+            f"effective diversification is {features['effective_protocols']:.1f} protocol(s)",
+            float(min(1.0, 0.3 + (weights[largest] - limit) * 2)), largest,
+        )
+
+    safer = risk[(risk < features['risk_exposure']) & (apy >= apy.median())]
+    if features['risk_exposure'] > RISK_COMFORT and not safer.empty:
+        pick = apy[safer.index].idxmax()
+        yield Recommendation(
+            'stability', f"Consider {pick} for Stability",
+            f"Lower risk option (score {risk[pick]:.0f}/5) with {apy[pick]:.1f}% APY",
+            float(min(1.0, 0.2 + (features['risk_exposure'] - RISK_COMFORT) / 2)), pick,
+        )
+
+    if history is not None and not history.empty:
+        _, last = history.date_bounds()
+        window = history.select(list(weights.index), start=last - pd.Timedelta(days=29), columns=['apy'])
+        if not window.empty:
+            by_protocol = window['apy'].groupby(level='protocol', observed=True)
+            moves = (by_protocol.last() - by_protocol.first()).dropna()
+            if not moves.empty:
+                mover = moves.abs().idxmax()
+                change = moves[mover]
+                yield Recommendation(
+                    'monitor', f"Monitor {mover}",
+                    f"APY {'rose' if change > 0 else 'fell'} {abs(change):.1f} points this month "
+                    f"(now {apy.get(mover, float('nan')):.1f}%) - watch for further adjustments",
+                    float(min(1.0, 0.1 + abs(change) / 2)), mover,
+                )
+
+
+def build_insights(positions, history=None, best_apy=None, rebalance_options=None, limit=3):
+    """Uncached Insights for one portfolio"""
+    features = insight_features(positions, best_apy=best_apy).iloc[0]
+    plan = plan_rebalance(positions, history, **rebalance_options) if rebalance_options is not None else None
+    ranked = sorted(_candidates(positions, history, features, plan), key=lambda r: -r.priority)
+    if not any(r.kind in ('rebalance', 'diversify', 'stability') for r in ranked):
+        ranked.append(Recommendation('hold', "Hold Current Allocation",
+                                     "No rebalance, diversification or de-risking move stands out for your selection",
+                                     0.0, None))
+    return Insights(features, ranked[:limit])
+
+
+def get_insights(positions, history=None, best_apy=None, rebalance_options=None, limit=3, cache_size=64):
+    """Insights memoized by portfolio fingerprint, history version and settings"""
+    key = (
+        frame_fingerprint(positions, ['protocol', 'sbtc_balance', 'apy', 'risk_score']),
+        None if history is None else history.version,
+        best_apy, tuple(sorted((rebalance_options or {}).items())), rebalance_options is None, limit,
+    )
+    cache = get_lru_cache("insights", max_entries=cache_size)
+    return cache.get(key, lambda: build_insights(positions, history, best_apy, rebalance_options, limit))
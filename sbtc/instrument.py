@@ -0,0 +1,183 @@
+"""
+Lightweight per-section timing and memory instrumentation for reruns.
+
+A `RerunProfiler` keeps the last N reruns. Each rerun is split into named
+sections, either with the `span()` context manager or, for top-to-bottom
+scripts like app.py, with `section(name)` checkpoints that close the previous
+section and open the next one. Every section records wall time and, when
+tracemalloc is enabled, the net and peak allocation while it ran. Cache hit
+rates are recorded per rerun from the counters of every cache in
+`sbtc.cache`. Results export as JSON lines or Prometheus text.
+
+Allocation figures are process-wide, so concurrent reruns from other
+sessions show up in each other's numbers; sections must not be nested when
+memory tracing is on (the peak counter is reset per section).
+"""
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from .cache import all_caches
+
+
+def _cache_counters():
+    counters = {}
+    for name, cache in all_caches().items():
+        stats = cache.stats()
+        counters[name] = (stats.get('hits', 0) + stats.get('stale_hits', 0), stats.get('misses', 0))
+    return counters
+
+
+class Rerun:
+    """Timings of one script run; created by RerunProfiler.start_rerun()"""
+
+    def __init__(self, profiler, trace_memory):
+        self._profiler = profiler
+        self._trace_memory = trace_memory
+        self._open = None
+        self._cache_start = _cache_counters()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.sections = []
+        self.cache_hit_rates = {}
+        self.wall_ms = None
+
+    def _begin(self, name):
+        memory = tracemalloc.get_traced_memory()[0] if self._trace_memory else None
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        return (name, time.perf_counter(), memory)
+
+    def _end(self, opened):
+        name, started, memory = opened
+        record = {'section': name, 'wall_ms': (time.perf_counter() - started) * 1000}
+        if self._trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record['alloc_kb'] = (current - memory) / 1024
+            record['peak_kb'] = max(0, peak - memory) / 1024
+        self.sections.append(record)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Time the enclosed block as section `name`"""
+        opened = self._begin(name)
+        try:
+            yield
+        finally:
+            self._end(opened)
+
+    def section(self, name):
+        """Close the current checkpoint section (if any) and start `name`"""
+        if self._open is not None:
+            self._end(self._open)
+        self._open = self._begin(name)
+
+    def finish(self):
+        """Close the last section, compute cache hit rates and store this rerun"""
+        if self.wall_ms is not None:
+            return self
+        if self._open is not None:
+            self._end(self._open)
+            self._open = None
+        self.wall_ms = (time.perf_counter() - self._started) * 1000
+        for name, (hits, misses) in _cache_counters().items():
+            hits0, misses0 = self._cache_start.get(name, (0, 0))
+            lookups = (hits - hits0) + (misses - misses0)
+            if lookups:
+                self.cache_hit_rates[name] = (hits - hits0) / lookups
+        self._profiler._record(self)
+        return self
+
+    def to_dict(self):
+        return {
+            'started_at': self.started_at,
+            'wall_ms': self.wall_ms,
+            'sections': self.sections,
+            'cache_hit_rates': self.cache_hit_rates,
+        }
+
+
+class RerunProfiler:
+    """Ring buffer of the last `history` reruns"""
+
+    def __init__(self, history=20, trace_memory=False):
+        self.trace_memory = trace_memory
+        self._reruns = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.total_reruns = 0
+
+    def start_rerun(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return Rerun(self, self.trace_memory and tracemalloc.is_tracing())
+
+    def _record(self, rerun):
+        with self._lock:
+            self._reruns.append(rerun)
+            self.total_reruns += 1
+
+    def reruns(self):
+        """Finished reruns, oldest first"""
+        with self._lock:
+            return list(self._reruns)
+
+    def to_jsonl(self):
+        """One JSON object per finished rerun"""
+        return "".join(json.dumps(r.to_dict()) + "\n" for r in self.reruns())
+
+    def to_prometheus(self):
+        """Prometheus text exposition: last rerun per section plus window averages"""
+        reruns = self.reruns()
+        lines = [
+            "# HELP sbtc_reruns_total Dashboard reruns recorded by this process.",
+            "# TYPE sbtc_reruns_total counter",
+            f"sbtc_reruns_total {self.total_reruns}",
+        ]
+        if not reruns:
+            return "\n".join(lines) + "\n"
+
+        last = reruns[-1]
+        walls = {}
+        for rerun in reruns:
+            for record in rerun.sections:
+                walls.setdefault(record['section'], []).append(record['wall_ms'] / 1000)
+
+        lines += ["# HELP sbtc_rerun_seconds Wall time of the last rerun.",
+                  "# TYPE sbtc_rerun_seconds gauge",
+                  f"sbtc_rerun_seconds {last.wall_ms / 1000:.6f}",
+                  "# HELP sbtc_section_seconds Wall time of each section in the last rerun.",
+                  "# TYPE sbtc_section_seconds gauge"]
+        lines += [f'sbtc_section_seconds{{section="{r["section"]}"}} {r["wall_ms"] / 1000:.6f}' for r in last.sections]
+        lines += ["# HELP sbtc_section_seconds_avg Mean section wall time over the retained reruns.",
+                  "# TYPE sbtc_section_seconds_avg gauge"]
+        lines += [f'sbtc_section_seconds_avg{{section="{s}"}} {sum(v) / len(v):.6f}' for s, v in walls.items()]
+        if any('alloc_kb' in r for r in last.sections):
+            lines += ["# HELP sbtc_section_alloc_bytes Net bytes allocated by each section in the last rerun.",
+                      "# TYPE sbtc_section_alloc_bytes gauge"]
+            lines += [f'sbtc_section_alloc_bytes{{section="{r["section"]}"}} {r["alloc_kb"] * 1024:.0f}'
+                      for r in last.sections if 'alloc_kb' in r]
+        lines += ["# HELP sbtc_cache_hit_ratio Cache hit ratio during the last rerun.",
+                  "# TYPE sbtc_cache_hit_ratio gauge"]
+        lines += [f'sbtc_cache_hit_ratio{{cache="{c}"}} {rate:.4f}' for c, rate in last.cache_hit_rates.items()]
+        return "\n".join(lines) + "\n"
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler(history=None, trace_memory=None):
+    """Process-wide profiler; arguments left as None keep the current settings"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RerunProfiler(history=history or 20, trace_memory=bool(trace_memory))
+        elif history is not None and history != _profiler._reruns.maxlen:
+            previous = _profiler.reruns()
+            _profiler._reruns = deque(previous, maxlen=history)
+        if trace_memory is not None:
+            _profiler.trace_memory = trace_memory
+        return _profiler
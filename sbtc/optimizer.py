@@ -0,0 +1,228 @@
+"""
+Target allocation for the "Rebalance Portfolio" action.
+
+The optimizer maximizes expected APY, w @ apy, over portfolio weights w with
+
+- sum(w) == 1 and 0 <= w <= max_weight (per-protocol concentration cap),
+- w @ risk <= risk_budget (balance-weighted 1-5 risk score).
+
+This is a linear program with a single coupling constraint, so it is solved
+exactly by Lagrangian relaxation: for a risk price lam, the best capped
+allocation greedily fills the protocols with the highest apy - lam * risk.
+Risk falls as lam rises, so lam is found by bisection and the optimum is the
+mix of the two greedy fills that meets the budget exactly. Each step is one
+vectorized argsort/cumsum, so hundreds of pools solve in a few milliseconds.
+
+Moves smaller than `min_move` sBTC are then dropped by fixing those protocols
+at their current weight and re-solving for the rest with the remaining weight,
+cap and risk budget: all of them at once, and only when that breaks a
+constraint the largest subset that doesn't (found by bisection), for a
+bounded number of rounds. A small move survives only when the constraints
+need it. Expected APY is the mean
+of each protocol's history over `lookback_days` when available, otherwise its
+current APY. Plans are memoized by portfolio fingerprint, history version and
+settings.
+"""
+import numpy as np
+import pandas as pd
+
+from .cache import get_lru_cache
+from .hashing import frame_fingerprint
+
+DEFAULT_MAX_WEIGHT = 0.4
+DEFAULT_RISK_BUDGET = 3.0
+DEFAULT_MIN_MOVE = 0.01
+DEFAULT_LOOKBACK_DAYS = 30
+MIN_MOVE_ROUNDS = 4
+PLAN_COLUMNS = ['protocol', 'apy', 'risk_score', 'current_sbtc', 'current_weight', 'target_weight',
+                'target_sbtc', 'move_sbtc']
+
+
+def _greedy_fill(score, cap):
+    """Capped weights summing to 1 that favour the highest `score` (rows of a 2-D score batch)"""
+    order = np.argsort(-score, axis=-1, kind='stable')
+    filled_before = np.arange(score.shape[-1]) * cap
+    weights = np.empty_like(score)
+    np.put_along_axis(weights, order, np.clip(1.0 - filled_before, 0.0, cap), axis=-1)
+    return weights
+
+
+def optimize_weights(apy, risk, max_weight=DEFAULT_MAX_WEIGHT, risk_budget=DEFAULT_RISK_BUDGET, iterations=60):
+    """
+    Weights maximizing `apy` @ w under the cap and risk budget, plus whether the
+    budget could be met. When it can't, the minimum-risk allocation is returned.
+    A cap below 1/n is raised to 1/n so the weights can still sum to 1.
+    """
+    apy = np.asarray(apy, dtype=np.float64)
+    risk = np.asarray(risk, dtype=np.float64)
+    n = len(apy)
+    if n == 0:
+        return np.zeros(0), True
+    cap = max(float(max_weight), 1.0 / n)
+
+    best = _greedy_fill(apy[None, :], cap)[0]
+    if best @ risk <= risk_budget:
+        return best, True
+    safest = _greedy_fill(-risk[None, :] + 1e-9 * apy[None, :], cap)[0]
+    if safest @ risk > risk_budget + 1e-12:
+        return safest, False
+
+    # Bisection on the risk price; `high` always meets the budget, `low` never does
+    spread = np.ptp(risk) or 1.0
+    low, high = 0.0, (np.ptp(apy) + 1.0) / spread * 2
+    while _greedy_fill((apy - high * risk)[None, :], cap)[0] @ risk > risk_budget:
+        high *= 2
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        if _greedy_fill((apy - mid * risk)[None, :], cap)[0] @ risk > risk_budget:
+            low = mid
+        else:
+            high = mid
+    fills = _greedy_fill(np.stack([apy - low * risk, apy - high * risk]), cap)
+    risk_low, risk_high = fills @ risk
+    theta = 1.0 if risk_low == risk_high else (risk_budget - risk_high) / (risk_low - risk_high)
+    theta = min(max(theta, 0.0), 1.0)
+    return theta * fills[0] + (1 - theta) * fills[1], True
+
+
+def _fix_and_resolve(apy, risk, current, fixed, cap, risk_budget):
+    """Weights with `fixed` protocols at `current` and the rest re-optimized, or None if impossible"""
+    free = ~fixed
+    weights = current.copy()
+    mass = 1.0 - current[fixed].sum()
+    if not free.any():
+        return weights if abs(mass) <= 1e-9 else None
+    if mass <= 0 or free.sum() * cap < mass - 1e-12:
+        return None
+    sub_budget = (risk_budget - current[fixed] @ risk[fixed]) / mass
+    sub_weights, _ = optimize_weights(apy[free], risk[free], cap / mass, sub_budget)
+    weights[free] = sub_weights * mass
+    return weights
+
+
+def apply_min_move(apy, risk, current, weights, feasible, max_weight, risk_budget, min_weight):
+    """
+    Re-solve `weights` (from optimize_weights) with protocols whose move is below
+    `min_weight` fixed at their `current` weight, for at most MIN_MOVE_ROUNDS
+    rounds. Each round fixes every small mover and re-solves the rest once; if
+    that breaks the cap or the risk budget (for an infeasible plan: raises its
+    risk), the largest prefix of the small movers, ordered by how little risk
+    fixing them adds, that still meets both is found by bisection. A small move
+    that can't be dropped without breaking a constraint is kept. Protocols above
+    the cap are never fixed.
+    """
+    n = len(weights)
+    cap = max(float(max_weight), 1.0 / n) if n else 0.0
+    fixed = np.zeros(n, dtype=bool)
+    limit = risk_budget if feasible else weights @ risk
+
+    def attempt(chosen):
+        trial_fixed = fixed.copy()
+        trial_fixed[chosen] = True
+        trial = _fix_and_resolve(apy, risk, current, trial_fixed, cap, risk_budget)
+        if trial is None or trial.max() > cap + 1e-9 or trial @ risk > limit + 1e-9:
+            return None
+        return trial, trial_fixed
+
+    for _ in range(MIN_MOVE_ROUNDS):
+        moves = np.abs(weights - current)
+        candidates = np.flatnonzero(~fixed & (moves < min_weight) & (current <= cap + 1e-12))
+        if not len(candidates):
+            break
+        # Holding a protocol at its current weight instead of its target adds
+        # roughly (current - target) * (its risk - the plan's risk)
+        added_risk = (current - weights)[candidates] * (risk[candidates] - weights @ risk)
+        order = candidates[np.argsort(added_risk, kind='stable')]
+        result = attempt(order)
+        if result is None:
+            low, high = 0, len(order)   # fixing order[:low] is known to work, order[:high] not
+            while high - low > 1:
+                mid = (low + high) // 2
+                trial = attempt(order[:mid])
+                if trial is None:
+                    high = mid
+                else:
+                    low, result = mid, trial
+        if result is None:
+            break
+        weights, fixed = result
+    return weights
+
+
+class RebalancePlan:
+    """
+    Target allocation per protocol (`allocations`, one row per protocol) with
+    the balance-weighted APY and risk before and after. `feasible` is False
+    when no allocation meets the risk budget (the plan is then the safest one).
+    """
+
+    def __init__(self, allocations, feasible, risk_budget, max_weight):
+        self.allocations = allocations
+        self.feasible = feasible
+        self.risk_budget = risk_budget
+        self.max_weight = max_weight
+        total = allocations['current_sbtc'].sum()
+        current_w = allocations['current_weight'].to_numpy()
+        final_w = (allocations['current_sbtc'] + allocations['move_sbtc']).to_numpy() / total if total > 0 else current_w
+        self.apy_before = float(current_w @ allocations['apy'].to_numpy())
+        self.apy_after = float(final_w @ allocations['apy'].to_numpy())
+        self.risk_before = float(current_w @ allocations['risk_score'].to_numpy())
+        self.risk_after = float(final_w @ allocations['risk_score'].to_numpy())
+
+    @property
+    def moves(self):
+        """Rows with a non-zero move, largest first"""
+        moves = self.allocations[self.allocations['move_sbtc'] != 0]
+        return moves.reindex(moves['move_sbtc'].abs().sort_values(ascending=False).index)
+
+    @property
+    def apy_gain(self):
+        return self.apy_after - self.apy_before
+
+
+def expected_apy(positions, history=None, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """Per-protocol expected APY: mean over the last `lookback_days` of history, else the current APY"""
+    current = positions.groupby('protocol', sort=True, observed=True)['apy'].mean()
+    if history is None or history.empty:
+        return current
+    _, last = history.date_bounds()
+    # One date-range slice of every protocol; a per-label protocol lookup costs more than the extra rows
+    window = history.select(start=last - pd.Timedelta(days=lookback_days - 1), columns=['apy'])
+    means = window['apy'].groupby(level='protocol', observed=True).mean().astype(np.float64)
+    return means.reindex(current.index).fillna(current)
+
+
+def build_plan(positions, history=None, max_weight=DEFAULT_MAX_WEIGHT, risk_budget=DEFAULT_RISK_BUDGET,
+               min_move=DEFAULT_MIN_MOVE, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """Uncached RebalancePlan for a positions frame (duplicate protocol rows are summed)"""
+    grouped = positions.groupby('protocol', sort=True, observed=True).agg(
+        current_sbtc=('sbtc_balance', 'sum'), risk_score=('risk_score', 'mean')
+    )
+    grouped['apy'] = expected_apy(positions, history, lookback_days)
+    total = grouped['current_sbtc'].sum()
+    weights, feasible = optimize_weights(grouped['apy'].to_numpy(), grouped['risk_score'].to_numpy(),
+                                         max_weight, risk_budget)
+    current = grouped['current_sbtc'].to_numpy(np.float64)
+    if total > 0:
+        weights = apply_min_move(grouped['apy'].to_numpy(np.float64), grouped['risk_score'].to_numpy(np.float64),
+                                 current / total, weights, feasible, max_weight, risk_budget, min_move / total)
+    target = weights * total
+
+    allocations = grouped.reset_index()
+    allocations['current_weight'] = current / total if total > 0 else 0.0
+    allocations['target_weight'] = weights
+    allocations['target_sbtc'] = target
+    allocations['move_sbtc'] = np.where(np.isclose(target, current, rtol=0, atol=1e-12), 0.0, target - current)
+    return RebalancePlan(allocations[PLAN_COLUMNS], feasible, risk_budget, max_weight)
+
+
+def plan_rebalance(positions, history=None, max_weight=DEFAULT_MAX_WEIGHT, risk_budget=DEFAULT_RISK_BUDGET,
+                   min_move=DEFAULT_MIN_MOVE, lookback_days=DEFAULT_LOOKBACK_DAYS, cache_size=32):
+    """RebalancePlan memoized by portfolio fingerprint, history version and settings"""
+    key = (
+        frame_fingerprint(positions, ['protocol', 'sbtc_balance', 'apy', 'risk_score']),
+        None if history is None else history.version,
+        float(max_weight), float(risk_budget), float(min_move), int(lookback_days),
+    )
+    cache = get_lru_cache("rebalance", max_entries=cache_size)
+    return cache.get(key, lambda: build_plan(positions, history, max_weight, risk_budget, min_move, lookback_days))
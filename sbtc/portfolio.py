@@ -0,0 +1,185 @@
+"""
+Portfolio model: loading, validation, demo fallback, history and filtering.
+
+This is the entry point for reusing the dashboard's numbers outside of
+Streamlit:
+
+    from sbtc import load_portfolio
+    portfolio = load_portfolio(api_url="http://127.0.0.1:8600")
+    portfolio.overview(["ALEX", "Bitflow"])
+"""
+import pandas as pd
+
+from .aggregates import get_aggregates, risk_level
+from .history import HistoryStore
+from .insights import get_insights
+from .optimizer import plan_rebalance
+from .projection import project
+from .rolling import DEFAULT_WINDOW, get_rolling
+from .schema import compact_positions
+from .synthetic import mock_history
+
+# Portfolios are shared read-only across sessions (sbtc.snapshot) and
+# filter_portfolio hands out the shared frame itself, which is only safe with
+# copy-on-write: the default from pandas 3.0, opt-in before it.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+REQUIRED_COLUMNS = ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score', 'historical']
+POSITION_COLUMNS = [c for c in REQUIRED_COLUMNS if c != 'historical']
+
+# Demo positions shown whenever live data is unavailable
+DUMMY_POSITIONS = [
+    {'protocol': 'ALEX', 'sbtc_balance': 1.2, 'apy': 4.5, 'yield_earned': 0.05, 'tvl': 10000, 'risk_score': 2},
+    {'protocol': 'Bitflow', 'sbtc_balance': 0.8, 'apy': 3.9, 'yield_earned': 0.03, 'tvl': 8000, 'risk_score': 3},
+    {'protocol': 'Arkadiko', 'sbtc_balance': 1.0, 'apy': 5.2, 'yield_earned': 0.06, 'tvl': 12000, 'risk_score': 2},
+]
+
+
+def fetch_sbtc_portfolio_live(api_url=None, deadline=8.0, protocols=None):
+    """
+    Fetches live sBTC portfolio data from the Rebar Data API or another source.
+    Returns a pandas DataFrame with columns:
+    ['protocol', 'sbtc_balance', 'apy', 'yield_earned', 'tvl', 'risk_score', 'historical']
+    All protocols are fetched concurrently; protocols that fail or miss the
+    `deadline` (seconds) are left out and listed in df.attrs['fetch_errors'].
+    `protocols` overrides the default ALEX/Bitflow/Arkadiko list.
+    If API is unavailable (or no `api_url` is configured), returns an empty DataFrame.
+    """
+    if not api_url:
+        # No API configured: return empty DataFrame to trigger dummy data
+        return pd.DataFrame()
+    # Imported lazily so `import sbtc` stays cheap for callers that never fetch
+    from .fetcher import DEFAULT_PROTOCOLS, get_fetcher, results_to_frame
+    try:
+        results = get_fetcher(api_url, tuple(protocols or DEFAULT_PROTOCOLS)).fetch_all(deadline=deadline)
+        return results_to_frame(results)
+    except Exception:
+        return pd.DataFrame()
+
+
+def validate_portfolio(df):
+    """Raise ValueError if a fetched portfolio frame can't be displayed"""
+    if (df.empty or
+            not all(col in df.columns for col in REQUIRED_COLUMNS) or
+            any(df[col].isnull().all() for col in REQUIRED_COLUMNS if col != 'historical')):  # historical can be complex
+        # Empty data, missing critical columns or an all-null column; 'historical', if
+        # present, must still hold valid DataFrames.
+        if 'historical' in df.columns:
+            if not all(isinstance(h, pd.DataFrame) and not h.empty for h in df['historical'] if h is not None):
+                raise ValueError("Live data fetched but 'historical' column contains invalid or empty DataFrames.")
+        else:  # If historical column itself is missing
+            raise ValueError("Live data fetched but is incomplete or empty (missing 'historical' or other critical columns).")
+
+
+def dummy_portfolio():
+    """Demo positions (without history) used when live data is unavailable"""
+    return pd.DataFrame(DUMMY_POSITIONS, columns=POSITION_COLUMNS)
+
+
+def filter_portfolio(df, selected=None):
+    """Rows for the `selected` protocols; no selection means every row (no copy)"""
+    if not selected:
+        return df
+    return df[df['protocol'].isin(selected)]
+
+
+def load_history(positions, history_path=None, history_days=30):
+    """
+    Split nested histories off `positions` and attach persisted/mock history.
+
+    Returns (positions without 'historical', HistoryStore, error message or None).
+    Live histories are appended to the on-disk store at `history_path` and
+    read back from it; demo positions get seeded mock history, generated in
+    memory only so it never shadows live history in the store.
+    """
+    history = None
+    if 'historical' in positions.columns:
+        history = HistoryStore.from_nested(positions)
+        positions = positions.drop(columns=['historical'])
+
+    error = None
+    if history_path and history is not None:
+        try:
+            from .storage import open_history_store
+            disk_store = open_history_store(history_path)
+            today = pd.Timestamp.today().normalize()
+            disk_store.append(history)
+            history = disk_store.load(start=today - pd.Timedelta(days=history_days - 1),
+                                      protocols=positions['protocol'])
+        except Exception as e:
+            error = str(e)
+    if history is None or history.empty:
+        history = mock_history(positions['protocol'], days=history_days)
+    return positions, history, error
+
+
+class Portfolio:
+    """
+    Validated per-protocol positions plus their (protocol, date) history.
+
+    `source` is 'live' or 'dummy'; `fallback_reason` explains why live data
+    was rejected, `fetch_errors` lists protocols that failed to fetch and
+    `history_error` reports a history store problem (in-memory history is used).
+    """
+
+    def __init__(self, positions, history, source='live', fallback_reason=None, fetch_errors=None,
+                 history_error=None):
+        self.positions = positions
+        self.history = history
+        self.source = source
+        self.fallback_reason = fallback_reason
+        self.fetch_errors = dict(fetch_errors or {})
+        self.history_error = history_error
+
+    @property
+    def protocols(self):
+        return sorted(self.positions['protocol'].unique()) if 'protocol' in self.positions.columns else []
+
+    def filter(self, selected=None):
+        return filter_portfolio(self.positions, selected)
+
+    def overview(self, selected=None):
+        """Overview metrics for `selected` protocols plus a 'risk_level' label"""
+        summary = dict(get_aggregates(self.positions).summary(selected))
+        summary['risk_level'] = risk_level(summary['avg_risk_score'])[0]
+        return summary
+
+    def rebalance(self, **options):
+        """Target allocation across all protocols (see sbtc.optimizer.plan_rebalance for options)"""
+        return plan_rebalance(self.positions, self.history, **options)
+
+    def project(self, selected=None, horizon_days=30, **options):
+        """Monte Carlo percentile bands for `selected` protocols (see sbtc.projection.project)"""
+        return project(self.positions, self.history, selected, horizon_days, **options)
+
+    def rolling(self, window=DEFAULT_WINDOW):
+        """Rolling analytics over the history (see sbtc.rolling), extended incrementally per window"""
+        return get_rolling(self.history, window)
+
+    def insights(self, selected=None, rebalance_options=None):
+        """Health scores and ranked recommendations for `selected` protocols, against the best APY of all"""
+        return get_insights(self.filter(selected), self.history, best_apy=float(self.positions['apy'].max()),
+                            rebalance_options=rebalance_options)
+
+
+def build_portfolio(raw_df, history_path=None, history_days=30, compact=False):
+    """
+    Validate a fetched frame (falling back to demo data) and attach history.
+    `compact` stores the positions in the compact schema (see sbtc.schema).
+    """
+    fetch_errors = raw_df.attrs.get('fetch_errors', {})
+    try:
+        validate_portfolio(raw_df)
+        positions, source, fallback_reason = raw_df, 'live', None
+    except Exception as e:
+        positions, source, fallback_reason = dummy_portfolio(), 'dummy', str(e)
+    positions, history, history_error = load_history(positions, history_path, history_days)
+    if compact:
+        positions = compact_positions(positions)
+    return Portfolio(positions, history, source, fallback_reason, fetch_errors, history_error)
+
+
+def load_portfolio(api_url=None, deadline=8.0, history_path=None, history_days=30, protocols=None, compact=False):
+    """Fetch, validate and assemble a Portfolio in one call"""
+    return build_portfolio(fetch_sbtc_portfolio_live(api_url, deadline, protocols), history_path, history_days, compact)
@@ -0,0 +1,180 @@
+"""
+Resampled history pyramid: hourly, daily, weekly and monthly levels.
+
+A level holds, per (protocol, bucket start) and per history metric, the
+OHLC-style aggregates `<metric>_open/_high/_low/_close`, `<metric>_mean` and
+`<metric>_sum`, plus the number of raw points in the bucket (`count`):
+
+    protocol  date        apy_open  apy_high  apy_low  apy_close  apy_mean ...  count
+    ALEX      2024-04-29  4.41      4.73      4.20     4.52       4.47          7
+
+Levels are built lazily, once per history version and resolution. The history
+is sorted by (protocol, date), so every bucket is a contiguous run of rows and
+a level is one O(rows) pass of NumPy `reduceat` calls. Coarser levels are
+reduced from the next finer one (daily from hourly, weekly and monthly from
+daily) rather than from the raw series, since open/high/low/close/sum/count
+compose. Each level is stored as a HistoryStore, so a protocol/date-range
+slice of any level is an index lookup: zooming out to five years of monthly
+buckets or in to one week of daily ones reads only the rows shown.
+
+Resolutions finer than the history's own spacing (hourly on daily history)
+are not offered.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .cache import get_lru_cache
+from .history import HistoryStore
+
+# Resolution name -> (bucket length used for spacing and point estimates, parent level)
+RESOLUTIONS = {
+    'hourly': (pd.Timedelta(hours=1), None),
+    'daily': (pd.Timedelta(days=1), 'hourly'),
+    'weekly': (pd.Timedelta(days=7), 'daily'),
+    'monthly': (pd.Timedelta(days=30.44), 'daily'),
+}
+AGGREGATES = ('open', 'high', 'low', 'close', 'mean', 'sum')
+
+
+def bucket_starts(dates, resolution):
+    """Start of the `resolution` bucket containing each of `dates` (weeks start on Monday)"""
+    dates = pd.DatetimeIndex(dates)
+    if resolution == 'hourly':
+        return dates.floor('h')
+    if resolution == 'daily':
+        return dates.normalize()
+    if resolution == 'weekly':
+        return dates.normalize() - pd.to_timedelta(dates.weekday, unit='D')
+    if resolution == 'monthly':
+        return dates.to_period('M').start_time
+    raise ValueError(f"unknown resolution {resolution!r} (expected one of {', '.join(RESOLUTIONS)})")
+
+
+def _runs(codes, buckets):
+    """Start offsets of the contiguous (protocol code, bucket) runs in sorted rows"""
+    if not len(codes):
+        return np.empty(0, dtype=np.intp)
+    change = np.empty(len(codes), dtype=bool)
+    change[0] = True
+    np.not_equal(codes[1:], codes[:-1], out=change[1:])
+    change[1:] |= buckets[1:] != buckets[:-1]
+    return np.flatnonzero(change)
+
+
+def _reduce(frame, resolution, metrics, columns_for):
+    """
+    Reduce a (protocol, date)-sorted level or raw frame to `resolution` buckets.
+    `columns_for(metric)` gives the (open, high, low, close, sum) source arrays.
+    """
+    codes = frame.index.codes[0]
+    buckets = bucket_starts(frame.index.get_level_values('date'), resolution)
+    starts = _runs(codes, buckets.asi8)
+    if not len(starts):
+        return None
+    last = np.r_[starts[1:], len(codes)] - 1
+    counts = frame['count'].to_numpy() if 'count' in frame.columns else np.ones(len(frame), dtype=np.float32)
+    count = np.add.reduceat(counts, starts)
+    columns = {}
+    for metric in metrics:
+        opens, highs, lows, closes, sums = columns_for(metric)
+        total = np.add.reduceat(sums, starts)
+        columns.update({
+            f'{metric}_open': opens[starts],
+            f'{metric}_high': np.maximum.reduceat(highs, starts),
+            f'{metric}_low': np.minimum.reduceat(lows, starts),
+            f'{metric}_close': closes[last],
+            f'{metric}_mean': total / count,
+            f'{metric}_sum': total,
+        })
+    columns['count'] = count
+    bucket_dates = buckets[starts]
+    dates = bucket_dates.unique().sort_values().rename('date')
+    index = pd.MultiIndex(levels=[frame.index.levels[0], dates], codes=[codes[starts], dates.get_indexer(bucket_dates)],
+                          names=['protocol', 'date'], verify_integrity=False)
+    return pd.DataFrame({name: values.astype(np.float32, copy=False) for name, values in columns.items()},
+                        index=index, copy=False)
+
+
+class HistoryPyramid:
+    """Lazily built resampled levels of one HistoryStore (see module docstring)"""
+
+    def __init__(self, history):
+        self.history = history
+        self.version = history.version
+        self._levels = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        # Smallest gap between consecutive history dates (None for fewer than two dates)
+        dates = history.frame.index.levels[1] if not history.empty else pd.DatetimeIndex([])
+        self.spacing = dates.to_series().diff().min() if len(dates) > 1 else None
+        # Resolutions at least as coarse as that spacing, finest first
+        self.resolutions = [name for name, (length, _) in RESOLUTIONS.items()
+                            if self.spacing is None or length >= self.spacing]
+
+    def level(self, resolution):
+        """HistoryStore of `resolution` buckets (built on first use, then shared)"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"unknown resolution {resolution!r} (expected one of {', '.join(RESOLUTIONS)})")
+        with self._lock:
+            return self._level(resolution)
+
+    def _level(self, resolution):
+        store = self._levels.get(resolution)
+        if store is not None:
+            return store
+        if self.history.empty:
+            frame = None
+        else:
+            parent = RESOLUTIONS[resolution][1]
+            metrics = self.history.metrics
+            if parent is not None and parent in self.resolutions:
+                source = self._level(parent).frame
+                frame = _reduce(source, resolution, metrics, lambda m: tuple(
+                    source[f'{m}_{a}'].to_numpy() for a in ('open', 'high', 'low', 'close', 'sum')
+                ))
+            else:
+                source = self.history.frame
+                frame = _reduce(source, resolution, metrics, lambda m: (source[m].to_numpy(),) * 5)
+        if frame is None:
+            columns = [f'{m}_{a}' for m in self.history.metrics for a in AGGREGATES] + ['count']
+            store = HistoryStore(pd.DataFrame(columns=['protocol', 'date'] + columns), version=self.version)
+        else:
+            store = HistoryStore(frame, version=self.version)
+        self._levels[resolution] = store
+        self.builds += 1
+        return store
+
+    def window_start(self, days=None):
+        """First date covered by the last `days` days of history (None for all of it)"""
+        first, last = self.history.date_bounds()
+        if days is None or last is None:
+            return None
+        return max(first, last - pd.Timedelta(days=days) + (self.spacing or pd.Timedelta(0)))
+
+    def auto_resolution(self, start=None, end=None, max_points=1500):
+        """Finest available resolution with at most `max_points` buckets per protocol in [start, end]"""
+        first, last = self.history.date_bounds()
+        if first is None:
+            return self.resolutions[0]
+        span = (pd.Timestamp(end) if end is not None else last) - (pd.Timestamp(start) if start is not None else first)
+        for name in self.resolutions:
+            if span / RESOLUTIONS[name][0] <= max_points:
+                return name
+        return self.resolutions[-1]
+
+    def select(self, protocol, resolution, start=None, end=None, aggregates=AGGREGATES):
+        """One protocol's `resolution` buckets in [start, end] as a flat frame with a 'date' column"""
+        columns = [f'{m}_{a}' for m in self.history.metrics for a in aggregates] + ['count']
+        return self.level(resolution).for_protocol(protocol, start, end, columns)
+
+    def stats(self):
+        with self._lock:
+            return {'version': self.version, 'levels': {name: len(store) for name, store in self._levels.items()},
+                    'builds': self.builds}
+
+
+def get_pyramid(history, cache_size=8):
+    """Process-wide HistoryPyramid for `history`, shared per history version"""
+    return get_lru_cache("pyramids", max_entries=cache_size).get(history.version, lambda: HistoryPyramid(history))
@@ -0,0 +1,317 @@
+"""
+Rolling analytics over the per-protocol history, extended incrementally.
+
+For every (protocol, date) row of a HistoryStore:
+
+- apy_mean / apy_std: mean and sample standard deviation of APY over the
+  rows dated within the last `window` days, (date - window, date];
+- volatility: standard deviation of balance log returns over the same
+  window, each scaled to one day by the square root of its gap in days and
+  annualized with sqrt(365), so daily, intraday and gappy history agree;
+- drawdown / max_drawdown: balance below its running peak (0 to -1) and the
+  worst drawdown so far;
+- cum_yield: running sum of `yield_earned`.
+
+Everything is computed for all protocols at once on the long (protocol, date)
+arrays. Window sums use prefix sums clamped to each protocol's first row, and
+the running peak, worst drawdown and cumulative yield are grouped cumulative
+operations, so one pass is O(rows) whatever the window. `RollingAnalytics`
+keeps each protocol's rows of its last window and running totals as carry
+state, plus the latest row per protocol for the summary: when a newer
+HistoryStore arrives only the rows after each protocol's watermark are
+processed, and their results are appended as a chunk. `get_rolling` keeps
+one instance per (window, history version), extended from a fork of the
+previous version's, so a session never reads analytics that another session
+is moving on.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .history import INDEX_NAMES
+
+DEFAULT_WINDOW = 7
+ROLLING_COLUMNS = ['apy', 'apy_mean', 'apy_std', 'volatility', 'sbtc_balance', 'drawdown', 'max_drawdown',
+                   'cum_yield']
+TRADING_DAYS = 365
+DAY_SECONDS = 86400
+MAX_CHUNKS = 16
+
+
+def _group_bounds(codes):
+    """First and last row index of each row's group (rows are sorted by group)"""
+    change = np.ones(len(codes) + 1, dtype=bool)
+    change[1:-1] = codes[1:] != codes[:-1]
+    firsts = np.flatnonzero(change[:-1])
+    ordinal = np.cumsum(change[:-1]) - 1
+    return firsts[ordinal], np.flatnonzero(change[1:])[ordinal]
+
+
+def last_rows(codes, n):
+    """Boolean mask of the last `n` rows of each group"""
+    _, ends = _group_bounds(codes)
+    return np.arange(len(codes)) > ends - n
+
+
+def _seconds(index):
+    """Dates of a (protocol, date) index as int64 seconds"""
+    return index.get_level_values('date').to_numpy('datetime64[s]').astype(np.int64)
+
+
+def window_starts(codes, seconds, window):
+    """
+    First row of each row's trailing `window`-day window (date - window, date],
+    never reaching back past the row's group start. Rows are sorted by
+    (group, date), so this is one binary search on a combined key.
+    """
+    starts, _ = _group_bounds(codes)
+    if not len(codes):
+        return starts
+    span = window * DAY_SECONDS
+    offset = seconds - seconds.min()
+    key = codes.astype(np.int64) * (int(offset.max()) + span + 1) + offset
+    return np.maximum(np.searchsorted(key, key - span, side='right'), starts)
+
+
+def window_tail(codes, seconds, window):
+    """
+    Boolean mask of the rows a later row's window can reach: each group's
+    rows dated within `window` days of its last one, plus the row before
+    them (the base of the first one's return).
+    """
+    starts, ends = _group_bounds(codes)
+    inside = seconds > seconds[ends] - window * DAY_SECONDS
+    mask = inside.copy()
+    mask[:-1] |= inside[1:] & (starts[1:] != np.arange(1, len(codes)))
+    return mask
+
+
+def windowed_mean_std(values, starts, lo):
+    """
+    Mean and sample std of values[lo:row + 1] per row (`lo` from
+    window_starts; `starts` are the group starts). NaNs are skipped.
+    """
+    valid = ~np.isnan(values)
+    # Shift by each group's first value so the prefix sums don't lose precision
+    ref = np.nan_to_num(values[starts])
+    x = np.where(valid, values - ref, 0.0)
+    prefix = np.zeros((3, len(values) + 1))
+    np.cumsum(valid, out=prefix[0, 1:])
+    np.cumsum(x, out=prefix[1, 1:])
+    np.cumsum(x * x, out=prefix[2, 1:])
+    count, total, squares = prefix[:, 1:] - prefix[:, lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count + ref, np.nan)
+        var = np.where(count > 1, (squares - total * total / count) / (count - 1), np.nan)
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+def compute_rolling(frame, window=DEFAULT_WINDOW, carry=None, skip=None):
+    """
+    Rolling analytics (ROLLING_COLUMNS) for a (protocol, date)-sorted history
+    frame. `carry` holds running 'peak', 'max_drawdown' and 'cum_yield' per
+    protocol from earlier rows; rows flagged in the boolean `skip` array are
+    used for the windows only (they were already emitted) and are dropped.
+    """
+    codes = frame.index.codes[0]
+    seconds = _seconds(frame.index)
+    starts, _ = _group_bounds(codes)
+    lo = window_starts(codes, seconds, window)
+    apy = frame['apy'].to_numpy(np.float64)
+    balance = frame['sbtc_balance'].to_numpy(np.float64)
+
+    # Log returns per one day of elapsed time, whatever the spacing of the rows
+    returns = np.full(len(balance), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = np.log(balance[1:] / balance[:-1]) / np.sqrt(np.diff(seconds) / DAY_SECONDS)
+    returns[starts == np.arange(len(starts))] = np.nan
+    returns[~np.isfinite(returns)] = np.nan
+    apy_mean, apy_std = windowed_mean_std(apy, starts, lo)
+    _, return_std = windowed_mean_std(returns, starts, lo)
+
+    keep = slice(None) if skip is None else ~skip
+    result = pd.DataFrame({
+        'apy': apy[keep], 'apy_mean': apy_mean[keep], 'apy_std': apy_std[keep],
+        'volatility': return_std[keep] * np.sqrt(TRADING_DAYS), 'sbtc_balance': balance[keep],
+    }, index=frame.index[keep])
+    group = result.index.codes[0]
+    if carry is not None:
+        carried = carry.reindex(result.index.levels[0].astype(str)).iloc[group]
+        peak0 = carried['peak'].fillna(-np.inf).to_numpy()
+        drawdown0 = carried['max_drawdown'].fillna(0.0).to_numpy()
+        yield0 = carried['cum_yield'].fillna(0.0).to_numpy()
+    else:
+        peak0, drawdown0, yield0 = -np.inf, 0.0, 0.0
+    peak = np.maximum(pd.Series(balance[keep]).groupby(group, sort=False).cummax().to_numpy(), peak0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdown = np.where(peak > 0, result['sbtc_balance'].to_numpy() / peak - 1, 0.0)
+    result['drawdown'] = drawdown
+    result['max_drawdown'] = np.minimum(pd.Series(drawdown).groupby(group, sort=False).cummin().to_numpy(), drawdown0)
+    yields = frame['yield_earned'].to_numpy(np.float64)[keep]
+    result['cum_yield'] = pd.Series(yields).groupby(group, sort=False).cumsum().to_numpy() + yield0
+    result['_peak'] = peak
+    return result
+
+
+class RollingAnalytics:
+    """
+    Rolling analytics for one window (in days), extended as newer
+    HistoryStores arrive.
+
+    `update(history)` processes only rows dated after each protocol's
+    watermark; if the store is not an extension of what was seen (a protocol
+    disappeared or its last seen row changed) everything is recomputed.
+    Reads and updates take the same lock; `fork()` gives an independent copy
+    to extend for the next history version.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = int(window)
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self._chunks = []
+        self._frame = None
+        self._latest = pd.DataFrame(columns=['date'] + ROLLING_COLUMNS, index=pd.Index([], name='protocol'))
+        self._tail = None       # history rows of each protocol's last window (see window_tail)
+        self._carry = pd.DataFrame(columns=['peak', 'max_drawdown', 'cum_yield'], dtype=np.float64)
+        self.watermarks = pd.Series(dtype='datetime64[ns]')
+        self.version = None
+        self.counters = {'rows_processed': 0, 'extends': 0, 'rebuilds': 0}
+
+    def _is_extension(self, history):
+        if self.watermarks.empty:
+            return True
+        if not set(self.watermarks.index) <= set(history.protocols):
+            return False
+        last = self._tail[last_rows(self._tail.index.codes[0], 1)]
+        seen = history.frame.reindex(last.index)[last.columns]
+        return bool(np.allclose(seen.to_numpy(np.float64), last.to_numpy(np.float64), equal_nan=True))
+
+    def _new_rows(self, history):
+        if self.watermarks.empty:
+            return history.frame
+        start = self.watermarks.min()
+        frame = history.select(start=start) if len(self.watermarks) == len(history.protocols) else history.frame
+        dates = frame.index.get_level_values('date')
+        marks = self.watermarks.reindex(frame.index.get_level_values('protocol').astype(str)).to_numpy()
+        return frame[np.isnat(marks) | (dates.to_numpy() > marks)]
+
+    def extend(self, rows):
+        """Append canonical (protocol, date)-indexed history rows newer than the watermarks"""
+        if rows.empty:
+            return
+        rows = rows[['apy', 'sbtc_balance', 'yield_earned']]
+        rows.index = rows.index.set_levels(rows.index.levels[0].astype(str), level=0)
+        if self._tail is not None and not self._tail.empty:
+            combined = pd.concat([self._tail.assign(_skip=True), rows.assign(_skip=False)]).sort_index(kind='stable')
+            skip = combined.pop('_skip').to_numpy(bool)
+        else:
+            combined, skip = rows, None
+        result = compute_rolling(combined, self.window, self._carry, skip)
+
+        self._tail = combined[window_tail(combined.index.codes[0], _seconds(combined.index), self.window)]
+        last = result[last_rows(result.index.codes[0], 1)]
+        carry = pd.DataFrame({'peak': last['_peak'].to_numpy(), 'max_drawdown': last['max_drawdown'].to_numpy(),
+                              'cum_yield': last['cum_yield'].to_numpy()},
+                             index=last.index.get_level_values('protocol').astype(str))
+        self._carry = pd.concat([self._carry[~self._carry.index.isin(carry.index)], carry])
+        marks = pd.Series(last.index.get_level_values('date'), index=carry.index)
+        self.watermarks = pd.concat([self.watermarks[~self.watermarks.index.isin(marks.index)], marks])
+        latest = last.drop(columns='_peak').astype(np.float32).reset_index(level='date')
+        latest.index = carry.index.rename('protocol')
+        self._latest = pd.concat([self._latest[~self._latest.index.isin(latest.index)], latest]).sort_index()
+        # Rebind rather than mutate, so a shallow copy (e.g. a benchmark fixture) stays independent.
+        # Chunks are only merged every MAX_CHUNKS extends, not concatenated per version.
+        chunks = self._chunks + [result.drop(columns='_peak').astype(np.float32)]
+        self._chunks = [pd.concat(chunks).sort_index()] if len(chunks) > MAX_CHUNKS else chunks
+        self._frame = None
+        self.counters = dict(self.counters, rows_processed=self.counters['rows_processed'] + len(rows),
+                             extends=self.counters['extends'] + 1)
+
+    def update(self, history):
+        """Bring the analytics up to date with `history` (a HistoryStore)"""
+        with self._lock:
+            if history is None or history.version == self.version:
+                return self
+            if not self._is_extension(history):
+                self.reset()
+                self.counters['rebuilds'] += 1
+            self.extend(self._new_rows(history))
+            self.version = history.version
+            return self
+
+    def fork(self):
+        """Independent copy to extend (state is rebound, never mutated, so a shallow copy suffices)"""
+        with self._lock:
+            forked = copy.copy(self)
+        forked._lock = threading.RLock()
+        return forked
+
+    @property
+    def frame(self):
+        """All rolling rows, (protocol, date)-indexed with ROLLING_COLUMNS"""
+        with self._lock:
+            if self._frame is None:
+                if not self._chunks:
+                    index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=INDEX_NAMES)
+                    self._frame = pd.DataFrame(columns=ROLLING_COLUMNS, index=index, dtype=np.float32)
+                else:
+                    frame = pd.concat(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+                    self._chunks = [frame.sort_index()]
+                    self._frame = self._chunks[0]
+            return self._frame
+
+    def for_protocol(self, protocol):
+        """Rolling rows of one protocol as a flat frame with a 'date' column"""
+        with self._lock:
+            chunks = self._chunks
+            if protocol not in self.watermarks.index:
+                return pd.DataFrame(columns=['date'] + ROLLING_COLUMNS)
+        # Each chunk is sorted and holds later dates than the one before, so the
+        # protocol's rows are one contiguous slice per chunk, in date order
+        parts = []
+        for chunk in chunks:
+            try:
+                parts.append(chunk.iloc[chunk.index.get_loc(protocol)])
+            except KeyError:
+                continue
+        return pd.concat(parts).droplevel('protocol').reset_index()
+
+    def summary(self, protocols=None):
+        """Latest rolling values per protocol (one row each), indexed by protocol"""
+        with self._lock:
+            latest = self._latest
+        return latest if protocols is None else latest.reindex([p for p in protocols if p in latest.index])
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, window=self.window, rows=sum(len(c) for c in self._chunks),
+                        protocols=len(self.watermarks))
+
+
+_analytics = OrderedDict()
+_analytics_lock = threading.Lock()
+
+
+def get_rolling(history, window=DEFAULT_WINDOW, max_entries=8):
+    """
+    Process-wide RollingAnalytics for (`window`, `history.version`). A new
+    version starts from a fork of the newest analytics for the same window,
+    so it only processes the rows that history added.
+    """
+    key = (int(window), None if history is None else history.version)
+    with _analytics_lock:
+        analytics = _analytics.get(key)
+        if analytics is None:
+            previous = next((a for (w, _), a in reversed(_analytics.items()) if w == key[0]), None)
+            analytics = _analytics[key] = previous.fork() if previous is not None else RollingAnalytics(window)
+            while len(_analytics) > max_entries:
+                _analytics.popitem(last=False)
+        else:
+            _analytics.move_to_end(key)
+    return analytics.update(history)
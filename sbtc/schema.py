@@ -0,0 +1,85 @@
+"""
+Compact column dtypes for frames that are sent to the browser.
+
+Streamlit serializes every DataFrame it displays to Arrow. With default
+pandas dtypes that means float64 metrics, protocol names as Python strings
+(one UTF-8 value per row) and, for fetched histories, `datetime.date`
+objects that have to be converted value by value on every rerun.
+
+The compact schema is
+
+    protocol      category (Arrow dictionary: each name stored once)
+    floats        float32
+    integers      smallest signed integer type that holds the values
+    dates         datetime64[ns]
+
+all of which map onto Arrow types without a per-value conversion. The
+HistoryStore already uses it; `compact_frame` applies it to the positions
+frame and to display tables. `arrow_table` memoizes the Arrow form of a table
+under a data-version key, so unchanged tables are converted once, not once
+per rerun.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from .cache import get_lru_cache
+
+CATEGORICAL_COLUMNS = ('protocol',)
+
+
+def _is_date_column(values):
+    first = values.dropna().iloc[:1]
+    return not first.empty and isinstance(first.iloc[0], datetime.date)
+
+
+def compact_frame(frame, categorical=CATEGORICAL_COLUMNS):
+    """
+    Copy of `frame` in the compact schema. Columns that don't fit it (free text,
+    nested objects such as 'historical') are left unchanged.
+    """
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in categorical and not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        elif pd.api.types.is_float_dtype(values.dtype):
+            values = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values.dtype) and len(values):
+            values = pd.to_numeric(values, downcast='integer')
+        elif values.dtype == object and _is_date_column(values):
+            values = pd.to_datetime(values)
+        columns[column] = values
+    compact = pd.DataFrame(columns, index=frame.index)
+    compact.attrs = dict(frame.attrs)
+    return compact
+
+
+def compact_positions(positions):
+    """The positions frame in the compact schema"""
+    return compact_frame(positions)
+
+
+def to_arrow(frame, preserve_index=False):
+    """Arrow table for `frame`, as Streamlit builds it for the frontend"""
+    import pyarrow as pa
+    return pa.Table.from_pandas(frame, preserve_index=preserve_index)
+
+
+def arrow_nbytes(frame):
+    """Size in bytes of `frame` serialized as an Arrow IPC stream (the websocket payload)"""
+    import pyarrow as pa
+    table = to_arrow(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+def arrow_table(key, build, cache_size=64):
+    """
+    Arrow table of the frame `build()` returns, memoized under `key` in the
+    "arrow" LRU cache. `key` must include the versions of the data it shows.
+    """
+    return get_lru_cache("arrow", max_entries=cache_size).get(key, lambda: to_arrow(build()))
@@ -0,0 +1,105 @@
+"""
+Process-wide, read-only portfolio snapshots shared by every session.
+
+A `Snapshot` is one fully built Portfolio: validated positions plus the
+flattened HistoryStore, with a process-unique `version`. It is built once
+per data refresh, not once per rerun or per browser session, and never
+modified afterwards. sbtc.portfolio turns pandas copy-on-write on (the
+default from pandas 3.0), so a write to anything derived from a snapshot
+frame, or to the frame `filter_portfolio` hands out unfiltered, copies first
+instead of changing the shared data. Sessions can therefore share the same
+frames and only keep their selection and view parameters in
+`st.session_state`.
+
+A `SnapshotStore` holds the current snapshot. Publishing swaps a single
+reference under a writer lock; readers just read that reference, so they
+never wait for a refresh and always see a complete snapshot. The store is
+fed from the SWR cache: the cache's loader builds and publishes the next
+snapshot, on a background thread once a first snapshot exists.
+"""
+import itertools
+import threading
+import time
+
+from .portfolio import build_portfolio
+
+_versions = itertools.count(1)
+
+
+class Snapshot:
+    """An immutable Portfolio with a process-unique `version` and its build time"""
+
+    __slots__ = ('portfolio', 'version', 'built_at', 'build_seconds')
+
+    def __init__(self, portfolio, build_seconds=0.0):
+        self.portfolio = portfolio
+        self.version = next(_versions)
+        self.built_at = time.time()
+        self.build_seconds = build_seconds
+
+    def memory_usage(self):
+        """Deep memory footprint of the positions and history in bytes"""
+        positions = self.portfolio.positions
+        return int(positions.memory_usage(deep=True).sum() + self.portfolio.history.memory_usage())
+
+
+def build_snapshot(raw_df, history_path=None, history_days=30, compact=False):
+    """Validate, flatten and attach history to a fetched frame (see build_portfolio)"""
+    started = time.perf_counter()
+    portfolio = build_portfolio(raw_df, history_path, history_days, compact)
+    return Snapshot(portfolio, time.perf_counter() - started)
+
+
+class SnapshotStore:
+    """Holds the current Snapshot; publishing is an atomic reference swap"""
+
+    def __init__(self):
+        self._current = None
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    @property
+    def current(self):
+        """The latest published snapshot (None before the first publish); never blocks"""
+        return self._current
+
+    def publish(self, snapshot):
+        """Make `snapshot` current unless a newer one was published meanwhile"""
+        with self._lock:
+            if self._current is None or snapshot.version > self._current.version:
+                self._current = snapshot
+                self.swaps += 1
+            return self._current
+
+    def get(self, cache, key, loader):
+        """
+        Current snapshot for `key` in the SWR `cache`, building and publishing
+        `loader()`'s snapshot on a miss or (in the background) when stale.
+        """
+        return cache.get(key, lambda: self.publish(loader()))
+
+    def stats(self):
+        snapshot = self._current
+        if snapshot is None:
+            return {"version": None, "swaps": self.swaps}
+        return {
+            "version": snapshot.version,
+            "swaps": self.swaps,
+            "age_s": round(time.time() - snapshot.built_at, 1),
+            "build_ms": round(snapshot.build_seconds * 1000, 1),
+            "memory_bytes": snapshot.memory_usage(),
+            "source": snapshot.portfolio.source,
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_snapshot_store(name="portfolio"):
+    """Process-wide SnapshotStore called `name`, created on first use"""
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = _stores[name] = SnapshotStore()
+        return store
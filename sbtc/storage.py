@@ -0,0 +1,224 @@
+"""
+Persistent, append-only Parquet store for per-protocol history.
+
+Layout of a store directory:
+
+    history/
+        _meta.json            generation counter, next part number, per-protocol watermarks
+        part-000001.parquet   one file per append, sorted by (protocol, date)
+        part-000002.parquet
+        ...
+
+Appends only write days newer than each protocol's watermark, reads push the
+protocol/date filter and column projection down to Parquet so only the
+requested slices are touched, and `compact()` rewrites all parts as a single
+sorted, de-duplicated file. The store is safe to share between threads of one
+process; it does not coordinate writers across processes.
+"""
+import json
+import os
+import threading
+
+import pandas as pd
+
+from .history import HISTORY_METRICS, HistoryStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = ds = pq = None
+
+META_FILE = "_meta.json"
+
+
+def _protocol_type():
+    # One fixed dictionary index width for every part: pandas picks the
+    # smallest that fits each frame, and parts of different widths can't be
+    # scanned together
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+class ParquetHistoryStore:
+    """
+    Directory of Parquet parts holding (protocol, date, metrics...) rows.
+
+    `auto_compact_parts` triggers compaction once that many parts exist
+    (None disables it).
+    """
+
+    def __init__(self, path, auto_compact_parts=32):
+        if pa is None:
+            raise ImportError("ParquetHistoryStore requires pyarrow (pip install pyarrow)")
+        self.path = os.fspath(path)
+        self.auto_compact_parts = auto_compact_parts
+        self._lock = threading.RLock()
+        self._loaded = {}
+        os.makedirs(self.path, exist_ok=True)
+        self._meta = self._read_meta()
+
+    # --- metadata ---------------------------------------------------------
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "next_part": 1, "watermarks": {}}
+
+    def _write_meta(self):
+        target = os.path.join(self.path, META_FILE)
+        tmp = target + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._meta, f, indent=2, sort_keys=True)
+        os.replace(tmp, target)
+
+    @property
+    def generation(self):
+        """Bumped on every append/compaction; part of the in-memory cache key"""
+        return self._meta["generation"]
+
+    def watermarks(self):
+        """Last stored timestamp per protocol"""
+        return {p: pd.Timestamp(ts) for p, ts in self._meta["watermarks"].items()}
+
+    def covers(self, protocols, until):
+        """True when every protocol already has data up to (and including) `until`"""
+        watermarks = self.watermarks()
+        until = pd.Timestamp(until)
+        return all(p in watermarks and watermarks[p] >= until for p in protocols)
+
+    def parts(self):
+        return sorted(f for f in os.listdir(self.path) if f.startswith("part-") and f.endswith(".parquet"))
+
+    # --- writes -----------------------------------------------------------
+
+    @staticmethod
+    def _to_table(frame):
+        table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+        # Keep the dictionary encoding for protocol at a fixed index width; store dates at a fixed unit
+        table = table.set_column(table.schema.get_field_index('protocol'), 'protocol',
+                                 table.column('protocol').cast(_protocol_type()))
+        return table.set_column(table.schema.get_field_index('date'), 'date',
+                                table.column('date').cast(pa.timestamp('ns')))
+
+    def append(self, history):
+        """
+        Append the rows of `history` (a HistoryStore) that are newer than the
+        stored watermark of their protocol. Returns the number of rows written.
+        """
+        with self._lock:
+            frame = history.frame
+            if frame.empty:
+                return 0
+            protocols = frame.index.get_level_values('protocol')
+            dates = frame.index.get_level_values('date')
+            watermarks = self.watermarks()
+            cutoff = pd.DatetimeIndex(
+                protocols.map(lambda p: watermarks.get(p, pd.Timestamp.min)).astype('datetime64[ns]')
+            )
+            new_rows = frame[dates > cutoff]
+            if new_rows.empty:
+                return 0
+
+            name = f"part-{self._meta['next_part']:06d}.parquet"
+            pq.write_table(self._to_table(new_rows), os.path.join(self.path, name))
+            last = new_rows.reset_index().groupby('protocol', observed=True)['date'].max()
+            for protocol, ts in last.items():
+                self._meta["watermarks"][str(protocol)] = ts.isoformat()
+            self._meta["next_part"] += 1
+            self._meta["generation"] += 1
+            self._write_meta()
+
+            if self.auto_compact_parts and len(self.parts()) >= self.auto_compact_parts:
+                self.compact()
+            return len(new_rows)
+
+    def compact(self):
+        """Rewrite all parts as one sorted file, keeping the last copy of duplicate rows"""
+        with self._lock:
+            parts = self.parts()
+            if len(parts) <= 1:
+                return
+            frame = self.read().frame
+            frame = frame[~frame.index.duplicated(keep='last')]
+            name = f"part-{self._meta['next_part']:06d}.parquet"
+            tmp = os.path.join(self.path, "." + name)
+            pq.write_table(self._to_table(frame), tmp)
+            os.replace(tmp, os.path.join(self.path, name))
+            for part in parts:
+                os.remove(os.path.join(self.path, part))
+            self._meta["next_part"] += 1
+            self._meta["generation"] += 1
+            self._write_meta()
+
+    # --- reads ------------------------------------------------------------
+
+    def read(self, protocols=None, start=None, end=None, columns=None):
+        """
+        Range read: only the requested protocols, inclusive date range and
+        metric columns are decoded. Returns a HistoryStore. The scan holds the
+        store lock, so compact() can't remove the parts underneath it.
+        """
+        with self._lock:
+            return self._read(protocols, start, end, list(HISTORY_METRICS if columns is None else columns))
+
+    def _read(self, protocols, start, end, columns):
+        parts = [os.path.join(self.path, p) for p in self.parts()]
+        if not parts:
+            return HistoryStore.empty_store()
+
+        # Scan every part with one schema; parts written before the protocol
+        # index width was fixed are cast to it
+        schema = ds.dataset(parts[-1:], format="parquet").schema
+        schema = schema.set(schema.get_field_index('protocol'), pa.field('protocol', _protocol_type()))
+        dataset = ds.dataset(parts, schema=schema, format="parquet")
+        names = set(dataset.schema.names)
+        columns = [c for c in columns if c in names]
+        condition = None
+        if protocols is not None:
+            condition = ds.field('protocol').isin([str(p) for p in protocols])
+        for bound, op in ((start, 'ge'), (end, 'le')):
+            if bound is None:
+                continue
+            scalar = pa.scalar(pd.Timestamp(bound).as_unit('ns'), type=pa.timestamp('ns'))
+            clause = ds.field('date') >= scalar if op == 'ge' else ds.field('date') <= scalar
+            condition = clause if condition is None else condition & clause
+        table = dataset.to_table(columns=['protocol', 'date'] + columns, filter=condition)
+        frame = table.to_pandas()
+        if frame.empty:
+            return HistoryStore(pd.DataFrame(columns=['protocol', 'date'] + columns))
+        return HistoryStore(frame)
+
+    def load(self, start=None, end=None, protocols=None):
+        """
+        Like read(), but memoized until the next append/compaction so every
+        rerun gets the same HistoryStore object (and version) back.
+        """
+        key = (
+            self.generation,
+            None if start is None else pd.Timestamp(start),
+            None if end is None else pd.Timestamp(end),
+            None if protocols is None else tuple(sorted(protocols)),
+        )
+        with self._lock:
+            cached = self._loaded.get(key)
+            if cached is None:
+                self._loaded = {key: self.read(protocols, start, end)}
+                cached = self._loaded[key]
+            return cached
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_history_store(path, **options):
+    """Process-wide ParquetHistoryStore for `path` (opened lazily on first use)"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ParquetHistoryStore(path, **options)
+        return store
@@ -0,0 +1,309 @@
+"""
+Streaming APY/TVL ingestion into fixed-size per-protocol ring buffers.
+
+A feed yields protocol updates (`{"protocol", "apy", "tvl", "ts"}`) and a
+`StreamIngestor` drains it on a daemon thread into a `StreamHub`. The hub
+keeps one preallocated NumPy ring buffer per protocol, so memory is fixed by
+`capacity` x protocols no matter how long the process has been up; the oldest
+points are overwritten once a buffer is full.
+
+Two feeds ship with the core:
+
+- `SimulatedFeed`: a seeded, mean-reverting random walk around each
+  protocol's typical APY, for demos and load tests.
+- `SSEFeed`: a Server-Sent Events endpoint read with `requests`, one JSON
+  update (or a list of updates) per `data:` event, reconnecting with backoff.
+  The stub server exposes one at `/stream`.
+
+`get_stream` keeps one ingestor (one thread, one connection) per source;
+readers only ever take short locks to copy the protocols' arrays they plot.
+"""
+import json
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from .synthetic import DEFAULT_PARAMS, DEFAULT_SEED, params_for
+
+STREAM_FIELDS = ('apy', 'tvl')
+DEFAULT_CAPACITY = 3600
+DEFAULT_TVL = 10000.0
+
+
+class RingBuffer:
+    """Last `capacity` (timestamp, apy, tvl) points of one protocol"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = int(capacity)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros((self.capacity, len(STREAM_FIELDS)), dtype=np.float32)
+        self._next = 0
+        self.count = 0
+
+    def append(self, ts, values):
+        self.times[self._next] = ts
+        self.values[self._next] = values
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def arrays(self):
+        """(times, values) copies in chronological order"""
+        if self.count < self.capacity:
+            return self.times[:self.count].copy(), self.values[:self.count].copy()
+        order = np.r_[self._next:self.capacity, 0:self._next]
+        return self.times[order], self.values[order]
+
+    def last(self, n=1):
+        """Up to the `n` newest points, oldest first"""
+        n = min(n, self.count)
+        idx = (self._next - n + np.arange(n)) % self.capacity
+        return self.times[idx], self.values[idx]
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes
+
+
+class StreamHub:
+    """Thread-safe set of per-protocol ring buffers; `version` bumps on every update"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = int(capacity)
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.updates = 0
+        self.last_update = None
+
+    def publish(self, protocol, apy, tvl, ts=None):
+        ts = time.time() if ts is None else float(ts)
+        with self._lock:
+            buffer = self._buffers.get(protocol)
+            if buffer is None:
+                buffer = self._buffers[protocol] = RingBuffer(self.capacity)
+            buffer.append(ts, (apy, tvl))
+            self.version += 1
+            self.updates += 1
+            self.last_update = ts
+
+    @property
+    def protocols(self):
+        with self._lock:
+            return sorted(self._buffers)
+
+    def latest(self, protocols=None):
+        """
+        Newest apy/tvl per protocol with the change since the previous point,
+        indexed by protocol.
+        """
+        rows = []
+        with self._lock:
+            for protocol in sorted(self._buffers if protocols is None else protocols):
+                buffer = self._buffers.get(protocol)
+                if buffer is None or not buffer.count:
+                    continue
+                times, values = buffer.last(2)
+                change = values[-1] - values[0] if len(values) > 1 else np.zeros(len(STREAM_FIELDS), np.float32)
+                rows.append((protocol, times[-1], *values[-1], *change))
+        columns = ['protocol', 'ts', *STREAM_FIELDS, *(f + '_change' for f in STREAM_FIELDS)]
+        frame = pd.DataFrame(rows, columns=columns).set_index('protocol')
+        frame['ts'] = pd.to_datetime(frame['ts'], unit='s')
+        return frame
+
+    def series(self, protocols=None):
+        """Long frame (time, protocol, apy, tvl) of everything buffered for `protocols`"""
+        frames = []
+        with self._lock:
+            snapshot = {p: b.arrays() for p, b in self._buffers.items() if protocols is None or p in protocols}
+        for protocol in sorted(snapshot):
+            times, values = snapshot[protocol]
+            frame = pd.DataFrame(values, columns=list(STREAM_FIELDS))
+            frame.insert(0, 'protocol', protocol)
+            frame.insert(0, 'time', pd.to_datetime(times, unit='s'))
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['time', 'protocol', *STREAM_FIELDS])
+        return pd.concat(frames, ignore_index=True)
+
+    def memory_usage(self):
+        """Bytes held by the ring buffers (constant once every protocol has been seen)"""
+        with self._lock:
+            return sum(b.nbytes for b in self._buffers.values())
+
+
+class SimulatedFeed:
+    """
+    Seeded local feed: every `interval` seconds each protocol's APY takes a
+    mean-reverting step around its typical value and TVL a small
+    multiplicative one. `start` optionally maps protocol -> {'apy', 'tvl'}.
+    """
+
+    def __init__(self, protocols=None, interval=1.0, seed=DEFAULT_SEED, start=None, reversion=0.1):
+        start = start or {}
+        self.protocols = list(dict.fromkeys(protocols or start or DEFAULT_PARAMS.index))
+        self.interval = float(interval)
+        self.reversion = float(reversion)
+        params = params_for(self.protocols)
+        self._mean = params['apy_mean'].to_numpy(np.float64)
+        self._vol = params['apy_vol'].to_numpy(np.float64) * 0.1
+        self._low = params['apy_min'].to_numpy(np.float64)
+        self._high = params['apy_max'].to_numpy(np.float64)
+        self._apy = np.array([start.get(p, {}).get('apy', m) for p, m in zip(self.protocols, self._mean)])
+        self._tvl = np.array([start.get(p, {}).get('tvl', DEFAULT_TVL) for p in self.protocols], dtype=np.float64)
+        self._rng = np.random.default_rng(seed)
+
+    def step(self, ts=None):
+        """Advance every protocol by one tick and return the updates"""
+        ts = time.time() if ts is None else ts
+        shocks = self._rng.standard_normal((2, len(self.protocols)))
+        self._apy += self.reversion * (self._mean - self._apy) + self._vol * shocks[0]
+        np.clip(self._apy, self._low, self._high, out=self._apy)
+        self._tvl *= np.exp(0.002 * shocks[1])
+        return [
+            {'protocol': p, 'apy': float(a), 'tvl': float(t), 'ts': ts}
+            for p, a, t in zip(self.protocols, self._apy, self._tvl)
+        ]
+
+    def updates(self, stop):
+        while not stop.is_set():
+            yield from self.step()
+            stop.wait(self.interval)
+
+
+class SSEFeed:
+    """
+    Server-Sent Events client. Each event's `data:` lines hold one update or a
+    JSON list of updates; comments and other fields are ignored. Dropped
+    connections are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, url, timeout=(3.05, 30.0), backoff=0.5, max_backoff=30.0, headers=None, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.headers = dict({'Accept': 'text/event-stream'}, **(headers or {}))
+        self.session = session or requests.Session()
+        self.errors = 0
+        self.last_error = None
+
+    def _events(self, response):
+        data = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+            elif line.startswith('data:'):
+                data.append(line[5:].lstrip())
+
+    def updates(self, stop):
+        delay = self.backoff
+        while not stop.is_set():
+            try:
+                with self.session.get(self.url, stream=True, timeout=self.timeout, headers=self.headers) as response:
+                    response.raise_for_status()
+                    delay = self.backoff
+                    for event in self._events(response):
+                        payload = json.loads(event)
+                        yield from (payload if isinstance(payload, list) else [payload])
+                        if stop.is_set():
+                            return
+            except (requests.RequestException, ValueError) as e:
+                self.errors += 1
+                self.last_error = str(e)
+            stop.wait(random.uniform(0, delay))
+            delay = min(self.max_backoff, delay * 2)
+
+
+class StreamIngestor:
+    """Drain a feed into a StreamHub on a daemon thread"""
+
+    def __init__(self, feed, hub=None, capacity=DEFAULT_CAPACITY):
+        self.feed = feed
+        self.hub = hub if hub is not None else StreamHub(capacity)
+        self.errors = 0
+        self.last_error = None
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        for update in self.feed.updates(self._stop):
+            try:
+                self.hub.publish(update['protocol'], float(update['apy']), float(update['tvl']), update.get('ts'))
+            except (KeyError, TypeError, ValueError) as e:
+                self.errors += 1
+                self.last_error = f"bad update {update!r}: {e}"
+            if self._stop.is_set():
+                break
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.running:
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="stream-ingest", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        feed_errors = getattr(self.feed, 'errors', 0)
+        return {
+            'running': self.running,
+            'updates': self.hub.updates,
+            'protocols': len(self.hub.protocols),
+            'errors': self.errors + feed_errors,
+            'last_error': self.last_error or getattr(self.feed, 'last_error', None),
+            'last_update': self.hub.last_update,
+            'buffer_bytes': self.hub.memory_usage(),
+        }
+
+
+def make_feed(source, protocols=None, interval=1.0, start=None):
+    """'simulated' for the local feed, otherwise an SSE endpoint URL"""
+    if source == 'simulated':
+        return SimulatedFeed(protocols, interval=interval, start=start)
+    if source.startswith(('http://', 'https://')):
+        return SSEFeed(source)
+    raise ValueError(f"Unknown stream source {source!r}; use 'simulated' or an http(s) SSE URL")
+
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def get_stream(source, protocols=None, capacity=DEFAULT_CAPACITY, interval=1.0):
+    """
+    Return the process-wide, already started ingestor for `source`. There is
+    one per (source, capacity, interval); readers pick their protocols from
+    the hub. A simulated feed that doesn't yet cover `protocols` is replaced
+    by one over the union, continuing from the latest points into the same
+    hub, and the old ingestor is stopped.
+    """
+    key = (source, int(capacity), float(interval))
+    with _streams_lock:
+        stream = _streams.get(key)
+        if stream is None:
+            stream = _streams[key] = StreamIngestor(make_feed(source, protocols, interval), capacity=capacity)
+        elif isinstance(stream.feed, SimulatedFeed) and not set(protocols or ()) <= set(stream.feed.protocols):
+            stream.stop(timeout=5.0)
+            latest = stream.hub.latest()
+            start = {p: {'apy': row.apy, 'tvl': row.tvl} for p, row in latest.iterrows()}
+            feed = make_feed(source, sorted(set(stream.feed.protocols) | set(protocols)), interval, start=start)
+            stream = _streams[key] = StreamIngestor(feed, hub=stream.hub)
+        return stream.start()
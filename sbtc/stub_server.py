@@ -0,0 +1,269 @@
+"""
+Local stub of the protocol positions API.
+
+Serves `GET /positions/<protocol>` with JSON shaped like the live API so the
+fetcher (and the dashboard, via `REBAR_API_URL`) can be exercised without
+network access. Per-protocol delays and failure modes make it easy to check
+timeouts, retries and partial results:
+
+    python -m sbtc.stub_server --port 8600 --delay Bitflow=2.5 --fail Arkadiko=503
+
+`GET /stream` is a Server-Sent Events feed of simulated APY/TVL updates for
+the served protocols (one JSON list per event), for `STREAM_SOURCE`.
+
+It also mocks the node/indexer API used by sbtc.indexer (`NODE_API_URL`):
+`GET /v2/info` reports the chain tip and
+`GET /extended/v1/address/<address>/sbtc-events?from_height=&to_height=&limit=&offset=`
+pages through a deterministic, per-address stream of deposit/withdraw/reward
+events. `advance(blocks)` moves the tip forward so new events appear.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .streaming import SimulatedFeed
+
+DEFAULT_POSITIONS = {
+    'ALEX': {'sbtc_balance': 1.2, 'apy': 4.5, 'yield_earned': 0.05, 'tvl': 10000, 'risk_score': 2},
+    'Bitflow': {'sbtc_balance': 0.8, 'apy': 3.9, 'yield_earned': 0.03, 'tvl': 8000, 'risk_score': 3},
+    'Arkadiko': {'sbtc_balance': 1.0, 'apy': 5.2, 'yield_earned': 0.06, 'tvl': 12000, 'risk_score': 2},
+}
+
+
+# Mock chain: events start at STUB_START_HEIGHT, one block every 10 minutes
+STUB_START_HEIGHT = 150_000
+STUB_BLOCK_SECONDS = 600
+STUB_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+MAX_PAGE_SIZE = 200
+
+
+def _address_events(address, protocols, tip_height):
+    """
+    Deterministic sBTC events of `address` up to `tip_height`. The walk is
+    seeded by the address, so a higher tip only appends events.
+    """
+    rng = random.Random(zlib.crc32(address.encode()))
+    balances = dict.fromkeys(protocols, 0.0)
+    events = []
+    height = STUB_START_HEIGHT
+    while True:
+        height += rng.randint(5, 40)
+        if height > tip_height:
+            return events
+        protocol = rng.choice(protocols)
+        kind = rng.choices(('deposit', 'withdraw', 'reward'), weights=(5, 2, 3))[0]
+        if kind == 'deposit' or balances[protocol] <= 0:
+            kind, amount = 'deposit', round(rng.uniform(0.01, 0.5), 8)
+        elif kind == 'withdraw':
+            amount = round(rng.uniform(0.1, 0.6) * balances[protocol], 8)
+        else:
+            amount = round(balances[protocol] * rng.uniform(0.0005, 0.004), 8)
+        balances[protocol] += -amount if kind == 'withdraw' else amount
+        events.append({
+            'block_height': height,
+            'tx_id': f"0x{zlib.crc32(f'{address}:{height}'.encode()):08x}{len(events):056x}",
+            'event_index': 0,
+            'protocol': protocol,
+            'kind': kind,
+            'amount': amount,
+            'timestamp': (STUB_EPOCH + timedelta(seconds=(height - STUB_START_HEIGHT) * STUB_BLOCK_SECONDS)).isoformat(),
+        })
+
+
+def _flat_history(position, days=30):
+    today = date.today()
+    return [
+        {
+            'date': (today - timedelta(days=days - 1 - i)).isoformat(),
+            'sbtc_balance': position['sbtc_balance'],
+            'apy': position['apy'],
+            'yield_earned': position['sbtc_balance'] * position['apy'] / 365,
+        }
+        for i in range(days)
+    ]
+
+
+class StubProtocolServer:
+    """
+    Threaded HTTP server on 127.0.0.1 serving canned protocol positions.
+
+    `delays` maps protocol -> seconds to sleep before answering, `failures`
+    maps protocol -> HTTP status to return instead of data (or a list of
+    statuses consumed one per request, to simulate transient errors); the
+    key 'node' applies to the node API's event pages.
+    `stream_interval` is the seconds between `/stream` events and
+    `tip_height` the mock chain tip served to the indexer.
+    """
+
+    def __init__(self, positions=None, delays=None, failures=None, port=0, history_days=30,
+                 stream_interval=1.0, tip_height=STUB_START_HEIGHT + 2000):
+        self.positions = dict(DEFAULT_POSITIONS if positions is None else positions)
+        self.delays = dict(delays or {})
+        self.failures = {k: (list(v) if isinstance(v, (list, tuple)) else v) for k, v in (failures or {}).items()}
+        self.history_days = history_days
+        self.stream_interval = float(stream_interval)
+        self.tip_height = int(tip_height)
+        self.requests = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def advance(self, blocks=1):
+        """Move the mock chain tip forward by `blocks`"""
+        with self._lock:
+            self.tip_height += int(blocks)
+            return self.tip_height
+
+    def _next_failure(self, protocol):
+        with self._lock:
+            failure = self.failures.get(protocol)
+            if isinstance(failure, list):
+                return failure.pop(0) if failure else None
+            return failure
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self):
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                feed = SimulatedFeed(list(server.positions), interval=server.stream_interval, start=server.positions)
+                try:
+                    while not server._stopping.is_set():
+                        self.wfile.write(f"data: {json.dumps(feed.step())}\n\n".encode())
+                        self.wfile.flush()
+                        server._stopping.wait(server.stream_interval)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_events(self, address, query):
+                def arg(name, default):
+                    return int(query.get(name, [default])[0])
+
+                to_height = min(arg('to_height', server.tip_height), server.tip_height)
+                from_height = arg('from_height', 0)
+                limit = min(arg('limit', 50), MAX_PAGE_SIZE)
+                offset = arg('offset', 0)
+                events = [e for e in _address_events(address, sorted(server.positions), to_height)
+                          if e['block_height'] > from_height]
+                self._send_json(200, {'limit': limit, 'offset': offset, 'total': len(events),
+                                      'tip_height': server.tip_height, 'results': events[offset:offset + limit]})
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                parts = url.path.strip("/").split("/")
+                with server._lock:
+                    server.requests.append(self.path)
+                if parts == ["stream"]:
+                    self._send_stream()
+                    return
+                if parts == ["v2", "info"]:
+                    self._send_json(200, {'stacks_tip_height': server.tip_height})
+                    return
+                if len(parts) == 5 and parts[:3] == ["extended", "v1", "address"] and parts[4] == "sbtc-events":
+                    failure = server._next_failure('node')
+                    if failure:
+                        self._send_json(int(failure), {"error": f"simulated {failure}"})
+                        return
+                    self._send_events(parts[3], parse_qs(url.query))
+                    return
+                if len(parts) != 2 or parts[0] != "positions" or parts[1] not in server.positions:
+                    self._send_json(404, {"error": "not found"})
+                    return
+                protocol = parts[1]
+                time.sleep(server.delays.get(protocol, 0))
+                failure = server._next_failure(protocol)
+                if failure:
+                    self._send_json(int(failure), {"error": f"simulated {failure}"})
+                    return
+                position = dict(server.positions[protocol], protocol=protocol)
+                position['historical'] = _flat_history(position, server.history_days)
+                self._send_json(200, position)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-protocol-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _parse_pairs(values, cast):
+    pairs = {}
+    for value in values or []:
+        key, _, raw = value.partition("=")
+        pairs[key] = cast(raw)
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve stub sBTC protocol positions for local testing.")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--delay", action="append", metavar="PROTOCOL=SECONDS", help="slow down one protocol")
+    parser.add_argument("--fail", action="append", metavar="PROTOCOL=STATUS", help="make one protocol fail")
+    parser.add_argument("--stream-interval", type=float, default=1.0, help="seconds between /stream events")
+    parser.add_argument("--tip-height", type=int, default=STUB_START_HEIGHT + 2000, help="initial mock chain tip")
+    parser.add_argument("--block-interval", type=float, default=0.0,
+                        help="seconds between mock blocks (0 keeps the tip fixed)")
+    args = parser.parse_args(argv)
+
+    server = StubProtocolServer(delays=_parse_pairs(args.delay, float), failures=_parse_pairs(args.fail, int),
+                                port=args.port, stream_interval=args.stream_interval, tip_height=args.tip_height)
+    if args.block_interval > 0:
+        def mine():
+            while not server._stopping.wait(args.block_interval):
+                server.advance()
+        threading.Thread(target=mine, name="stub-node-blocks", daemon=True).start()
+    print(f"Stub protocol API listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Vectorized, seeded generator for synthetic portfolio history.
+
+All protocols x steps are drawn in one NumPy call from a parameter table, so
+the same seed always yields the same charts and large load-test datasets are
+cheap to produce. Peak memory is predictable: roughly N x M x 5 float32
+values (two shock matrices plus the three output metrics) plus the index,
+where N is the number of protocols and M = days x steps_per_day.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from .history import HistoryStore
+
+DEFAULT_SEED = 25
+
+PARAM_COLUMNS = ['base_min', 'base_max', 'drift', 'volatility', 'apy_mean', 'apy_vol', 'apy_min', 'apy_max']
+
+# Daily balance drift/volatility and APY bounds for the protocols the dashboard ships with
+DEFAULT_PARAMS = pd.DataFrame(
+    [
+        ('ALEX', 0.5, 2.0, 0.020, 0.05, 4.2, 0.5, 3.0, 6.0),
+        ('Bitflow', 0.5, 2.0, 0.015, 0.03, 3.8, 0.3, 3.0, 5.0),
+        ('Arkadiko', 0.5, 2.0, 0.025, 0.04, 5.1, 0.4, 4.0, 6.5),
+    ],
+    columns=['protocol'] + PARAM_COLUMNS,
+).set_index('protocol')
+
+# Protocols without their own row use these parameters
+FALLBACK_PROTOCOL = 'Arkadiko'
+
+
+def params_for(protocols):
+    """Parameter table for `protocols` (deduplicated), using the fallback row for unknown names"""
+    rows = DEFAULT_PARAMS.reindex(list(dict.fromkeys(protocols)))
+    missing = rows['drift'].isna()
+    if missing.any():
+        rows.loc[missing, PARAM_COLUMNS] = DEFAULT_PARAMS.loc[FALLBACK_PROTOCOL, PARAM_COLUMNS].to_numpy()
+    return rows
+
+
+def random_params(n, seed=DEFAULT_SEED, prefix="Pool"):
+    """Plausible parameters for `n` synthetic pools (for load tests and benchmarks)"""
+    rng = np.random.default_rng(seed)
+    apy_mean = rng.uniform(1.0, 12.0, n)
+    apy_vol = rng.uniform(0.1, 0.8, n)
+    width = len(str(n))
+    return pd.DataFrame(
+        {
+            'base_min': rng.uniform(0.1, 1.0, n),
+            'base_max': rng.uniform(1.0, 5.0, n),
+            'drift': rng.uniform(-0.01, 0.03, n),
+            'volatility': rng.uniform(0.01, 0.08, n),
+            'apy_mean': apy_mean,
+            'apy_vol': apy_vol,
+            'apy_min': np.maximum(apy_mean - 3 * apy_vol, 0.0),
+            'apy_max': apy_mean + 3 * apy_vol,
+        },
+        index=pd.Index([f"{prefix}-{i:0{width}d}" for i in range(n)], name='protocol'),
+    )
+
+
+def generate_history(params, days=30, steps_per_day=1, end=None, seed=DEFAULT_SEED):
+    """
+    Generate N protocols x (days * steps_per_day) points of history in one pass.
+
+    `params` is a protocol-indexed table with PARAM_COLUMNS. Drift and volatility
+    are per day and are rescaled for intraday steps. Returns a HistoryStore whose
+    last point falls on `end` (default: today at midnight).
+    """
+    params = params.sort_index()
+    n, steps = len(params), int(days) * int(steps_per_day)
+    rng = np.random.default_rng(seed)
+    p = {c: params[c].to_numpy(np.float32)[:, None] for c in PARAM_COLUMNS}
+
+    base = rng.uniform(params['base_min'], params['base_max']).astype(np.float32)[:, None]
+    shocks = rng.standard_normal((2, n, steps), dtype=np.float32)
+
+    balance = shocks[0]
+    balance *= p['volatility'] / np.float32(np.sqrt(steps_per_day))
+    balance += p['drift'] / np.float32(steps_per_day)
+    np.cumsum(balance, axis=1, out=balance)
+    balance += base
+    np.abs(balance, out=balance)
+
+    apy = shocks[1]
+    apy *= p['apy_vol']
+    apy += p['apy_mean']
+    np.clip(apy, p['apy_min'], p['apy_max'], out=apy)
+
+    yield_earned = balance * apy
+    yield_earned /= np.float32(365 * steps_per_day)
+
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    dates = pd.date_range(end=end, periods=steps, freq=pd.Timedelta(days=1) / steps_per_day, name='date')
+    index = pd.MultiIndex(
+        levels=[pd.CategoricalIndex(params.index, categories=params.index, name='protocol'), dates],
+        codes=[np.repeat(np.arange(n), steps), np.tile(np.arange(steps), n)],
+        names=['protocol', 'date'],
+        verify_integrity=False,
+    )
+    frame = pd.DataFrame(
+        {'sbtc_balance': balance.ravel(), 'apy': apy.ravel(), 'yield_earned': yield_earned.ravel()},
+        index=index,
+        copy=False,
+    )
+    return HistoryStore(frame)
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_history(protocols, days, steps_per_day, end, seed):
+    return generate_history(params_for(list(protocols)), days, steps_per_day, end, seed)
+
+
+def mock_history(protocols, days=30, steps_per_day=1, seed=DEFAULT_SEED):
+    """
+    Seeded mock history for `protocols`, memoized per process and per day.
+
+    Reruns (and other sessions) get the identical HistoryStore object back, so
+    charts stop jittering and downstream caches keyed on its version stay warm.
+    """
+    end = pd.Timestamp.today().normalize()
+    return _cached_history(tuple(sorted(set(protocols))), int(days), int(steps_per_day), end, seed)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sbtc.aggregates import PortfolioAggregates, grouped_overview, risk_level
+
+
+@pytest.fixture
+def positions():
+    return pd.DataFrame({
+        'protocol': ['ALEX', 'Bitflow', 'Arkadiko'],
+        'sbtc_balance': [1.0, np.nan, 2.0],
+        'apy': [4.0, 3.0, np.nan],
+        'yield_earned': [0.1, np.nan, 0.2],
+        'risk_score': [1.0, 2.0, np.nan],
+    })
+
+
+def test_partial_nan_is_skipped_like_pandas(positions):
+    summary = PortfolioAggregates(positions).summary()
+    assert summary['total_sbtc'] == pytest.approx(positions['sbtc_balance'].sum())
+    assert summary['avg_apy'] == pytest.approx((positions['sbtc_balance'] * positions['apy']).sum()
+                                               / positions['sbtc_balance'].sum())
+    assert summary['total_yield_30d'] == pytest.approx(positions['yield_earned'].sum())
+    assert summary['avg_risk_score'] == pytest.approx(positions['risk_score'].mean())
+    assert risk_level(summary['avg_risk_score'])[0] == "Low"
+
+
+def test_summary_matches_grouped_overview(positions):
+    summary = PortfolioAggregates(positions).summary()
+    grouped = grouped_overview(positions.assign(group=0), 'group').iloc[0]
+    for field in ('total_sbtc', 'avg_apy', 'total_yield_30d', 'avg_risk_score', 'num_protocols'):
+        assert summary[field] == pytest.approx(grouped[field])
+
+
+def test_update_skips_nan(positions):
+    aggregates = PortfolioAggregates(positions)
+    aggregates.update('ALEX', np.nan, 4.0, np.nan, np.nan)
+    summary = aggregates.summary()
+    assert summary['total_sbtc'] == pytest.approx(2.0)
+    assert summary['total_yield_30d'] == pytest.approx(0.2)
+    assert risk_level(float('nan'))[0] == "N/A"
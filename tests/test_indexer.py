@@ -0,0 +1,45 @@
+import pytest
+
+from sbtc.indexer import AddressIndex, AddressIndexer, IncompleteSyncError
+from sbtc.stub_server import MAX_PAGE_SIZE, STUB_START_HEIGHT, StubProtocolServer, _address_events
+
+ADDRESS = "SP2C2YFP12AJZB4MABJBAJ55XECVS7E4PMMZ89YZR"
+TIP = STUB_START_HEIGHT + 20_000
+
+
+class DroppingIndexer(AddressIndexer):
+    """Loses every page after the first, like a node that truncates results"""
+
+    def _page(self, address, from_height, to_height, offset):
+        page = super()._page(address, from_height, to_height, offset)
+        return dict(page, results=page['results'] if offset == 0 else [])
+
+
+@pytest.fixture
+def server():
+    with StubProtocolServer(tip_height=TIP) as server:
+        yield server
+
+
+def test_sync_steps_by_the_page_size_the_server_returns(server):
+    total = len(_address_events(ADDRESS, sorted(server.positions), TIP))
+    assert total > 2 * MAX_PAGE_SIZE
+    indexer = AddressIndexer(server.url, AddressIndex(":memory:"), page_size=MAX_PAGE_SIZE + 300)
+    try:
+        result = indexer.sync(ADDRESS)
+        assert result.new_events == total
+        assert len(indexer.index.events(ADDRESS, limit=total + 1)) == total
+        assert indexer.index.checkpoint(ADDRESS) == TIP
+    finally:
+        indexer.close()
+
+
+def test_incomplete_sync_is_not_committed(server):
+    indexer = DroppingIndexer(server.url, AddressIndex(":memory:"), page_size=MAX_PAGE_SIZE)
+    try:
+        with pytest.raises(IncompleteSyncError):
+            indexer.sync(ADDRESS)
+        assert indexer.index.checkpoint(ADDRESS) is None
+        assert indexer.index.events(ADDRESS).empty
+    finally:
+        indexer.close()
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from sbtc.insights import build_insights
+
+
+def _positions(balances):
+    return pd.DataFrame({
+        'protocol': list(balances),
+        'sbtc_balance': list(balances.values()),
+        'apy': [5.0] * len(balances),
+        'risk_score': [2.0] * len(balances),
+    })
+
+
+def _diversify(positions):
+    insights = build_insights(positions, limit=10)
+    return [r for r in insights.recommendations if r.kind == 'diversify']
+
+
+def test_even_split_is_not_told_to_diversify():
+    assert not _diversify(_positions({'ALEX': 1.0, 'Bitflow': 1.0}))
+    assert not _diversify(_positions({'ALEX': 1.0, 'Bitflow': 1.2}))
+
+
+def test_concentrated_portfolios_are_told_to_diversify():
+    assert _diversify(_positions({'ALEX': 3.0, 'Bitflow': 1.0}))[0].protocol == 'ALEX'
+    assert _diversify(_positions({'ALEX': 1.0}))[0].protocol == 'ALEX'
+    assert _diversify(_positions({'ALEX': 2.0, 'Bitflow': 1.0, 'Zest': 1.0, 'Velar': 0.5}))
@@ -0,0 +1,19 @@
+from sbtc.storage import ParquetHistoryStore
+from sbtc.synthetic import generate_history, random_params
+
+
+def test_parts_of_different_protocol_widths(tmp_path):
+    store = ParquetHistoryStore(tmp_path, auto_compact_parts=None)
+    small, large = generate_history(random_params(3), 5), generate_history(random_params(200), 5)
+    store.append(small)
+    store.append(large)
+    assert len(store.parts()) == 2
+
+    history = store.read()
+    assert history.protocols == sorted(small.protocols + large.protocols)
+    assert len(history) == len(small) + len(large)
+    assert len(store.read(protocols=large.protocols[150:151])) == 5
+
+    store.compact()
+    assert len(store.parts()) == 1
+    assert len(store.read()) == len(history)
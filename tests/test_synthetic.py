@@ -0,0 +1,13 @@
+import pandas as pd
+
+from sbtc.streaming import SimulatedFeed
+from sbtc.synthetic import mock_history, params_for
+
+
+def test_duplicate_protocols_are_deduplicated():
+    assert params_for(['Unknown', 'ALEX', 'Unknown']).index.tolist() == ['Unknown', 'ALEX']
+    history = mock_history(pd.Series(['ALEX', 'Bitflow', 'ALEX']), days=5)
+    assert history.protocols == ['ALEX', 'Bitflow']
+    assert len(history.frame) == 10
+    assert mock_history(['ALEX', 'ALEX'], days=5).protocols == ['ALEX']
+    assert len(SimulatedFeed(['ALEX', 'ALEX']).step()) == 1